@@ -0,0 +1,176 @@
+"""
+Run the benchmark suites without asv and store the results as JSON.
+
+Usage::
+
+    python -m benchmarks --output results.json [--filter trace] [--compare previous.json]
+
+Each benchmark is stored under "<module>.<class>.<method>", with one value per parameter combination. Times are the
+best of several repeats in seconds. When comparing, benchmarks that became more than `--threshold` times slower are
+reported and the exit status is 1.
+"""
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import pkgutil
+import platform
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+import benchmarks
+
+PREFIXES = ('time_', 'timeraw_', 'track_')
+
+
+def discover(pattern=''):
+    """
+    Yield the benchmarks in the bench_* modules as (name, class, method name) tuples
+    :param pattern: Only yield benchmarks whose name contains the pattern. Default is ""
+    :type pattern: str
+    """
+    for module_info in sorted(pkgutil.iter_modules(benchmarks.__path__), key=lambda info: info.name):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module('benchmarks.{name}'.format(name=module_info.name))
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            for method in sorted(vars(cls)):
+                name = '{module}.{cls}.{method}'.format(module=module_info.name, cls=class_name, method=method)
+                if method.startswith(PREFIXES) and pattern in name:
+                    yield name, cls, method
+
+
+def time_raw(code, setup='', repeat=5):
+    """
+    Return the best time in seconds to run code in a fresh interpreter, as asv does for timeraw_ benchmarks
+    """
+    script = '{setup}\nimport time\nt = time.perf_counter()\n{code}\nprint(time.perf_counter() - t)'.format(
+        setup=setup, code=code)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], check=True, stdout=subprocess.PIPE,
+                                universal_newlines=True)
+        times.append(float(output.stdout))
+    return min(times)
+
+
+def run(cls, method, params, repeat=5):
+    """
+    Run a single benchmark with one combination of parameters
+    :return: The best time in seconds, or the tracked value. None if the benchmark was skipped
+    """
+    instance = cls()
+    if hasattr(instance, 'setup'):
+        try:
+            instance.setup(*params)
+        except NotImplementedError:
+            return None
+    try:
+        function = getattr(instance, method)
+        if method.startswith('track_'):
+            return float(function(*params))
+        if method.startswith('timeraw_'):
+            code = function(*params)
+            if isinstance(code, tuple):
+                return time_raw(*code, repeat=repeat)
+            return time_raw(code, repeat=repeat)
+        timer = timeit.Timer(lambda: function(*params))
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat=repeat, number=number)) / number
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*params)
+
+
+def run_all(pattern='', repeat=5):
+    """
+    Run all benchmarks matching a pattern
+    :rtype: dict
+    """
+    results = {}
+    for name, cls, method in discover(pattern):
+        params = getattr(cls, 'params', [])
+        if params and not isinstance(params[0], (list, tuple)):
+            params = [params]
+        unit = getattr(getattr(cls, method), 'unit', 'seconds')
+        values = {}
+        for combination in itertools.product(*params):
+            values[', '.join(repr(value) for value in combination)] = run(cls, method, combination, repeat)
+        results[name] = {'unit': unit, 'params': getattr(cls, 'param_names', []), 'values': values}
+        print('{name}: {values}'.format(name=name, values=', '.join(
+            '{key}{sep}{value}'.format(key=key, sep='=' if key else '',
+                                        value='skipped' if value is None else '{:.4g}'.format(value))
+            for key, value in values.items())))
+    return results
+
+
+def metadata():
+    """
+    Return a description of the environment the benchmarks were run in
+    :rtype: dict
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        from importlib.metadata import version
+        vtem_version = version('vTEM')
+    except Exception:
+        vtem_version = None
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'vtem': vtem_version, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'platform': platform.platform()}
+
+
+def compare(results, previous, threshold):
+    """
+    Return the benchmarks that became slower than a threshold ratio compared to previous results
+    :rtype: list
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in previous or result['unit'] != 'seconds':
+            continue
+        for key, value in result['values'].items():
+            old = previous[name]['values'].get(key)
+            if value is not None and old and value / old > threshold:
+                regressions.append((name, key, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the vTEM benchmarks and store the results as JSON')
+    parser.add_argument('--output', help='The JSON file to write the results to')
+    parser.add_argument('--filter', default='', help='Only run benchmarks whose name contains this pattern')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of repeats of each timing. Default is 5')
+    parser.add_argument('--compare', help='A JSON file with previous results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='The slowdown ratio reported as a regression when comparing. Default is 1.2')
+    arguments = parser.parse_args(argv)
+
+    results = run_all(arguments.filter, arguments.repeat)
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump({'metadata': metadata(), 'results': results}, f, indent=2)
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            previous = json.load(f)['results']
+        regressions = compare(results, previous, arguments.threshold)
+        for name, key, old, new in regressions:
+            print('Regression in {name}{key}: {old:.4g} s -> {new:.4g} s ({ratio:.2f}x)'.format(
+                name=name, key=' [{key}]'.format(key=key) if key else '', old=old, new=new, ratio=new / old))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
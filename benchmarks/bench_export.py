@@ -0,0 +1,58 @@
+"""
+Export benchmarks: offscreen ray diagrams of the standard column, drawn with the Agg backend.
+"""
+import shutil
+import tempfile
+
+import numpy as np
+from vTEM import Column
+
+
+class ExportSuite(object):
+    """
+    Ray diagrams saved to files, with a new figure per diagram or with one reused exporter
+    """
+    params = ['png', 'svg', 'pdf']
+    param_names = ['format']
+
+    def setup(self, format):
+        import matplotlib
+        matplotlib.use('Agg')
+        from vTEM.Rendering import FrameExporter
+
+        self.directory = tempfile.mkdtemp()
+        self.path = '{directory}/diagram.{format}'.format(directory=self.directory, format=format)
+        self.column = Column.standard()
+        self.exporter = FrameExporter(symmetric=True)
+        self.exporter.export(self.column, self.path)
+
+    def teardown(self, format):
+        shutil.rmtree(self.directory)
+
+    def time_render_column(self, format):
+        from vTEM.Rendering import render_column
+        render_column(self.column, self.path)
+
+    def time_export_reused(self, format):
+        self.column['CL1'].set_f(1.5 if self.column['CL1'].focal_length == 2 else 2)
+        self.exporter.export(self.column, self.path)
+
+
+class FrameSuite(object):
+    """
+    Animation frames of a slider sweep, drawn to RGBA images with one reused exporter
+    """
+
+    def setup(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        from vTEM.Rendering import FrameExporter, sweep_columns
+
+        self.exporter = FrameExporter(dpi=50)
+        self.columns = list(sweep_columns(Column.standard(), {'CL1.f': np.linspace(1.5, 3, 10)}))
+        self.exporter.draw(self.columns[0])
+        self.exporter.kwargs['limits'] = self.exporter.limits()
+
+    def time_frames(self):
+        for column in self.columns:
+            self.exporter.frame(column)
@@ -0,0 +1,75 @@
+"""
+GUI benchmarks: full redraws of the main window, rendered offscreen.
+
+Skipped when PyQt5 is not installed.
+"""
+import os
+import sys
+
+
+class ShowSuite(object):
+    """
+    Full `vTEMController.show()` redraws of the standard column
+    """
+
+    timeout = 120
+
+    def setup(self):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        try:
+            from PyQt5 import QtWidgets
+        except ImportError:
+            raise NotImplementedError('PyQt5 is not installed')
+        import matplotlib
+        matplotlib.use('QT5Agg')
+        from vTEM.gui import MainWindow, vTEMModel, vTEMController
+
+        self.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+        self.window = MainWindow()
+        self.controller = vTEMController(view=self.window, model=vTEMModel())
+        for checkbox in (self.window.cl1CheckBox, self.window.olCheckBox, self.window.il3CheckBox,
+                         self.window.plCheckBox):
+            checkbox.setChecked(True)
+        self.window.resize(1200, 900)
+        self.window.show()
+        self.controller.show()
+        self.app.processEvents()
+
+    def teardown(self):
+        self.controller.scheduler.cancel()
+        self.window.close()
+
+    def time_show(self):
+        self.controller.show()
+
+    def time_show_after_lens_change(self):
+        lens = self.controller._model.column['PL']
+        lens.set_f(3 if lens.focal_length == 2 else 2)
+        self.controller.show()
+
+    def time_show_full_redraw(self):
+        self.controller.renderer.invalidate()
+        self.controller.show()
+
+    def time_show_after_slider_step(self):
+        self.window.olFSpinBox.setValue(self.window.olFSpinBox.value() + 0.01)
+        self.controller.show()
+
+    def time_show_after_style_change(self):
+        self.window.rayAlphaSpinBox.setValue(0.5 if self.window.rayAlphaSpinBox.value() != 0.5 else 1.)
+        self.controller.scheduler.flush()
+
+    def track_blitted_fraction_autoscale(self):
+        """
+        The fraction of redraws that are blitted while a lens slider is dragged in the default autoscale mode
+        """
+        self.window.autoscaleRadioButton.setChecked(True)
+        self.controller.show()
+        renderer = self.controller.renderer
+        full_draws, blitted_draws = renderer.full_draws, renderer.blitted_draws
+        for _ in range(30):
+            self.window.olFSpinBox.setValue(self.window.olFSpinBox.value() + 0.01)
+            self.controller.show()
+        blitted = renderer.blitted_draws - blitted_draws
+        assert blitted > 0, 'No redraws were blitted in autoscale mode'
+        return blitted / (blitted + renderer.full_draws - full_draws)
@@ -0,0 +1,78 @@
+"""
+Import-time benchmarks.
+
+Run with asv (``asv run``), or directly with ``python benchmarks/bench_import.py`` to check that importing the core
+package stays within its time budget and does not load the GUI.
+"""
+import subprocess
+import sys
+
+IMPORT_CODE = """
+import vTEM
+vTEM.Lens
+"""
+
+
+class ImportSuite(object):
+    """
+    Cold imports of vTEM in a fresh interpreter
+    """
+
+    def timeraw_import_vtem(self):
+        return IMPORT_CODE
+
+    def timeraw_import_vtem_after_numpy(self):
+        return IMPORT_CODE, 'import numpy'
+
+    def track_gui_modules_loaded(self):
+        return len(gui_modules_loaded())
+
+    track_gui_modules_loaded.unit = 'modules'
+
+
+def gui_modules_loaded():
+    """
+    Return the GUI modules loaded by importing vTEM in a fresh interpreter
+    :rtype: list
+    """
+    code = 'import sys, vTEM; vTEM.Lens; ' \
+           'print(" ".join(m for m in ("PyQt5", "matplotlib", "vTEM.gui") if m in sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return output.stdout.split()
+
+
+def import_time(setup='', repeat=5):
+    """
+    Return the best time in seconds to import vTEM in a fresh interpreter
+    :param setup: Code to run before the import, which is not timed. Default is ""
+    :param repeat: The number of fresh interpreters to time. Default is 5
+    :type setup: str
+    :type repeat: int
+    :rtype: float
+    """
+    code = '{setup}\nimport time\nt = time.perf_counter()\n{code}\nprint(time.perf_counter() - t)'.format(
+        setup=setup, code=IMPORT_CODE)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+                                universal_newlines=True)
+        times.append(float(output.stdout))
+    return min(times)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check the cold import time of vTEM')
+    parser.add_argument('--budget', type=float, default=0.1, help='Import time budget in seconds. Default is 0.1')
+    arguments = parser.parse_args()
+
+    total = import_time()
+    own = import_time(setup='import numpy')
+    loaded = gui_modules_loaded()
+    print('import vTEM: {total:.1f} ms ({own:.1f} ms excluding numpy)'.format(total=total * 1e3, own=own * 1e3))
+    if loaded:
+        sys.exit('GUI modules loaded by import vTEM: {loaded}'.format(loaded=', '.join(loaded)))
+    if own > arguments.budget:
+        sys.exit('import vTEM took {own:.1f} ms, exceeding the budget of {budget:.0f} ms'.format(
+            own=own * 1e3, budget=arguments.budget * 1e3))
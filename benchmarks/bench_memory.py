@@ -0,0 +1,105 @@
+"""
+Memory benchmarks: bytes held per ray traced through the standard column.
+
+To compare the memory of two versions, run the suite on both and compare the results, e.g.::
+
+    git checkout <before> && python -m benchmarks --filter bench_memory --output before.json
+    git checkout <after> && python -m benchmarks --filter bench_memory --compare before.json
+
+Ray bundles hold the traced rays in shared arrays, and are the way to keep many traced rays in memory.
+"""
+import shutil
+import tempfile
+import tracemalloc
+
+import numpy as np
+from vTEM import Column
+
+N_RAYS = 2000
+
+
+def bytes_per_traced_ray(trace, n=N_RAYS):
+    """
+    Return the memory held by the result of `trace(n)` per traced ray
+    :param trace: Function tracing n rays and returning the traced results
+    :param n: The number of rays to trace. Default is 2000
+    :type trace: callable
+    :type n: int
+    :rtype: float
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = trace(n)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del results
+    return (after - before) / n
+
+
+def trace_rays(n):
+    column = Column.standard()
+    return [column.trace(column.source.emit_ray(angle, 1), cache=False) for angle in np.linspace(-5, 5, n)]
+
+
+def trace_bundle(n):
+    column = Column.standard()
+    return column.trace(column.source.emit_ray(np.linspace(-5, 5, n), 1), cache=False)
+
+
+class MemorySuite(object):
+    """
+    Memory held per traced ray for Ray objects and for ray bundles
+    """
+
+    def track_bytes_per_traced_ray(self):
+        return bytes_per_traced_ray(trace_rays)
+
+    track_bytes_per_traced_ray.unit = 'bytes'
+
+    def track_bytes_per_traced_bundle_ray(self):
+        return bytes_per_traced_ray(trace_bundle)
+
+    track_bytes_per_traced_bundle_ray.unit = 'bytes'
+
+
+def sweep_peak_bytes(store):
+    """
+    Return the peak memory of a sweep of 100 configurations of 2000 rays, traced in this process
+    :param store: Whether to write the results to a result store or not
+    :type store: bool
+    :rtype: int
+    """
+    column = Column.standard()
+    rays = column.source.emit_ray(np.linspace(-5, 5, N_RAYS), 1)
+    directory = tempfile.mkdtemp() if store else None
+    tracemalloc.start()
+    try:
+        column.sweep({'CL1.f': np.linspace(1, 3, 100)}, rays, processes=0,
+                     store=None if directory is None else '{directory}/sweep'.format(directory=directory))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if directory is not None:
+            shutil.rmtree(directory)
+
+
+class SweepMemorySuite(object):
+    """
+    Peak memory of a parameter sweep with results kept in memory or written to a result store
+    """
+    params = [False, True]
+    param_names = ['store']
+
+    def track_sweep_peak_bytes(self, store):
+        return sweep_peak_bytes(store)
+
+    track_sweep_peak_bytes.unit = 'bytes'
+
+
+if __name__ == '__main__':
+    print('Ray objects: {n:.0f} bytes per traced ray'.format(n=bytes_per_traced_ray(trace_rays)))
+    print('RayBundle:   {n:.0f} bytes per traced ray'.format(n=bytes_per_traced_ray(trace_bundle)))
+    print('Sweep:       {n:.0f} bytes peak in memory, {m:.0f} bytes peak with a store'.format(
+        n=sweep_peak_bytes(False), m=sweep_peak_bytes(True)))
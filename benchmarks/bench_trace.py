@@ -0,0 +1,91 @@
+"""
+Tracing benchmarks: single lenses, the standard column and ray bundles.
+"""
+import numpy as np
+from vTEM import Column, Lens, ObjectiveLens, Ray, RayNode, RayBundle
+
+
+def emit_bundle(column, n):
+    """
+    Return a bundle of n rays from the source of a column, fanned over +-5 degrees
+    :type column: Column
+    :type n: int
+    :rtype: RayBundle
+    """
+    return column.source.emit_ray(np.linspace(-5, 5, n), 1)
+
+
+class LensSuite(object):
+    """
+    A single ray through a single lens
+    """
+
+    def setup(self):
+        self.lens = Lens(0, 2)
+        self.lens.transmit_cache_size = 0
+        self.cached_lens = Lens(0, 2)
+        self.ray = Ray(RayNode(0.5, 10), RayNode(0.6, 9))
+
+    def time_lens_call(self):
+        self.lens(self.ray)
+
+    def time_lens_call_cached(self):
+        self.cached_lens(self.ray)
+
+
+class ObjectiveLensSuite(object):
+    """
+    Rays through the prefield and postfield of an objective lens
+    """
+
+    params = [1, 1000]
+    param_names = ['rays']
+
+    def setup(self, n):
+        self.lens = ObjectiveLens(0, (2, 2), 2)
+        if n == 1:
+            self.ray = Ray(RayNode(0.5, 10), RayNode(0.6, 9))
+        else:
+            self.ray = RayBundle(np.linspace(-0.5, 0.5, n), 10, 0.5)
+
+    def time_objective_lens_call(self, n):
+        self.lens(self.ray)
+
+
+class ColumnSuite(object):
+    """
+    A single ray through the ten lenses of the standard column, as traced by the GUI
+    """
+
+    def setup(self):
+        self.column = Column.standard()
+        self.names = self.column.names()
+
+    def time_trace(self):
+        self.column.trace(self.column.source.emit_ray(0.5, 1), lenses=self.names, cache=False)
+
+    def time_trace_cached(self):
+        self.column.trace(self.column.source.emit_ray(0.5, 1), lenses=self.names)
+
+
+class BundleSuite(object):
+    """
+    Ray bundles through the standard column
+    """
+
+    params = [10 ** 3, 10 ** 5, 10 ** 6]
+    param_names = ['rays']
+    timeout = 120
+
+    def setup(self, n):
+        self.column = Column.standard()
+        self.bundle = emit_bundle(self.column, n)
+
+    def time_trace_bundle(self, n):
+        self.column.trace(self.bundle, cache=False)
+
+    def track_rays_per_second(self, n):
+        import timeit
+        return n / min(timeit.repeat(lambda: self.column.trace(self.bundle, cache=False), number=1, repeat=3))
+
+    track_rays_per_second.unit = 'rays/s'
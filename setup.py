@@ -17,7 +17,7 @@ setup(
         "Topic :: Scientific/Engineering",
         "Topic :: Scientific/Engineering :: Physics",
     ],
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=[
         "PyQt5",
         "numpy",
@@ -25,6 +25,9 @@ setup(
         "pathlib",
         "tabulate",
     ],
+    entry_points={
+        "console_scripts": ["vtem = vTEM.cli:main"],
+    },
     package_data={
         "": ["LICENSE", "README.md"],
         "": ["*.py"],
@@ -0,0 +1,10 @@
+import pytest
+from vTEM import Column
+
+
+@pytest.fixture
+def column():
+    """
+    A fresh standard column, so tests can change its lenses and caches freely
+    """
+    return Column.standard()
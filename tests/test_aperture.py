@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from vTEM import Aperture, Column, Lens, Ray, RayBlockedError, RayBundle, RayNode, Source
+
+
+def _column(diameter=10.):
+    return Column(Source(0, 220, 0.1, name='Source'),
+                  [Lens(200, 2, name='CL1'), Aperture(150, diameter, name='CA'), Lens(100, 2, name='CM')], screen=50.)
+
+
+def test_ray_inside_the_opening_continues_unchanged():
+    ray = Ray(RayNode(0.1, 120.), RayNode(0.11, 119.))
+    angle = ray.angle()
+    transmitted = Aperture(100., 1.)(ray, stop=80.)
+    assert transmitted.start is ray.stop
+    assert (transmitted.start.y, transmitted.stop.y) == (100., 80.)
+    assert transmitted.angle() == pytest.approx(angle)
+
+
+def test_ray_outside_the_opening_is_blocked():
+    with pytest.raises(RayBlockedError):
+        Aperture(100., 1.)(Ray(RayNode(0.1, 120.), RayNode(0.2, 119.)), stop=80.)
+    with pytest.raises(RayBlockedError):
+        Aperture(100., 1., x=-1.)(Ray(RayNode(0., 120.), RayNode(0., 119.)))
+
+
+def test_bundle_marks_rays_outside_the_opening():
+    bundle = RayBundle(np.linspace(-1., 1., 9), 120., 0.)
+    transmitted = Aperture(100., 1.)(bundle, stop=80.)
+    inside = np.abs(np.linspace(-1., 1., 9)) <= 0.5
+    np.testing.assert_array_equal(transmitted.blocked, ~inside)
+    assert transmitted.transmitted == inside.sum()
+    assert np.all(np.isnan(transmitted.start_x[~inside]))
+    np.testing.assert_allclose(transmitted.start_x[inside], np.linspace(-1., 1., 9)[inside])
+    np.testing.assert_allclose(transmitted.stop_y, 80.)
+
+
+def test_skew_bundle_is_blocked_by_its_radial_offset():
+    bundle = RayBundle([0.3, 0.3, 0.], 120., 0., z=[0.3, 0.5, 0.6], angle_z=0.)
+    transmitted = Aperture(100., 1.)(bundle)
+    np.testing.assert_array_equal(transmitted.blocked, [False, True, True])
+
+
+def test_trace_stops_a_blocked_ray_at_the_aperture():
+    column = _column(diameter=1e-3)
+    traces = column.trace(column.source.emit_ray(0.01, 1))
+    assert len(traces) == 2
+    assert traces[-1].stop.y == 150.
+
+
+def test_transmitted_rays_continue_to_the_next_element():
+    column = _column()
+    traces = column.trace(column.source.emit_ray(0.01, 1))
+    assert len(traces) == 4
+    assert (traces[2].start.y, traces[2].stop.y) == (150., 100.)
+
+
+def test_last_aperture_rays_continue_to_the_screen():
+    column = Column(Source(0, 220, 0.1), [Lens(200, 2, name='CL1'), Aperture(150, 10., name='CA')], screen=50.)
+    assert column.trace(column.source.emit_ray(0.01, 1))[-1].stop.y == 50.
+    column.set_screen(20.)
+    assert column.trace(column.source.emit_ray(0.01, 1))[-1].stop.y == 20.
+
+
+def test_blocked_rays_stay_blocked_through_later_lenses():
+    column = _column(diameter=1.)
+    bundle = column.source.sample(200, seed=0, skew=False)
+    traces = column.trace(bundle)
+    blocked = traces[2].blocked
+    assert 0 < blocked.sum() < len(bundle)
+    assert np.all(np.isnan(traces[-1].start_x[blocked]))
+    open_traces = _column().trace(bundle)
+    np.testing.assert_allclose(traces[-1].start_x[~blocked], open_traces[-1].start_x[~blocked])
+
+
+def test_sweeping_the_diameter_transmits_more_rays():
+    column = _column()
+    bundle = column.source.sample(200, seed=0, skew=False)
+    result = column.sweep({'CA.diameter': [0.5, 1., 10.]}, bundle, processes=0)
+    transmitted = np.isfinite(result.x).sum(axis=-1)
+    assert transmitted[0] < transmitted[1] < transmitted[2] == len(bundle)
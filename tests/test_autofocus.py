@@ -0,0 +1,65 @@
+import pytest
+from vTEM.Column.solver import Autofocus
+
+
+def _assert_solved(autofocus, target, mode):
+    for constraint in autofocus.constraints(target, mode):
+        assert abs(constraint.residual(autofocus.column)) < 1e-6 * max(1., abs(target))
+
+
+@pytest.mark.parametrize('target, mode', [(100., 'magnification'), (-5000., 'magnification'),
+                                          (50., 'camera_length'), (-50., 'camera_length')])
+def test_apply_reaches_target(column, target, mode):
+    autofocus = Autofocus(column)
+    focal_lengths = autofocus.apply(target, mode)
+    assert focal_lengths == {name: column[name].focal_length for name in autofocus.variables}
+    _assert_solved(autofocus, target, mode)
+
+
+def test_solve_keeps_the_column(column):
+    focal_lengths = [column[name].focal_length for name in ('IL1', 'IL2', 'IL3', 'PL')]
+    Autofocus(column).solve(100.)
+    assert [column[name].focal_length for name in ('IL1', 'IL2', 'IL3', 'PL')] == focal_lengths
+
+
+def test_targets_on_another_branch_are_reached_by_continuation(column):
+    # Inverted images cannot be reached from the upright image of the standard column by iteration alone
+    autofocus = Autofocus(column)
+    autofocus.apply(100.)
+    autofocus.apply(-100.)
+    _assert_solved(autofocus, -100., 'magnification')
+    autofocus.apply(100.)
+    _assert_solved(autofocus, 100., 'magnification')
+
+
+def test_solutions_are_cached_by_quantized_target(column):
+    autofocus = Autofocus(column, digits=3)
+    first = autofocus.solve(100.)
+    assert (autofocus.hits, autofocus.misses) == (0, 1)
+    assert autofocus.solve(100.04) == first
+    assert (autofocus.hits, autofocus.misses) == (1, 1)
+    autofocus.solve(100., mode='camera_length')
+    assert autofocus.misses == 2
+
+
+def test_changed_column_is_solved_again(column):
+    autofocus = Autofocus(column)
+    first = autofocus.solve(100.)
+    column['OM'].set_f(column['OM'].focal_length * 1.1)
+    second = autofocus.solve(100.)
+    assert autofocus.misses == 2
+    assert second != first
+    autofocus.apply(100.)
+    _assert_solved(autofocus, 100., 'magnification')
+
+
+def test_table_solves_targets_in_order(column):
+    autofocus = Autofocus(column)
+    targets = [50., 100., 200.]
+    table = autofocus.table(targets)
+    assert table == [autofocus.solve(target) for target in targets]
+
+
+def test_unknown_mode_is_rejected(column):
+    with pytest.raises(ValueError):
+        Autofocus(column).solve(100., mode='focus')
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from vTEM import Lens, Ray, RayBundle
+
+
+def _bundle():
+    return RayBundle(np.linspace(-1., 1., 7), 120., np.linspace(-5., 5., 7), name='bundle')
+
+
+def _points(rays):
+    return np.array([(ray.start.x, ray.start.y, ray.stop.x, ray.stop.y) for ray in rays])
+
+
+def _bundle_points(bundle):
+    return np.stack((bundle.start_x, bundle.start_y, bundle.stop_x, bundle.stop_y), axis=1)
+
+
+def test_bundle_round_trips_through_rays():
+    bundle = _bundle()
+    rays = bundle.to_rays()
+    assert all(isinstance(ray, Ray) for ray in rays)
+    np.testing.assert_allclose(_bundle_points(RayBundle.from_rays(rays)), _points(rays))
+    np.testing.assert_allclose(RayBundle.from_rays(rays).angles, bundle.angles)
+
+
+def test_lens_transmits_bundle_like_single_rays():
+    lens = Lens(100., focal_length=3., x=0.5)
+    bundle = _bundle()
+    rays = bundle.to_rays()
+    transmitted = lens(bundle)
+    single = [lens(ray) for ray in rays]
+    assert isinstance(transmitted, RayBundle)
+    assert len(transmitted) == len(single)
+    np.testing.assert_allclose(_bundle_points(transmitted), _points(single))
+    np.testing.assert_allclose(transmitted.angles, [ray.angle(deg=False) for ray in single])
+    # The incoming rays are extended to the lens in both cases
+    np.testing.assert_allclose(_bundle_points(bundle), _points(rays))
+
+
+def test_bundle_lens_parameters_per_ray_match_separate_lenses():
+    focal_lengths = np.array([1., 2., 3.])
+    bundle = RayBundle(0.5, 120., 1.)
+    transmitted = Lens(100., focal_length=1.).transmit_bundle(RayBundle(np.full(3, 0.5), 120., 1.),
+                                                              focal_length=focal_lengths)
+    for i, focal_length in enumerate(focal_lengths):
+        expected = Lens(100., focal_length=focal_length)(bundle.copy())
+        np.testing.assert_allclose(_bundle_points(transmitted[i:i + 1]), _bundle_points(expected))
+
+
+def test_bundle_trace_matches_single_ray_traces(column):
+    bundle = column.source.sample(20, seed=0, skew=False)
+    traces = column.trace(bundle, cache=False)
+    single = [column.trace(ray, cache=False) for ray in bundle.to_rays()]
+    assert all(len(trace) == len(traces) for trace in single)
+    for step, transmitted in enumerate(traces[1:], 1):
+        np.testing.assert_allclose(_bundle_points(transmitted), _points([trace[step] for trace in single]),
+                                   atol=1e-9)
+
+
+def test_zero_focal_length_raises_for_bundles():
+    with pytest.raises(ZeroDivisionError):
+        Lens(100., focal_length=0.)(_bundle())
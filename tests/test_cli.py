@@ -0,0 +1,92 @@
+import csv
+
+import numpy as np
+import pytest
+from vTEM import Column, ResultStore, load_bundles, save_column
+from vTEM.cli import count, main, output_names, sweep_parameter
+
+
+def _error(capsys, argv):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == 1
+    return capsys.readouterr().err
+
+
+def test_parse_counts_and_parameters():
+    assert count('1e3') == 1000
+    key, values = sweep_parameter('CL1.f=1:3:5')
+    assert key == 'CL1.f'
+    np.testing.assert_allclose(values, [1., 1.5, 2., 2.5, 3.])
+    np.testing.assert_allclose(sweep_parameter('OL.x=-0.1,0,0.1')[1], [-0.1, 0., 0.1])
+
+
+def test_output_names_are_unique():
+    configs = ['a/col.json', 'b/col.json', 'standard', 'standard', 'x/col-1.json', 'c/col.json']
+    assert output_names(configs) == ['col-2', 'col-3', 'standard-1', 'standard-2', 'col-1', 'col-4']
+
+
+def test_trace_streams_bundles(tmp_path, capsys):
+    out = tmp_path / 'rays.npz'
+    assert main(['trace', 'standard', '--rays', '250', '--chunk-size', '100', '--seed', '0', '--out', str(out)]) == 0
+    bundles = load_bundles(out)
+    assert [len(bundle) for bundle in bundles] == [100, 100, 50]
+    assert all(bundle.skew for bundle in bundles)
+    assert 'Traced 250 rays' in capsys.readouterr().out
+
+
+def test_sweep_and_resume(tmp_path, capsys):
+    column = tmp_path / 'column.json'
+    save_column(Column.standard(), column)
+    out = str(tmp_path / 'sweep')
+    argv = ['sweep', str(column), '--parameter', 'CL1.f=1:3:4', '--parameter', 'OM.x=-0.1,0.1', '--rays', '20',
+            '--processes', '0', '--seed', '1', '--out', out]
+    assert main(argv) == 0
+    store = ResultStore(out)
+    assert store.shape == (4, 2, 20) and store.complete
+    expected = np.array(store.x)
+
+    assert 'use --resume' in _error(capsys, argv).lower()
+    assert '--seed' in _error(capsys, [arg for arg in argv if arg not in ('--seed', '1')] + ['--resume'])
+
+    store = ResultStore(out, mode='r+')
+    store.done[2:] = False
+    store.x[2:] = np.nan
+    store.flush()
+    del store
+    assert main(argv + ['--resume']) == 0
+    np.testing.assert_array_equal(ResultStore(out).x, expected)
+
+
+def test_render_numbers_duplicate_columns(tmp_path, capsys):
+    out = tmp_path / 'diagrams'
+    assert main(['render', 'standard', 'standard', '--out', str(out), '--processes', '0']) == 0
+    assert sorted(path.name for path in out.iterdir()) == ['standard-1.png', 'standard-2.png']
+
+
+def test_render_single_file(tmp_path):
+    out = tmp_path / 'column.svg'
+    assert main(['render', 'standard', '--out', str(out), '--processes', '0', '--symmetric']) == 0
+    assert out.read_text().lstrip().startswith('<?xml')
+
+
+def test_animate_gif(tmp_path, capsys):
+    pytest.importorskip('PIL')
+    out = tmp_path / 'sweep.gif'
+    assert main(['animate', 'standard', '--parameter', 'CL1.f=1.5:2.5:3', '--out', str(out), '--processes', '0',
+                 '--dpi', '20']) == 0
+    assert out.read_bytes()[:3] == b'GIF'
+    assert 'Animated 3 frames' in capsys.readouterr().out
+
+
+def test_table_writes_csv(tmp_path):
+    out = tmp_path / 'table.csv'
+    assert main(['table', 'standard', '--targets', '100', '200', '--out', str(out)]) == 0
+    with open(str(out), newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['magnification', 'IL1', 'IL2', 'IL3', 'PL']
+    assert [float(row[0]) for row in rows[1:]] == [100., 200.]
+
+
+def test_errors_exit_with_a_message(tmp_path, capsys):
+    assert 'error' in _error(capsys, ['trace', str(tmp_path / 'missing.json'), '--out', str(tmp_path / 'rays.npz')])
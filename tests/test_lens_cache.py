@@ -0,0 +1,73 @@
+from vTEM import Lens, ObjectiveLens, Ray, RayNode
+from vTEM.Lenses.lens import _LRUCache
+
+
+def _ray():
+    return Ray(RayNode(0.2, 120.), RayNode(0.3, 119.))
+
+
+def _points(ray):
+    return ray.start.x, ray.start.y, ray.stop.x, ray.stop.y
+
+
+def test_lru_cache_discards_least_recently_used_entry():
+    cache = _LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lens_reuses_transmitted_ray_for_the_same_ray():
+    lens = Lens(100., focal_length=3.)
+    cache = lens.transmit_cache()
+    first = lens(_ray())
+    assert (cache.hits, cache.misses) == (0, 1)
+    second = lens(_ray())
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert _points(first) == _points(second)
+
+
+def test_lens_cache_is_keyed_by_lens_parameters():
+    lens = Lens(100., focal_length=3.)
+    cache = lens.transmit_cache()
+    lens(_ray())
+    for setter, value in ((lens.set_f, 2.), (lens.set_x, 0.1), (lens.set_y, 99.)):
+        setter(value)
+        transmitted = lens(_ray())
+        assert cache.hits == 0
+        assert _points(transmitted) == _points(Lens(lens.y, focal_length=lens.focal_length, x=lens.x)(_ray()))
+
+
+def test_lens_cache_hits_again_for_earlier_settings():
+    lens = Lens(100., focal_length=3.)
+    cache = lens.transmit_cache()
+    expected = _points(lens(_ray()))
+    lens.set_f(2.)
+    lens(_ray())
+    lens.set_f(3.)
+    assert _points(lens(_ray())) == expected
+    assert cache.hits == 1
+
+
+def test_objective_lens_caches_fields_per_setting():
+    lens = ObjectiveLens(100., (2., 3.), 1.)
+    fields = lens.get_prefield(), lens.get_postfield()
+    assert lens.get_prefield() is fields[0]
+    lens.set_prefield(4.)
+    assert lens.get_prefield() is not fields[0]
+    assert lens.get_prefield().focal_length == 4.
+    lens.set_prefield(2.)
+    assert lens.get_prefield() is fields[0]
+
+
+def test_objective_lens_fields_follow_size():
+    lens = ObjectiveLens(100., (2., 3.), 1.)
+    prefield = lens.get_prefield()
+    lens.set_size(5.)
+    assert lens.get_prefield() is prefield
+    assert prefield.size == lens.get_postfield().size == 5.
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from vTEM.Rendering import ColumnRenderer, FrameExporter, MAX_ARROWS, diagram_rays
+
+
+@pytest.fixture
+def renderer():
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return ColumnRenderer(figure.add_subplot(), blit=False)
+
+
+def test_rays_are_drawn_as_one_collection(renderer, column):
+    traces = [ray for initial in diagram_rays(column, symmetric=True) for ray in column.trace(initial)]
+    renderer.update_ray_collection(traces, rayprops={'color': 'b', 'alpha': 0.5}, arrow_step=1, show_label=True)
+    collection = renderer._ray_collection
+    assert len(collection.lines.get_segments()) == len(traces)
+    assert collection.arrows.N == len(traces)
+    np.testing.assert_allclose(collection.arrows.get_facecolor(), [[0., 0., 1., 0.5]])
+    labels = [label for label in renderer._ray_labels if label.get_visible()]
+    assert [label.get_text() for label in labels] == [ray.name for ray in traces]
+
+
+def test_arrowheads_do_not_change_the_data_limits(renderer, column):
+    traces = column.trace(column.source.emit_ray(1., 1))
+    renderer.update_ray_collection(traces, arrow_step=1)
+    renderer.ax.relim()
+    limits = renderer.ax.dataLim.frozen()
+    renderer.update_ray_collection(traces[:3], arrow_step=1)
+    renderer.ax.relim()
+    np.testing.assert_array_equal(renderer.ax.dataLim.get_points(), limits.get_points())
+
+
+def test_move_rays_moves_the_collection_and_labels(renderer, column):
+    traces = column.trace(column.source.emit_ray(1., 1))
+    renderer.update_ray_collection(traces, arrow_step=2, show_label=True)
+    segments = np.random.default_rng(0).normal(size=(len(traces), 2, 2))
+    renderer.move_rays(segments)
+    np.testing.assert_allclose(renderer._ray_collection.lines.get_segments(), segments)
+    np.testing.assert_allclose(renderer._ray_collection.arrows.get_offsets(), segments[::2, 1])
+    np.testing.assert_allclose(renderer._ray_labels[0].get_position(), segments[0, 1])
+
+
+def test_exported_bundles_have_subsampled_arrowheads(column):
+    exporter = FrameExporter()
+    exporter.draw(column, rays=[column.source.sample(1000, seed=0, skew=False)])
+    collection = exporter.renderer._ray_collection
+    assert len(collection.lines.get_segments()) > MAX_ARROWS
+    assert 0 < collection.arrows.N <= MAX_ARROWS
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+from vTEM import (Aperture, Column, FORMAT_VERSION, RayBundle, StorageError, column_to_dict, load_bundles,
+                  load_column, save_bundles, save_column)
+
+
+def _assert_same_bundle(a, b):
+    assert a.name == b.name
+    for key in ('start_x', 'start_y', 'stop_y', 'angles', 'start_z', 'angles_z', 'energies', 'blocked'):
+        if getattr(a, key) is None:
+            assert getattr(b, key) is None
+        else:
+            np.testing.assert_array_equal(getattr(a, key), getattr(b, key))
+
+
+def test_column_round_trips_through_json(tmp_path, column):
+    column.lenses.append(Aperture(130., 0.5, x=0.1, name='OA'))
+    column.change_lens('OL', prefield=3., postfield=4., couple=False)
+    column.change_lens('IL2', x=0.2, f=1.5)
+    column.change_source(x=0.1, size=0.5)
+    column.set_screen(-5.)
+    path = tmp_path / 'column.json'
+    save_column(column, path)
+    loaded = load_column(path)
+    assert isinstance(loaded, Column)
+    assert column_to_dict(loaded) == column_to_dict(column)
+    ray = column.source.emit_ray(1., 1)
+    assert [(r.stop.x, r.stop.y) for r in loaded.trace(ray, cache=False)] == \
+           [(r.stop.x, r.stop.y) for r in column.trace(ray, cache=False)]
+
+
+def test_newer_column_format_is_rejected(tmp_path, column):
+    path = tmp_path / 'column.json'
+    save_column(column, path)
+    data = json.loads(path.read_text())
+    data['version'] = FORMAT_VERSION + 1
+    path.write_text(json.dumps(data))
+    with pytest.raises(StorageError):
+        load_column(path)
+
+
+def test_other_json_files_are_rejected(tmp_path):
+    path = tmp_path / 'other.json'
+    path.write_text(json.dumps({'lenses': []}))
+    with pytest.raises(StorageError):
+        load_column(path)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('mmap', [False, True])
+def test_bundles_round_trip_through_npz(tmp_path, column, compress, mmap):
+    column.lenses.append(Aperture(130., 0.5, name='OA'))
+    meridional = column.source.sample(100, seed=0, skew=False)
+    skew = RayBundle(np.linspace(-1., 1., 5), 120., 1., z=0.5, angle_z=-1., energy=1e-3, name='skew')
+    traces = column.trace(meridional)
+    path = tmp_path / 'bundles.npz'
+    save_bundles(path, traces + [skew], compress=compress)
+    loaded = load_bundles(path, mmap=mmap)
+    assert len(loaded) == len(traces) + 1
+    assert any(bundle.blocked is not None and bundle.blocked.any() for bundle in loaded)
+    for a, b in zip(traces + [skew], loaded):
+        _assert_same_bundle(a, b)
+
+
+def test_memory_mapped_bundles_are_copy_on_write(tmp_path):
+    bundle = RayBundle(np.zeros(10), 120., 1.)
+    path = tmp_path / 'bundles.npz'
+    save_bundles(path, bundle)
+    loaded, = load_bundles(path)
+    loaded.start_x += 1.
+    np.testing.assert_array_equal(load_bundles(path)[0].start_x, 0.)
+
+
+def test_npz_without_metadata_is_rejected(tmp_path):
+    path = tmp_path / 'other.npz'
+    np.savez(str(path), x=np.zeros(3))
+    with pytest.raises(StorageError):
+        load_bundles(path)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from vTEM import RayBundle
+from vTEM.Column.solver import Constraint, Crossover, Image, Magnification, Parallel, SolverError
+
+
+def _transmit(column, bundle, start, stop):
+    """
+    Return the rays after the lenses (or lens fields) between two planes, starting from a bundle at the upper plane
+    """
+    for lens in column.between(start, stop):
+        bundle = lens(bundle)
+    return bundle
+
+
+def _point_bundle(x, y, angle=1e-3):
+    # Small angles, so the traced rays follow the paraxial matrices the solver uses
+    return RayBundle(x, y, np.array([-1., 0.5, 1.]) * angle)
+
+
+def test_constraint_residual_is_abstract():
+    with pytest.raises(TypeError):
+        Constraint('screen')
+
+
+def test_crossover_focuses_rays_from_the_source(column):
+    focal_lengths = column.solve([Crossover('OL.ffp')], ['CM'], apply=True)
+    assert focal_lengths['CM'] == column['CM'].focal_length
+    assert abs(Crossover('OL.ffp').residual(column)) < 1e-9
+    bundle = _point_bundle(column.source.x, column.source.y)
+    transmitted = _transmit(column, bundle, 'source', 'OL.ffp')
+    x = transmitted.x_at_y(column.plane('OL.ffp'), check=False)
+    assert np.ptp(x) < 1e-3 * np.ptp(transmitted.start_x)
+
+
+def test_parallel_rays_from_the_source(column):
+    column.solve([Parallel('CL3')], ['CL2'], apply=True)
+    transmitted = _transmit(column, _point_bundle(column.source.x, column.source.y), 'source', 'CL3')
+    assert np.ptp(transmitted.angles) < 1e-4 * np.ptp(np.deg2rad([-1e-3, 1e-3]))
+
+
+def test_image_with_magnification(column):
+    constraints = [Image('screen', start='OL'), Magnification(100., 'screen', start='OL')]
+    column.solve(constraints, ['IL1', 'IL2', 'IL3', 'PL'], apply=True)
+    assert all(abs(constraint.residual(column)) < 1e-6 for constraint in constraints)
+    transmitted = _transmit(column, _point_bundle(1e-6, column.plane('OL'), angle=1e-6), 'OL', 'screen')
+    np.testing.assert_allclose(transmitted.x_at_y(column.screen, check=False), 1e-4, rtol=1e-3)
+
+
+def test_solve_without_apply_keeps_the_column(column):
+    focal_length = column['CM'].focal_length
+    focal_lengths = column.solve([Crossover('OL.ffp')], ['CM'])
+    assert column['CM'].focal_length == focal_length
+    assert focal_lengths['CM'] != focal_length
+
+
+def test_more_constraints_than_variables_are_rejected(column):
+    with pytest.raises(ValueError):
+        column.solve([Crossover('OL.ffp'), Parallel('CL3')], ['CM'])
+
+
+def test_unsolvable_constraints_raise_solver_error(column):
+    with pytest.raises(SolverError):
+        column.solve([Image('screen', start='OL'), Magnification(-100., 'screen', start='OL')], ['IL3', 'PL'])
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from vTEM import ResultStore, StorageError, load_sweep
+
+PARAMETERS = {'CL1.f': [1.5, 2., 2.5], 'OM.x': [-0.1, 0.1]}
+
+
+@pytest.fixture
+def rays(column):
+    return column.source.sample(20, seed=0, skew=False)
+
+
+def test_sweep_to_store_matches_sweep_in_memory(tmp_path, column, rays):
+    expected = column.sweep(PARAMETERS, rays, processes=0)
+    result = column.sweep(PARAMETERS, rays, processes=0, store=tmp_path / 'store')
+    loaded = load_sweep(tmp_path / 'store')
+    assert ResultStore(tmp_path / 'store').complete
+    for swept in (result, loaded):
+        assert swept.shape == (3, 2, len(rays))
+        np.testing.assert_array_equal(swept.x, expected.x)
+        np.testing.assert_array_equal(swept.angle, expected.angle)
+        assert list(swept.parameters) == list(PARAMETERS)
+    assert loaded.settings((2, 1)) == {'CL1.f': 2.5, 'OM.x': 0.1}
+
+
+def test_resumed_sweep_only_traces_missing_configurations(tmp_path, column, rays):
+    path = tmp_path / 'store'
+    expected = column.sweep(PARAMETERS, rays, processes=0, store=path)
+    expected_x = np.array(expected.x)
+    store = ResultStore(path, mode='r+')
+    store.done[1:] = False
+    store.x[1:] = np.nan
+    # A configuration marked as done keeps its stored values
+    store.x[0, 0, 0] = 123.
+    store.flush()
+    del store, expected
+
+    result = column.sweep(PARAMETERS, rays, processes=0, store=path)
+    assert ResultStore(path).complete
+    assert result.x[0, 0, 0] == 123.
+    np.testing.assert_array_equal(np.asarray(result.x).reshape(-1)[1:], expected_x.reshape(-1)[1:])
+
+
+def test_resumed_sweep_accepts_an_opened_store(tmp_path, column, rays):
+    store = ResultStore.create(tmp_path / 'store', PARAMETERS, len(rays), screen=column.screen)
+    result = column.sweep(PARAMETERS, rays, processes=0, store=store)
+    np.testing.assert_array_equal(result.x, column.sweep(PARAMETERS, rays, processes=0).x)
+
+
+@pytest.mark.parametrize('parameters, n_rays, screen', [
+    ({'CL1.f': [1.5, 2., 3.], 'OM.x': [-0.1, 0.1]}, 20, 0.),
+    ({'CL1.f': [1.5, 2., 2.5], 'OM.y': [-0.1, 0.1]}, 20, 0.),
+    ({'CL1.f': [1.5, 2., 2.5]}, 20, 0.),
+    (PARAMETERS, 10, 0.),
+    (PARAMETERS, 20, -1.),
+])
+def test_store_of_another_sweep_is_rejected(tmp_path, column, rays, parameters, n_rays, screen):
+    ResultStore.create(tmp_path / 'store', parameters, n_rays, screen=screen)
+    with pytest.raises(ValueError):
+        column.sweep(PARAMETERS, rays, processes=0, store=tmp_path / 'store')
+
+
+def test_existing_store_is_not_created_again(tmp_path):
+    ResultStore.create(tmp_path / 'store', PARAMETERS, 20)
+    with pytest.raises(StorageError):
+        ResultStore.create(tmp_path / 'store', PARAMETERS, 20)
+
+
+def test_read_only_store_cannot_be_written(tmp_path):
+    ResultStore.create(tmp_path / 'store', PARAMETERS, 20)
+    store = ResultStore(tmp_path / 'store')
+    with pytest.raises(StorageError):
+        store.write(0, np.zeros(20), np.zeros(20))
+
+
+def test_directory_without_store_is_rejected(tmp_path):
+    with pytest.raises(StorageError):
+        ResultStore(tmp_path)
@@ -0,0 +1,92 @@
+import numpy as np
+from vTEM import Ray, RayBundle
+
+
+def _points(rays):
+    return [(ray.start.x, ray.start.y, ray.stop.x, ray.stop.y) if isinstance(ray, Ray) else
+            np.stack((ray.start_x, ray.start_y, ray.stop_x, ray.stop_y)) for ray in rays]
+
+
+def _assert_same_trace(a, b):
+    assert len(a) == len(b)
+    for x, y in zip(_points(a), _points(b)):
+        np.testing.assert_allclose(x, y)
+
+
+def _above(column, name):
+    return [lens.name for lens in column.get_lenses()[:column.names().index(name)]]
+
+
+def test_cached_trace_matches_uncached_trace(column):
+    ray = column.source.emit_ray(1., 1)
+    _assert_same_trace(column.trace(ray), column.trace(ray, cache=False))
+    _assert_same_trace(column.trace(ray), column.trace(ray, cache=False))
+
+
+def test_unchanged_column_reuses_cached_rays(column):
+    ray = column.source.emit_ray(1., 1)
+    first = column.trace(ray)
+    second = column.trace(ray)
+    assert all(a is b for a, b in zip(first[1:], second[1:]))
+
+
+def test_changed_lens_retraces_only_below_it(column):
+    ray = column.source.emit_ray(1., 1)
+    first = column.trace(ray)
+    column['IL2'].set_f(column['IL2'].focal_length * 1.5)
+    second = column.trace(ray)
+    reused = len(column.trace(ray, lenses=_above(column, 'IL2'), cache=False))
+    assert [a is b for a, b in zip(first, second)][1:] == [True] * (reused - 1) + [False] * (len(first) - reused)
+    _assert_same_trace(second, column.trace(ray, cache=False))
+
+
+def test_returning_to_earlier_settings_matches_uncached_trace(column):
+    ray = column.source.emit_ray(1., 1)
+    expected = column.trace(ray, cache=False)
+    focal_length = column['CM'].focal_length
+    column.trace(ray)
+    column['CM'].set_f(2 * focal_length)
+    column.trace(ray)
+    column['CM'].set_f(focal_length)
+    _assert_same_trace(column.trace(ray), expected)
+
+
+def test_caching_does_not_modify_the_initial_ray(column):
+    ray = column.source.emit_ray(1., 1)
+    start, stop = (ray.start.x, ray.start.y), (ray.stop.x, ray.stop.y)
+    column.trace(ray)
+    column.trace(ray)
+    assert (ray.start.x, ray.start.y) == start
+    assert (ray.stop.x, ray.stop.y) == stop
+
+
+def test_equal_bundles_share_a_cached_trace(column):
+    bundle = column.source.sample(50, seed=1, skew=False)
+    first = column.trace(bundle)
+    second = column.trace(bundle.copy())
+    assert all(a is b for a, b in zip(first[1:], second[1:]))
+    other = column.trace(column.source.sample(50, seed=2, skew=False))
+    assert not any(a is b for a, b in zip(first[1:], other[1:]))
+
+
+def test_changed_bundle_is_traced_again(column):
+    bundle = column.source.sample(50, seed=1, skew=False)
+    column.trace(bundle)
+    bundle.start_x += 0.1
+    assert isinstance(bundle, RayBundle)
+    _assert_same_trace(column.trace(bundle), column.trace(bundle, cache=False))
+
+
+def test_lens_selection_matches_uncached_trace(column):
+    ray = column.source.emit_ray(1., 1)
+    column.trace(ray)
+    lenses = ['CL1', 'OL', 'PL']
+    _assert_same_trace(column.trace(ray, lenses=lenses), column.trace(ray, lenses=lenses, cache=False))
+
+
+def test_moving_the_screen_clears_the_cache(column):
+    ray = column.source.emit_ray(1., 1)
+    first = column.trace(ray)
+    column.set_screen(column.screen - 1)
+    second = column.trace(ray)
+    assert not any(a is b for a, b in zip(first[1:], second[1:]))
@@ -0,0 +1,5 @@
+from .column import *
+from .sweep import *
+from .solver import *
+from .detector import *
+from .wobble import *
@@ -0,0 +1,475 @@
+import hashlib
+import numpy as np
+from vTEM.Rays import Ray, RayNode, RayBundle
+from vTEM.Lenses import Lens, ObjectiveLens, Aperture, Source, RayTransmitError, RayBlockedError, system_matrix, \
+    image_plane
+from vTEM.Column.sweep import sweep
+from vTEM.Column.solver import solve
+from vTEM.Column.detector import Detector
+
+
+class Column(object):
+    """
+    A microscope column consisting of a source, an ordered stack of lenses and a screen.
+
+    The column has no dependency on the GUI and can be used to trace rays in scripts and batch jobs.
+    """
+
+    def __init__(self, source, lenses, screen=0., name=''):
+        """
+        Create a new column.
+        :param source: The source emitting rays into the column
+        :param lenses: The lenses in the column. The lenses are sorted along the beam.
+        :param screen: The position of the screen along the optical axis. Default is 0
+        :param name: The name of the column. Default is ""
+        :type source: Source
+        :type lenses: list
+        :type screen: float
+        :type name: str
+        """
+        if not isinstance(source, Source):
+            raise TypeError('Source {source!r} must be type Source, not {t}'.format(source=source, t=type(source)))
+        for lens in lenses:
+            if not isinstance(lens, (Lens, ObjectiveLens, Aperture)):
+                raise TypeError('Lens {lens!r} must be type Lens, ObjectiveLens or Aperture, not {t}'.format(
+                    lens=lens, t=type(lens)))
+        self.source = source
+        self.lenses = list(lenses)
+        self.screen = float(screen)
+        self.name = str(name)
+        self.trace_cache_size = 8
+        self._trace_cache = {}
+
+    @classmethod
+    def standard(cls):
+        """
+        Return the standard column with condenser, objective, intermediate and projector lenses.
+        :rtype: Column
+        """
+        return cls(Source(0, 220, 10, name='Source'),
+                   [Lens(200, 2, name='CL1'),
+                    Lens(180, 2, name='CL2'),
+                    Lens(160, 2, name='CL3'),
+                    Lens(140, 2, name='CM'),
+                    ObjectiveLens(120, (2, 2), 10),
+                    Lens(100, 2, name='OM'),
+                    Lens(80, 2, name='IL1'),
+                    Lens(60, 2, name='IL2'),
+                    Lens(40, 2, name='IL3'),
+                    Lens(20, 2, name='PL')])
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.source!r}, {self.lenses!r}, screen={self.screen!r}, ' \
+               'name={self.name!r})'.format(self=self)
+
+    def __str__(self):
+        return '{self.__class__.__name__} {self.name} with lenses {names}'.format(self=self,
+                                                                               names=', '.join(self.names()))
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            return self.get_lenses()[item]
+        elif isinstance(item, str):
+            for lens in self:
+                if lens.name == item:
+                    return lens
+            raise KeyError('Lens {key} not found'.format(key=item))
+        raise TypeError(
+            'Error when indexing using {item!r}. Indexing using objects of type {t} is not supported'.format(
+                item=item, t=type(item)))
+
+    def __iter__(self):
+        for lens in self.get_lenses():
+            yield lens
+
+    def __len__(self):
+        return len(self.lenses)
+
+    def get_lenses(self, sort=True):
+        """
+        Return the lenses in the column
+        :param sort: Whether to sort the lenses along the beam or not. Default is True
+        :type sort: bool
+        :rtype: list
+        """
+        lenses = list(self.lenses)
+        if sort:
+            lenses.sort(key=lambda x: x.y, reverse=True)
+        return lenses
+
+    def names(self):
+        """
+        Return the names of the lenses along the beam
+        :rtype: list
+        """
+        return [lens.name for lens in self]
+
+    def change_source(self, x=None, y=None, size=None, z=None):
+        """
+        Change the source parameters
+        :return: Whether anything was changed or not
+        :rtype: bool
+        """
+        changed = False
+        if z is not None:
+            self.source.set_z(z)
+            changed = True
+        if x is not None:
+            self.source.set_x(x)
+            changed = True
+        if y is not None:
+            self.source.set_y(y)
+            changed = True
+        if size is not None:
+            self.source.set_size(size)
+            changed = True
+        return changed
+
+    def change_lens(self, name, x=None, y=None, f=None, gap=None, prefield=None, postfield=None, couple=None, z=None,
+                    diameter=None):
+        """
+        Change the parameters of a lens or aperture
+        :param name: The name of the lens
+        :param diameter: The diameter of the opening of an aperture. Default is None
+        :type name: str
+        :type diameter: float, None
+        :return: Whether anything was changed or not
+        :rtype: bool
+        """
+        if not isinstance(name, str):
+            raise TypeError('Name {name!r} must be of type str, not {t}'.format(name=name, t=type(name)))
+        lens = self[name]
+        changed = False
+        if x is not None:
+            lens.set_x(x)
+            changed = True
+        if y is not None:
+            lens.set_y(y)
+            changed = True
+        if f is not None:
+            lens.set_f(f)
+            changed = True
+        if z is not None:
+            lens.set_z(z)
+            changed = True
+        if isinstance(lens, ObjectiveLens) and gap is not None:
+            lens.set_gap(gap)
+            changed = True
+        if isinstance(lens, ObjectiveLens) and prefield is not None:
+            lens.set_prefield(prefield)
+            changed = True
+        if isinstance(lens, ObjectiveLens) and postfield is not None:
+            lens.set_postfield(postfield)
+            changed = True
+        if isinstance(lens, ObjectiveLens) and couple is not None:
+            lens.couple(couple)
+            changed = True
+        if isinstance(lens, Aperture) and diameter is not None:
+            lens.set_diameter(diameter)
+            changed = True
+        return changed
+
+    def set_screen(self, y):
+        """
+        Move the screen. Cached traces are cleared, since rays transmitted by a last aperture continue to the screen
+        :param y: The position of the screen along the optical axis
+        :type y: float
+        """
+        if float(y) != self.screen:
+            self.clear_cache()
+        self.screen = float(y)
+
+    def plane(self, plane):
+        """
+        Return the position of a plane along the optical axis.
+
+        Planes are given as positions, or by name: "source", "screen", "<lens>" (the lens plane), "<lens>.ffp" or
+        "<lens>.bfp" (the front or back focal plane). The focal planes of an objective lens are the front focal plane
+        of the prefield and the back focal plane of the postfield.
+        :param plane: The plane
+        :type plane: float, str
+        :rtype: float
+        """
+        if not isinstance(plane, str):
+            return float(plane)
+        if plane == 'source':
+            return self.source.y
+        if plane == 'screen':
+            return self.screen
+        name, _, focal_plane = plane.partition('.')
+        fields = self[name].get_fields()
+        if focal_plane == '':
+            return self[name].y
+        elif focal_plane == 'ffp':
+            return fields[0].y + fields[0].focal_length
+        elif focal_plane == 'bfp':
+            return fields[-1].y - fields[-1].focal_length
+        raise KeyError('Plane {plane!r} not recognized'.format(plane=plane))
+
+    def between(self, start, stop):
+        """
+        Return the lenses lying between two planes along the beam.
+
+        Objective lenses are split into their fields, so that planes inside the objective lens (e.g. the specimen) only
+        see the fields below or above them.
+        :param start: The upper plane
+        :param stop: The lower plane
+        :type start: float, str
+        :type stop: float, str
+        :rtype: list
+        """
+        start = self.plane(start)
+        stop = self.plane(stop)
+        return [field for lens in self for field in lens.get_fields() if start >= field.y >= stop]
+
+    def trace(self, ray, lenses=None, cache=True):
+        """
+        Trace a ray or a ray bundle through the column.
+
+        Lenses positioned before the start of the ray are skipped, and tracing stops at a lens with zero focal length
+        or at an aperture blocking the ray. Rays in bundles blocked by an aperture are marked in the mask of the bundle.
+
+        The ray state at the entrance of each lens is cached. When the same initial ray is traced again, tracing
+        restarts at the first lens whose parameters have changed since the last trace, reusing the rays transmitted
+        by the lenses above it. The reused rays are shared with the cache and should not be modified. When caching, the
+        given ray is not modified, as the trace starts from a copy of it.
+        :param ray: The ray or bundle to trace
+        :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+        :param cache: Whether to reuse and update the cached trace of the ray or not. Default is True
+        :type ray: Ray, RayBundle
+        :type lenses: list, None
+        :type cache: bool
+        :return: The initial ray followed by the ray transmitted by each lens
+        :rtype: list
+        """
+        selected = [lens for lens in self if lenses is None or lens.name in lenses]
+        rays = [ray]
+        steps = []
+        first = 0
+        key = None
+        if cache:
+            key, signature = _signature(ray)
+            cached = self._trace_cache.get(key)
+            if cached is not None and _same_signature(cached['signature'], signature):
+                rays, steps, first = _resume(cached, selected)
+            else:
+                # The first lens extends the initial ray, so a copy is traced to keep the signature of the given ray
+                rays = [_copy_ray(ray)]
+
+        broke = False
+        for i, lens in enumerate(selected[first:], first):
+            steps.append((lens, lens.parameters(), len(rays), _entry_state(rays[-1])))
+            try:
+                if isinstance(lens, Aperture):
+                    # Apertures do not bend rays, so the rays they transmit continue to the next element or the screen
+                    transmitted_ray = lens(rays[-1], stop=selected[i + 1].entrance if i + 1 < len(selected) else
+                                           self.screen)
+                else:
+                    transmitted_ray = lens(rays[-1])
+            except (ZeroDivisionError, RayBlockedError):
+                broke = True
+                break
+            except RayTransmitError:
+                pass
+            else:
+                if isinstance(transmitted_ray, list):
+                    rays.extend(transmitted_ray)
+                else:
+                    rays.append(transmitted_ray)
+
+        if cache:
+            self._trace_cache.pop(key, None)
+            while self._trace_cache and len(self._trace_cache) >= self.trace_cache_size:
+                self._trace_cache.pop(next(iter(self._trace_cache)))
+            self._trace_cache[key] = {'signature': signature, 'rays': list(rays), 'steps': steps, 'broke': broke}
+        return rays
+
+    def clear_cache(self):
+        """
+        Clear the cached ray traces
+        """
+        self._trace_cache.clear()
+
+    def sweep(self, parameters, rays, lenses=None, processes=None, chunksize=None, store=None):
+        """
+        Trace rays through the Cartesian product of column settings in a process pool.
+
+        See `vTEM.Column.sweep` for details.
+        :param parameters: The values to sweep, keyed by parameter (e.g. {"CL1.f": np.linspace(1, 3, 10)})
+        :param rays: The initial rays, traced through every configuration
+        :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+        :param processes: The number of worker processes. Default is None (one per CPU). Use 0 to run in this process
+        :param chunksize: The number of configurations per task. Default is None (about four tasks per worker)
+        :param store: The directory of a result store to write the results to. Default is None (keep them in memory)
+        :return: The positions and angles of the rays at the screen for every configuration
+        :rtype: SweepResult
+        """
+        return sweep(self, parameters, rays, lenses=lenses, processes=processes, chunksize=chunksize, store=store)
+
+    def detect(self, rays, detector=None, lenses=None, weights=None):
+        """
+        Trace rays through the column and accumulate their hits on a detector.
+
+        Rays are given as a bundle or an iterable of bundles (e.g. a generator), which are traced one at a time so that
+        memory use does not grow with the total number of rays.
+        :param rays: The ray bundle or bundles to trace
+        :param detector: The detector to accumulate hits on. Default is None (a new detector at the screen)
+        :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+        :param weights: The weights of the rays in every bundle. Default is None (one count per ray)
+        :type rays: RayBundle, iterable
+        :type detector: Detector, None
+        :type lenses: list, None
+        :type weights: np.ndarray, None
+        :return: The detector
+        :rtype: Detector
+        """
+        if detector is None:
+            detector = Detector()
+        if isinstance(rays, RayBundle):
+            rays = [rays]
+        y = self.screen if detector.y is None else detector.y
+        for bundle in rays:
+            detector.detect(self.trace(bundle, lenses=lenses, cache=False)[-1], y=y, weights=weights)
+        return detector
+
+    def solve(self, constraints, variables, initial=None, apply=False):
+        """
+        Return the focal lengths that fulfil a set of constraints, see `vTEM.Column.solve`
+        :param constraints: The constraints to fulfil, e.g. [Crossover("OL.ffp")]
+        :param variables: The focal lengths to solve for, e.g. ["CM"]
+        :param initial: Initial focal lengths for the iteration. Default is None (the current focal lengths)
+        :param apply: Whether to set the solved focal lengths in the column or not. Default is False
+        :return: The solved focal lengths, keyed by variable
+        :rtype: dict
+        """
+        return solve(self, constraints, variables, initial=initial, apply=apply)
+
+    def get_range(self, first=None, last=None, lenses=None):
+        """
+        Return a contiguous range of lenses along the beam
+        :param first: The name of the first lens in the range. Default is None (first lens in the column)
+        :param last: The name of the last lens in the range. Default is None (last lens in the column)
+        :param lenses: The names of the lenses to include. Default is None (all lenses)
+        :type first: str, None
+        :type last: str, None
+        :type lenses: list, None
+        :rtype: list
+        """
+        names = self.names()
+        start = 0 if first is None else names.index(self[first].name)
+        stop = len(names) if last is None else names.index(self[last].name) + 1
+        return [lens for lens in self.get_lenses()[start:stop] if lenses is None or lens.name in lenses]
+
+    def system_matrix(self, first=None, last=None, start=None, stop=None, lenses=None, augmented=False, axis='x'):
+        """
+        Return the ray-transfer matrix of a range of the column.
+
+        By default the range starts at the source and stops at the screen. If `first` or `last` are given, the range
+        starts at the entrance of the first lens or stops at the exit of the last lens instead.
+        :param first: The name of the first lens in the range. Default is None
+        :param last: The name of the last lens in the range. Default is None
+        :param start: The position along the optical axis where the range starts. Overrides the default start plane
+        :param stop: The position along the optical axis where the range stops. Overrides the default stop plane
+        :param lenses: The names of the lenses to include. Default is None (all lenses)
+        :param augmented: Whether to return the augmented 3x3 matrix including lens offsets or not. Default is False
+        :param axis: The transverse axis of the lens offsets in the augmented matrix, "x" or "z". Default is "x"
+        :rtype: np.ndarray
+        """
+        selected = self.get_range(first, last, lenses)
+        if start is None:
+            start = self.source.y if first is None else self[first].entrance
+        if stop is None:
+            stop = self.screen if last is None else self[last].exit
+        return system_matrix(selected, start=start, stop=stop, augmented=augmented, axis=axis)
+
+    def image_plane(self, y=None, first=None, last=None, lenses=None):
+        """
+        Return the position and magnification of the image of an object plane formed by a range of the column
+        :param y: The position of the object plane. Default is None (the source)
+        :param first: The name of the first lens in the range. Default is None
+        :param last: The name of the last lens in the range. Default is None
+        :param lenses: The names of the lenses to include. Default is None (all lenses)
+        :return: The position of the image plane and the lateral magnification
+        :rtype: tuple
+        """
+        if y is None:
+            y = self.source.y
+        return image_plane(self.get_range(first, last, lenses), y)
+
+
+def _signature(ray):
+    """
+    Return a cache key and a signature identifying the initial state of a ray or bundle.
+
+    Bundles are keyed by a hash of their arrays, so equal bundles share a cached trace.
+    :type ray: Ray, RayBundle
+    :rtype: tuple
+    """
+    if isinstance(ray, RayBundle):
+        signature = (ray.start_x.copy(), ray.start_y.copy(), ray.stop_y.copy(), ray.angles.copy())
+        if ray.skew:
+            signature = signature + (ray.start_z.copy(), ray.angles_z.copy())
+        if ray.energies is not None:
+            signature = signature + (ray.energies.copy(),)
+        if ray.blocked is not None:
+            signature = signature + (ray.blocked.copy(),)
+        digest = hashlib.blake2b(digest_size=16)
+        for array in signature:
+            digest.update(array.dtype.str.encode())
+            digest.update(array.tobytes())
+        return ('bundle', ray.skew, ray.energies is not None, ray.blocked is not None, digest.digest()), signature
+    signature = (ray.start.x, ray.start.y, ray.stop.x, ray.stop.y)
+    return ('ray',) + signature, signature
+
+
+def _copy_ray(ray):
+    if isinstance(ray, RayBundle):
+        return ray.copy()
+    return Ray(RayNode(ray.start), RayNode(ray.stop), name=ray.name)
+
+
+def _same_signature(a, b):
+    if len(a) != len(b):
+        return False
+    return all(np.array_equal(x, y) for x, y in zip(a, b))
+
+
+def _entry_state(ray):
+    """
+    Return the state of a ray that is changed when a lens extends it
+    """
+    if isinstance(ray, RayBundle):
+        return ray.stop_y
+    return ray.stop.x, ray.stop.y
+
+
+def _restore_entry_state(ray, state):
+    if isinstance(ray, RayBundle):
+        ray.stop_y = state
+    else:
+        ray.stop.x, ray.stop.y = state
+
+
+def _resume(cached, selected):
+    """
+    Return the rays, steps and lens index to resume a cached trace from
+    :param cached: The cached trace
+    :param selected: The lenses to trace through, along the beam
+    :type cached: dict
+    :type selected: list
+    :rtype: tuple
+    """
+    steps = cached['steps']
+    reused = 0
+    for lens, parameters, n, state in steps:
+        if reused >= len(selected) or selected[reused] is not lens or lens.parameters() != parameters:
+            break
+        reused += 1
+    if cached['broke']:
+        reused = min(reused, len(steps) - 1)
+    if reused == len(steps):
+        return list(cached['rays']), list(steps), reused
+    lens, parameters, n, state = steps[reused]
+    rays = cached['rays'][:n]
+    _restore_entry_state(rays[-1], state)
+    return rays, steps[:reused], reused
@@ -0,0 +1,164 @@
+import numpy as np
+from vTEM.Rays import RayBundle
+
+
+class Detector(object):
+    """
+    A pixelated detector accumulating the positions where rays cross a plane into a 2D histogram.
+
+    The first image axis is x and the second is z. Meridional rays (without z-coordinates) hit the detector at z = 0.
+    Hits are added chunk by chunk, so any number of rays can be detected with constant memory. Rays blocked by an
+    aperture never reach the detector and are counted separately.
+    """
+
+    def __init__(self, bins=256, range=None, y=None, name='detector'):
+        """
+        Create a detector
+        :param bins: The number of pixels along x and z, or along both. Default is 256
+        :param range: The extent of the detector as ((xmin, xmax), (zmin, zmax)). Default is None (set from the first rays detected)
+        :param y: The position of the detector along the optical axis. Default is None (the screen of the column)
+        :param name: The name of the detector. Default is "detector"
+        :type bins: int, tuple
+        :type range: tuple, None
+        :type y: float, None
+        :type name: str
+        """
+        bins = tuple(int(n) for n in np.broadcast_to(bins, (2,)))
+        if min(bins) < 1:
+            raise ValueError('Detector must have at least one pixel along each axis, not {bins!r}'.format(bins=bins))
+        self.bins = bins
+        self.range = None
+        if range is not None:
+            self.set_range(range)
+        self.y = None if y is None else float(y)
+        self.name = str(name)
+        self.counts = np.zeros(self.bins)
+        self.hits = 0
+        self.missed = 0
+        self.blocked = 0
+
+    def __repr__(self):
+        return '{self.__class__.__name__}(bins={self.bins!r}, range={self.range!r}, y={self.y!r}, ' \
+               'name={self.name!r})'.format(self=self)
+
+    def __str__(self):
+        return '{self.__class__.__name__} {self.name}: {self.bins[0]}x{self.bins[1]} pixels, {self.hits} hits, ' \
+               '{self.missed} missed, {self.blocked} blocked'.format(self=self)
+
+    def set_range(self, range):
+        """
+        Set the extent of the detector
+        :param range: The extent of the detector as ((xmin, xmax), (zmin, zmax))
+        :type range: tuple
+        """
+        (xmin, xmax), (zmin, zmax) = range
+        if not (xmax > xmin and zmax > zmin):
+            raise ValueError('Detector range {range!r} must be increasing along both axes'.format(range=range))
+        self.range = ((float(xmin), float(xmax)), (float(zmin), float(zmax)))
+
+    def set_y(self, y):
+        self.y = None if y is None else float(y)
+
+    @property
+    def extent(self):
+        """
+        The extent of the image as (xmin, xmax, zmin, zmax), e.g. for `imshow`
+        :rtype: tuple
+        """
+        if self.range is None:
+            return None
+        return self.range[0] + self.range[1]
+
+    def reset(self):
+        """
+        Clear the accumulated image
+        """
+        self.counts[...] = 0
+        self.hits = 0
+        self.missed = 0
+        self.blocked = 0
+
+    def add(self, x, z=None, weights=None):
+        """
+        Add hits at given positions
+        :param x: The x-positions of the hits
+        :param z: The z-positions of the hits. Default is None (all hits at z = 0)
+        :param weights: The weights of the hits. Default is None (one count per hit)
+        :type x: np.ndarray
+        :type z: np.ndarray, None
+        :type weights: np.ndarray, None
+        :return: The number of hits on the detector
+        :rtype: int
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        z = np.zeros_like(x) if z is None else np.asarray(z, dtype=float).ravel()
+        if self.range is None:
+            self.set_range(_auto_range(x, z))
+        (xmin, xmax), (zmin, zmax) = self.range
+        nx, nz = self.bins
+        with np.errstate(invalid='ignore'):
+            ix = np.floor((x - xmin) * (nx / (xmax - xmin)))
+            iz = np.floor((z - zmin) * (nz / (zmax - zmin)))
+            inside = (ix >= 0) & (ix < nx) & (iz >= 0) & (iz < nz)
+        pixels = ix[inside].astype(np.intp) * nz + iz[inside].astype(np.intp)
+        if weights is not None:
+            weights = np.broadcast_to(np.asarray(weights, dtype=float), x.shape)[inside]
+        self.counts += np.bincount(pixels, weights=weights, minlength=nx * nz).reshape(self.bins)
+        hits = int(np.count_nonzero(inside))
+        self.hits += hits
+        self.missed += len(x) - hits
+        return hits
+
+    def detect(self, bundle, y=None, weights=None):
+        """
+        Add the hits of a ray bundle crossing the detector plane
+        :param bundle: The rays, extrapolated to the detector plane
+        :param y: The position of the detector plane. Default is None (the position of the detector)
+        :param weights: The weights of the rays. Default is None (one count per ray)
+        :type bundle: RayBundle
+        :type y: float, None
+        :type weights: np.ndarray, None
+        :return: The number of hits on the detector
+        :rtype: int
+        """
+        if not isinstance(bundle, RayBundle):
+            raise TypeError('Rays {bundle!r} must be type RayBundle, not {t}'.format(bundle=bundle, t=type(bundle)))
+        if y is None:
+            y = self.y
+        if y is None:
+            raise ValueError('The position of {self!r} along the optical axis is not set'.format(self=self))
+        x = bundle.x_at_y(y, check=False)
+        z = bundle.z_at_y(y, check=False) if bundle.skew else None
+        if bundle.blocked is not None and bundle.blocked.any():
+            passed = ~bundle.blocked
+            self.blocked += len(bundle) - int(np.count_nonzero(passed))
+            x = x[passed]
+            z = None if z is None else z[passed]
+            if weights is not None:
+                weights = np.broadcast_to(np.asarray(weights, dtype=float), passed.shape)[passed]
+        return self.add(x, z, weights=weights)
+
+    def show(self, ax, **kwargs):
+        """
+        Show the accumulated image
+        :param ax: The axes to show the image in
+        :param kwargs: Optional keyword arguments passed to ax.imshow()
+        :type ax: matplotlib.pyplot.Axes
+        :return: The image artist
+        """
+        kwargs.setdefault('origin', 'lower')
+        kwargs.setdefault('aspect', 'auto')
+        return ax.imshow(self.counts.T, extent=self.extent, **kwargs)
+
+
+def _auto_range(x, z):
+    """
+    Return a detector range covering the finite positions, with a 5% margin
+    """
+    range = []
+    for values in (x, z):
+        values = values[np.isfinite(values)]
+        low, high = (values.min(), values.max()) if len(values) else (0., 0.)
+        margin = 0.05 * (high - low) or 0.5 * max(abs(low), 1.)
+        range.append((low - margin, high + margin))
+    return tuple(range)
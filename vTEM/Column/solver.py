@@ -0,0 +1,552 @@
+import abc
+import copy
+from collections import OrderedDict
+
+import numpy as np
+from vTEM.Lenses import Error, RayTransmitError, system_matrix
+from vTEM.Column.sweep import apply_setting
+
+
+class SolverError(Error):
+    pass
+
+
+class Constraint(abc.ABC):
+    """
+    A condition on the paraxial ray-transfer matrix between two planes of a column.
+
+    Planes are given as positions or names understood by `Column.plane`. The constraint is fulfilled when
+    `residual(column)` is zero.
+    """
+
+    def __init__(self, y, start='source'):
+        """
+        Create a constraint
+        :param y: The plane where the condition applies
+        :param start: The plane the rays start from. Default is "source"
+        :type y: float, str
+        :type start: float, str
+        """
+        self.y = y
+        self.start = start
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.y!r}, start={self.start!r})'.format(self=self)
+
+    def matrix(self, column):
+        """
+        Return the transfer matrix from the start plane to the constrained plane
+        :type column: Column
+        :rtype: np.ndarray
+        """
+        start = column.plane(self.start)
+        stop = column.plane(self.y)
+        return system_matrix(column.between(start, stop), start=start, stop=stop)
+
+    @abc.abstractmethod
+    def residual(self, column):
+        """
+        Return how far the column is from fulfilling the constraint, zero when it is fulfilled
+        :type column: Column
+        :rtype: float
+        """
+
+
+class Image(Constraint):
+    """
+    An image of the start plane is formed at the plane: rays from a point in the start plane meet again (B = 0)
+    """
+
+    def residual(self, column):
+        return self.matrix(column)[0, 1]
+
+
+class Crossover(Image):
+    """
+    A crossover (image of the source) is formed at the plane
+    """
+
+    def __init__(self, y):
+        super(Crossover, self).__init__(y, start='source')
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.y!r})'.format(self=self)
+
+
+class Magnification(Constraint):
+    """
+    The magnification from the start plane to the plane (A) equals a target value. Combine with `Image`
+    """
+
+    def __init__(self, magnification, y, start='source'):
+        """
+        Create a magnification constraint
+        :param magnification: The target magnification, negative for inverted images
+        :param y: The image plane
+        :param start: The object plane. Default is "source"
+        :type magnification: float
+        :type y: float, str
+        :type start: float, str
+        """
+        super(Magnification, self).__init__(y, start=start)
+        self.magnification = float(magnification)
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.magnification!r}, {self.y!r}, start={self.start!r})'.format(self=self)
+
+    def residual(self, column):
+        return self.matrix(column)[0, 0] - self.magnification
+
+
+class Diffraction(Constraint):
+    """
+    A diffraction pattern of the start plane is formed at the plane: rays leaving the start plane at the same angle
+    meet again (A = 0)
+    """
+
+    def residual(self, column):
+        return self.matrix(column)[0, 0]
+
+
+class CameraLength(Constraint):
+    """
+    The camera length from the start plane to the plane (B) equals a target value. Combine with `Diffraction`
+    """
+
+    def __init__(self, camera_length, y, start='source'):
+        """
+        Create a camera length constraint
+        :param camera_length: The target camera length, negative for inverted patterns
+        :param y: The plane of the diffraction pattern
+        :param start: The diffracting plane. Default is "source"
+        :type camera_length: float
+        :type y: float, str
+        :type start: float, str
+        """
+        super(CameraLength, self).__init__(y, start=start)
+        self.camera_length = float(camera_length)
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.camera_length!r}, {self.y!r}, start={self.start!r})'.format(self=self)
+
+    def residual(self, column):
+        return self.matrix(column)[0, 1] - self.camera_length
+
+
+class Parallel(Constraint):
+    """
+    Rays from a point in the start plane are parallel at the plane (D = 0), e.g. parallel illumination
+    """
+
+    def residual(self, column):
+        return self.matrix(column)[1, 1]
+
+
+def _setting(variable):
+    if '.' in variable:
+        return variable
+    return '{variable}.f'.format(variable=variable)
+
+
+def _focal_length(column, variable):
+    name, _, parameter = _setting(variable).rpartition('.')
+    lens = column[name]
+    if parameter == 'prefield':
+        return lens.focal_lengths[0]
+    if parameter in ('postfield', 'f') and hasattr(lens, 'focal_lengths'):
+        return lens.focal_lengths[1]
+    if parameter == 'f':
+        return lens.focal_length
+    raise KeyError('Variable {variable!r} is not a focal length'.format(variable=variable))
+
+
+def _residuals(column, constraints, variables, powers):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        focal_lengths = 1. / np.asarray(powers, dtype=float)
+        for variable, focal_length in zip(variables, focal_lengths):
+            apply_setting(column, _setting(variable), focal_length)
+        return np.array([constraint.residual(column) for constraint in constraints], dtype=float)
+
+
+def _solve_linear(column, constraints, variables, power, tol):
+    """
+    Solve a single constraint for a single lens power analytically.
+
+    A matrix element is an affine function of the power of any single lens, so two evaluations determine the root.
+    Returns None if the residual is not affine in the power (e.g. when the constrained plane moves with the lens).
+    """
+    samples = np.array([0., power, 2 * power])
+    try:
+        residuals = np.array([_residuals(column, constraints, variables, [p])[0] for p in samples])
+    except RayTransmitError:
+        return None
+    if not np.all(np.isfinite(residuals)):
+        return None
+    scale = max(np.max(np.abs(residuals)), 1.)
+    if abs(residuals[2] - 2 * residuals[1] + residuals[0]) > tol * scale * 1e3:
+        return None
+    slope = (residuals[1] - residuals[0]) / power
+    if slope == 0:
+        raise SolverError('Constraint {constraint!r} does not depend on {variable}'.format(
+            constraint=constraints[0], variable=variables[0]))
+    return np.array([-residuals[0] / slope])
+
+
+def _solve_iterative(column, constraints, variables, powers, tol, max_iterations, offset=0.):
+    """
+    Solve for the lens powers with a Levenberg-Marquardt iteration using a finite-difference Jacobian.
+
+    The iteration runs over the logarithm of the powers, which keeps the lenses converging, and residuals are measured
+    relative to the length of the column. The residuals are solved for `offset` rather than zero if given.
+    """
+    length = max(abs(column.source.y - column.screen), 1.)
+
+    def evaluate(logs):
+        try:
+            with np.errstate(over='ignore'):
+                return (_residuals(column, constraints, variables, np.exp(logs)) - offset) / length
+        except ZeroDivisionError:
+            # Steps so large that a power overflows are rejected like any step that increases the residuals
+            return np.full(len(constraints), np.inf)
+
+    logs = np.log(powers)
+    residuals = evaluate(logs)
+    damping = 1e-3
+    for _ in range(max_iterations):
+        if np.linalg.norm(residuals) <= tol:
+            return np.exp(logs)
+        jacobian = np.empty((len(constraints), len(variables)))
+        for j in range(len(variables)):
+            shifted = logs.copy()
+            shifted[j] += 1e-7
+            jacobian[:, j] = (evaluate(shifted) - residuals) / 1e-7
+        if not np.all(np.isfinite(jacobian)):
+            break
+        normal = jacobian.T @ jacobian
+        gradient = jacobian.T @ residuals
+        identity = np.eye(len(variables))
+        while damping < 1e12:
+            try:
+                new_logs = logs + np.linalg.solve(normal + damping * identity, -gradient)
+            except np.linalg.LinAlgError:
+                damping *= 10
+                continue
+            new_residuals = evaluate(new_logs)
+            if np.linalg.norm(new_residuals) < np.linalg.norm(residuals):
+                break
+            damping *= 10
+        else:
+            break
+        logs, residuals = new_logs, new_residuals
+        damping = max(damping / 10, 1e-12)
+    raise SolverError('Could not solve {constraints!r} for {variables!r} within {n} iterations'.format(
+        constraints=constraints, variables=variables, n=max_iterations))
+
+
+def _solve(work, constraints, variables, initial, tol, max_iterations):
+    """
+    Solve for the focal lengths in a working copy of a column, returning them as an array
+    """
+    powers = 1. / np.asarray(initial, dtype=float)
+    solution = None
+    if len(variables) == 1 and len(constraints) == 1:
+        solution = _solve_linear(work, constraints, variables, powers[0], tol)
+    if solution is None:
+        solution = _solve_iterative(work, constraints, variables, powers, tol, max_iterations)
+    if np.any(solution <= 0):
+        raise SolverError('No solution with converging lenses for {constraints!r} with {variables!r}'.format(
+            constraints=constraints, variables=variables))
+    return 1. / solution
+
+
+def _solve_homotopy(work, constraints, variables, initial, tol, max_iterations, steps=4):
+    """
+    Solve for the focal lengths by homotopy: the constraints are relaxed to the residuals of the initial focal lengths,
+    and then tightened to zero in a few steps, each starting from the solution of the previous step.
+
+    This finds solutions that an iteration from the initial focal lengths does not converge to.
+    """
+    powers = 1. / np.asarray(initial, dtype=float)
+    start = _residuals(work, constraints, variables, powers)
+    if not np.all(np.isfinite(start)):
+        raise SolverError('The initial focal lengths {initial!r} do not give finite residuals for {constraints!r}'
+                          .format(initial=initial, constraints=constraints))
+    for weight in np.linspace(1, 0, steps + 1)[1:]:
+        powers = _solve_iterative(work, constraints, variables, powers, tol, max_iterations, offset=weight * start)
+    return 1. / powers
+
+
+def solve(column, constraints, variables, initial=None, apply=False, tol=1e-10, max_iterations=100):
+    """
+    Return the focal lengths that fulfil a set of constraints.
+
+    Variables are lens names (the focal length of the lens) or "<lens>.prefield"/"<lens>.postfield" for objective
+    lenses. There must be at least as many variables as constraints. A single constraint on a single lens is solved
+    analytically from the composed transfer matrices when possible. Other cases fall back to a damped least-squares
+    (Levenberg-Marquardt) iteration from the initial focal lengths.
+    :param column: The column to solve for
+    :param constraints: The constraints to fulfil
+    :param variables: The focal lengths to solve for
+    :param initial: Initial focal lengths for the iteration. Default is None (the current focal lengths)
+    :param apply: Whether to set the solved focal lengths in the column or not. Default is False
+    :param tol: The relative tolerance of the solution. Default is 1e-10
+    :param max_iterations: The maximum number of iterations. Default is 100
+    :type column: Column
+    :type constraints: list
+    :type variables: list
+    :type initial: list, None
+    :type apply: bool
+    :type tol: float
+    :type max_iterations: int
+    :return: The solved focal lengths, keyed by variable
+    :rtype: dict
+    """
+    constraints = list(constraints)
+    variables = list(variables)
+    if len(constraints) > len(variables):
+        raise ValueError('The number of constraints ({n}) cannot exceed the number of variables ({m})'.format(
+            n=len(constraints), m=len(variables)))
+    work = copy.deepcopy(column)
+    work.clear_cache()
+    if initial is None:
+        initial = [_focal_length(work, variable) for variable in variables]
+    solution = _solve(work, constraints, variables, initial, tol, max_iterations)
+
+    focal_lengths = {variable: float(focal_length) for variable, focal_length in zip(variables, solution)}
+    if apply:
+        for variable, focal_length in focal_lengths.items():
+            apply_setting(column, _setting(variable), focal_length)
+    return focal_lengths
+
+
+class Autofocus(object):
+    """
+    Solve the projector lenses for many target magnifications or camera lengths.
+
+    Each solve starts from the previous solution (falling back to the current focal lengths of the column), so tables of
+    neighbouring targets follow one branch of solutions. Targets that cannot be solved from either are reached by
+    continuation from a solved target, see `_search`. Solutions are cached keyed by the target rounded to a number of
+    significant digits and by the settings of the remaining lenses in the column.
+    """
+
+    modes = ('magnification', 'camera_length')
+
+    def __init__(self, column, variables=('IL1', 'IL2', 'IL3', 'PL'), specimen='OL', screen='screen', digits=6,
+                 cache_size=1024):
+        """
+        Create an optimizer for the projector lenses of a column
+        :param column: The column to optimize
+        :param variables: The focal lengths to solve for. Default is ("IL1", "IL2", "IL3", "PL")
+        :param specimen: The specimen plane. Default is "OL" (the objective lens plane)
+        :param screen: The plane of the image or diffraction pattern. Default is "screen"
+        :param digits: The number of significant digits to round targets to. Default is 6
+        :param cache_size: The maximum number of cached solutions. Default is 1024
+        :type column: Column
+        :type variables: tuple
+        :type specimen: float, str
+        :type screen: float, str
+        :type digits: int
+        :type cache_size: int
+        """
+        self.column = column
+        self.variables = tuple(variables)
+        self.specimen = specimen
+        self.screen = screen
+        self.digits = int(digits)
+        self.cache_size = int(cache_size)
+        self.tol = 1e-10
+        self.max_iterations = 100
+        self.max_continuation_steps = 64
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._work = None
+        self._work_signature = None
+        self._last = None
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.column!r}, variables={self.variables!r})'.format(self=self)
+
+    def quantize(self, target):
+        """
+        Round a target to the number of significant digits used as cache key
+        :param target: The target
+        :type target: float
+        :rtype: float
+        """
+        return float('{target:.{digits}g}'.format(target=float(target), digits=self.digits))
+
+    def constraints(self, target, mode='magnification'):
+        """
+        Return the constraints for a target
+        :param target: The target magnification or camera length
+        :param mode: Either "magnification" or "camera_length". Default is "magnification"
+        :type target: float
+        :type mode: str
+        :rtype: list
+        """
+        if mode == 'magnification':
+            return [Image(self.screen, start=self.specimen), Magnification(target, self.screen, start=self.specimen)]
+        elif mode == 'camera_length':
+            return [Diffraction(self.screen, start=self.specimen),
+                    CameraLength(target, self.screen, start=self.specimen)]
+        raise ValueError('Mode {mode!r} not recognized. Must be one of {modes!r}'.format(mode=mode, modes=self.modes))
+
+    def _signature(self):
+        fixed = tuple((lens.name, lens.parameters()) for lens in self.column
+                      if not any(_setting(variable).rpartition('.')[0] == lens.name for variable in self.variables))
+        return (self.column.source.x, self.column.source.y, self.column.screen) + fixed
+
+    def _working_column(self, signature):
+        if self._work is None or self._work_signature != signature:
+            self._work = copy.deepcopy(self.column)
+            self._work.clear_cache()
+            self._work_signature = signature
+        return self._work
+
+    def solve(self, target, mode='magnification'):
+        """
+        Return the focal lengths giving a target magnification or camera length
+        :param target: The target magnification or camera length
+        :param mode: Either "magnification" or "camera_length". Default is "magnification"
+        :type target: float
+        :type mode: str
+        :return: The solved focal lengths, keyed by variable
+        :rtype: dict
+        """
+        target = self.quantize(target)
+        signature = self._signature()
+        key = (mode, target, signature)
+        solution = self._cache.get(key)
+        if solution is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            work = self._working_column(signature)
+            current = [_focal_length(self.column, variable) for variable in self.variables]
+            solution = self._search(work, target, mode, signature, current)
+            solution = tuple(float(focal_length) for focal_length in solution)
+            self._cache[key] = solution
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self._last = solution
+        return dict(zip(self.variables, solution))
+
+    def _search(self, work, target, mode, signature, current):
+        """
+        Return the focal lengths for a target that is not cached.
+
+        The iteration starts from the previous solution and then from the current focal lengths. If neither converges,
+        the target is reached by continuation: from the nearest cached solution of a target with the same sign, or from
+        a target of the same sign solved by homotopy from the current focal lengths or from equal focal lengths of a
+        similar scale. Continuation is needed when the target is on another branch of solutions than the start, e.g.
+        inverted rather than upright images, since the sign of a magnification or camera length cannot change while
+        the image or diffraction condition holds.
+        """
+        constraints = self.constraints(target, mode)
+        for initial in ([self._last] if self._last is not None else []) + [current]:
+            try:
+                return _solve(work, constraints, self.variables, initial, self.tol, self.max_iterations)
+            except SolverError:
+                pass
+        if target != 0:
+            nearest = self._nearest(target, mode, signature)
+            if nearest is not None:
+                try:
+                    return self._continue(work, mode, nearest[0], nearest[1], target)
+                except SolverError:
+                    pass
+            anchors = sorted((np.copysign(10. ** k, target) for k in range(-2, 5)),
+                             key=lambda anchor: abs(np.log(target / anchor)))
+            # Equal focal lengths around the scale of the current ones are neutral starts when the current ones are on
+            # another branch
+            scale = float(np.exp(np.mean(np.log(np.abs(current)))))
+            neutral = [[scale * 2. ** k] * len(current) for k in (0, -1, 1, -2, 2)]
+            for initial in [current] + neutral:
+                for anchor in [target] + anchors:
+                    try:
+                        focal_lengths = _solve_homotopy(work, self.constraints(anchor, mode), self.variables, initial,
+                                                        self.tol, self.max_iterations)
+                        return self._continue(work, mode, anchor, focal_lengths, target)
+                    except SolverError:
+                        pass
+        raise SolverError('Could not solve {mode} {target} for {variables!r} from the previous or current focal '
+                          'lengths or by continuation'.format(mode=mode, target=target, variables=self.variables))
+
+    def _nearest(self, target, mode, signature):
+        """
+        Return the cached target of the same mode, sign and column settings that is nearest to a target, and its
+        solution. Returns None if there is none
+        """
+        nearest = None
+        for (cached_mode, cached_target, cached_signature), solution in self._cache.items():
+            if cached_mode != mode or cached_signature != signature or cached_target * target <= 0:
+                continue
+            distance = abs(np.log(target / cached_target))
+            if nearest is None or distance < nearest[0]:
+                nearest = (distance, cached_target, solution)
+        return None if nearest is None else nearest[1:]
+
+    def _continue(self, work, mode, start, focal_lengths, target):
+        """
+        Solve a target by stepping geometrically from a solved target of the same sign, each step starting from the
+        solution of the previous one. Steps that fail are retried with a quarter of the size.
+        """
+        step = 1.
+        for _ in range(self.max_continuation_steps):
+            if start == target:
+                return focal_lengths
+            ratio = np.log(target / start)
+            if abs(ratio) > step:
+                next_target = start * np.exp(np.copysign(step, ratio))
+            else:
+                next_target = target
+            try:
+                focal_lengths = _solve(work, self.constraints(next_target, mode), self.variables, focal_lengths,
+                                       self.tol, self.max_iterations)
+            except SolverError:
+                step /= 4
+                if step < 1e-3:
+                    break
+            else:
+                start = next_target
+                step *= 2
+        raise SolverError('Could not continue the {mode} from {start} to {target}'.format(mode=mode, start=start,
+                                                                                       target=target))
+
+    def table(self, targets, mode='magnification'):
+        """
+        Solve a list of targets in order, each starting from the previous solution
+        :param targets: The target magnifications or camera lengths
+        :param mode: Either "magnification" or "camera_length". Default is "magnification"
+        :type targets: list
+        :type mode: str
+        :return: The solved focal lengths of each target, keyed by variable
+        :rtype: list
+        """
+        return [self.solve(target, mode) for target in targets]
+
+    def apply(self, target, mode='magnification'):
+        """
+        Set the projector lenses of the column to a target magnification or camera length
+        :param target: The target magnification or camera length
+        :param mode: Either "magnification" or "camera_length". Default is "magnification"
+        :type target: float
+        :type mode: str
+        :return: The applied focal lengths, keyed by variable
+        :rtype: dict
+        """
+        focal_lengths = self.solve(target, mode)
+        for variable, focal_length in focal_lengths.items():
+            apply_setting(self.column, _setting(variable), focal_length)
+        return focal_lengths
+
+    def clear_cache(self):
+        """
+        Clear the cached solutions
+        """
+        self._cache.clear()
+        self._last = None
+        self.hits = 0
+        self.misses = 0
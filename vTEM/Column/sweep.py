@@ -0,0 +1,213 @@
+import copy
+import itertools
+import os
+from pathlib import Path
+
+import numpy as np
+from vTEM.Rays import Ray, RayBundle
+
+SOURCE_PARAMETERS = ('x', 'y', 'size', 'z')
+LENS_PARAMETERS = ('x', 'y', 'f', 'gap', 'prefield', 'postfield', 'z', 'diameter')
+
+
+class SweepResult(object):
+    """
+    The screen positions and angles of rays traced through a grid of column settings.
+
+    The result arrays have one axis per swept parameter, in the order the parameters were given, followed by one
+    axis for the rays.
+    """
+
+    def __init__(self, parameters, x, angle, screen):
+        """
+        Create a sweep result
+        :param parameters: The swept parameter values, keyed by parameter name
+        :param x: The positions of the rays at the screen
+        :param angle: The angles of the rays at the screen in degrees
+        :param screen: The position of the screen along the optical axis
+        :type parameters: dict
+        :type x: np.ndarray
+        :type angle: np.ndarray
+        :type screen: float
+        """
+        self.parameters = parameters
+        self.x = x
+        self.angle = angle
+        self.screen = float(screen)
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({keys!r}, shape={self.shape!r})'.format(self=self,
+                                                                                 keys=list(self.parameters))
+
+    @property
+    def shape(self):
+        return self.x.shape
+
+    def settings(self, index):
+        """
+        Return the parameter values of a configuration
+        :param index: The index of the configuration in the parameter grid
+        :type index: tuple
+        :rtype: dict
+        """
+        return {key: values[i] for (key, values), i in zip(self.parameters.items(), index)}
+
+
+def apply_setting(column, key, value):
+    """
+    Apply a single parameter setting to a column.
+
+    Parameters are given as "<lens name>.<parameter>", "source.<parameter>" or "screen". Lens parameters are "x",
+    "y", "z", "f", "gap", "prefield" and "postfield", aperture parameters are "x", "y", "z" and "diameter", and source
+    parameters are "x", "y", "z" and "size".
+    :param column: The column to change
+    :param key: The parameter to set
+    :param value: The new value
+    :type column: Column
+    :type key: str
+    :type value: float
+    """
+    if key == 'screen':
+        column.set_screen(value)
+        return
+    name, _, parameter = key.rpartition('.')
+    if name == 'source':
+        if parameter not in SOURCE_PARAMETERS:
+            raise KeyError('Source parameter {parameter!r} not recognized in {key!r}'.format(parameter=parameter,
+                                                                                           key=key))
+        column.change_source(**{parameter: value})
+    else:
+        if parameter not in LENS_PARAMETERS:
+            raise KeyError('Lens parameter {parameter!r} not recognized in {key!r}'.format(parameter=parameter,
+                                                                                         key=key))
+        column.change_lens(name, **{parameter: value})
+
+
+def screen_rays(column, rays, lenses=None):
+    """
+    Trace rays through a column and return their positions and angles at the screen
+    :param column: The column to trace through
+    :param rays: The initial rays
+    :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+    :type column: Column
+    :type rays: Ray, RayBundle
+    :type lenses: list, None
+    :return: The positions and the angles in degrees of the rays at the screen
+    :rtype: tuple
+    """
+    if isinstance(rays, Ray):
+        rays = RayBundle.from_rays([rays])
+    last = column.trace(rays.copy(), lenses=lenses, cache=False)[-1]
+    return last.x_at_y(column.screen, check=False), last.angle()
+
+
+def _sweep_chunk(column, keys, grid, rays, lenses, indices, store=None):
+    if store is None:
+        x = np.empty((len(indices), len(rays)))
+        angle = np.empty((len(indices), len(rays)))
+    else:
+        from vTEM.Storage import ResultStore  # Imported here since vTEM.Storage imports this module
+
+        # Write every configuration straight into the store, so no chunk of results is held in memory or sent back
+        store = ResultStore(store, mode='r+')
+    # Every configuration sets all swept parameters, so one copy of the column serves the whole chunk
+    configuration = copy.deepcopy(column)
+    configuration.clear_cache()
+    for i, index in enumerate(indices):
+        for key, values, j in zip(keys, grid, np.unravel_index(index, [len(values) for values in grid])):
+            apply_setting(configuration, key, values[j])
+        if store is None:
+            x[i], angle[i] = screen_rays(configuration, rays, lenses)
+        else:
+            store.write(index, *screen_rays(configuration, rays, lenses))
+    if store is not None:
+        store.flush()
+        return indices, None, None
+    return indices, x, angle
+
+
+def sweep(column, parameters, rays, lenses=None, processes=None, chunksize=None, store=None):
+    """
+    Trace rays through the Cartesian product of column settings in a process pool.
+
+    Each worker traces a block of `chunksize` configurations. Results that do not fit in memory can be written to an
+    on-disk result store instead, which the workers write to directly and which can be reopened later with
+    `vTEM.load_sweep`.
+    :param column: The column to sweep. It is not changed.
+    :param parameters: The values to sweep, keyed by parameter (e.g. {"CL1.f": np.linspace(1, 3, 10)})
+    :param rays: The initial rays, traced through every configuration
+    :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+    :param processes: The number of worker processes. Default is None (one per CPU). Use 0 to run in this process
+    :param chunksize: The number of configurations per task. Default is None (about four tasks per worker)
+    :param store: The directory of a result store to write the results to, or an opened `vTEM.ResultStore`. A new
+        store is created if the directory does not hold one. An existing store must have been created for a sweep of
+        the same parameters, values, rays and screen position, and configurations already marked as done in it are
+        skipped, e.g. to resume an interrupted sweep. Default is None (keep the results in memory)
+    :type column: Column
+    :type parameters: dict
+    :type rays: Ray, RayBundle
+    :type lenses: list, None
+    :type processes: int, None
+    :type chunksize: int, None
+    :type store: str, Path, vTEM.ResultStore, None
+    :return: The positions and angles of the rays at the screen for every configuration, memory-mapped from the store
+        if given
+    :rtype: SweepResult
+    """
+    if not isinstance(rays, (Ray, RayBundle)):
+        raise TypeError('Rays {rays!r} must be type Ray or RayBundle, not {t}'.format(rays=rays, t=type(rays)))
+    if isinstance(rays, Ray):
+        rays = RayBundle.from_rays([rays], name=rays.name)
+    keys = list(parameters)
+    for key in keys:
+        apply_setting(copy.deepcopy(column), key, parameters[key][0])
+    grid = [np.asarray(parameters[key]) for key in keys]
+    shape = tuple(len(values) for values in grid)
+    total = int(np.prod(shape))
+
+    if store is None:
+        x = np.empty((total, len(rays)))
+        angle = np.empty((total, len(rays)))
+        todo = np.arange(total)
+    else:
+        from vTEM.Storage import ResultStore  # Imported here since vTEM.Storage imports this module
+
+        if not isinstance(store, ResultStore):
+            if (Path(store) / 'metadata.json').is_file():
+                store = ResultStore(store, mode='r+')
+            else:
+                store = ResultStore.create(store, dict(zip(keys, grid)), len(rays), screen=column.screen)
+        if store.shape != shape + (len(rays),) or list(store.parameters) != keys:
+            raise ValueError('Store {store!r} does not match a sweep of {keys!r} with shape {shape!r}'.format(
+                store=store, keys=keys, shape=shape + (len(rays),)))
+        for key, values in zip(keys, grid):
+            if not np.allclose(store.parameters[key], values):
+                raise ValueError('Store {store!r} was created for other values of {key!r}: {stored!r} instead of '
+                                 '{values!r}'.format(store=store, key=key, stored=store.parameters[key].tolist(),
+                                                     values=values.tolist()))
+        if not np.isclose(store.screen, column.screen):
+            raise ValueError('Store {store!r} was created for a screen at {stored!r}, not at {screen!r}'.format(
+                store=store, stored=store.screen, screen=column.screen))
+        todo = np.flatnonzero(~np.asarray(store.done).reshape(-1))
+        store = str(store.path)
+    if processes == 0:
+        chunks = [_sweep_chunk(column, keys, grid, rays, lenses, todo, store)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # Imported here to keep multiprocessing out of import vTEM
+
+        if chunksize is None:
+            chunksize = max(1, -(-len(todo) // (4 * (processes or os.cpu_count() or 1))))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            blocks = [todo[start:start + chunksize] for start in range(0, len(todo), chunksize)]
+            n = len(blocks)
+            chunks = executor.map(_sweep_chunk, itertools.repeat(column, n), itertools.repeat(keys, n),
+                                  itertools.repeat(grid, n), itertools.repeat(rays, n), itertools.repeat(lenses, n),
+                                  blocks, itertools.repeat(store, n))
+            chunks = list(chunks)
+    if store is not None:
+        return ResultStore(store).result()
+    for indices, chunk_x, chunk_angle in chunks:
+        x[indices] = chunk_x
+        angle[indices] = chunk_angle
+    return SweepResult(dict(zip(keys, grid)), x.reshape(shape + (len(rays),)), angle.reshape(shape + (len(rays),)),
+                       column.screen)
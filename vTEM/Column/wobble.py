@@ -0,0 +1,272 @@
+import numpy as np
+from collections import OrderedDict
+from vTEM.Rays import Ray, RayBundle
+from vTEM.Lenses import Lens, ObjectiveLens, Error, RayTransmitError, RayBlockedError
+
+WOBBLE_PARAMETERS = ('x', 'y', 'f')
+
+
+class WobbleError(Error):
+    pass
+
+
+class Wobble(object):
+    """
+    The rays traced through every phase of a wobble.
+
+    The traced rays are stored as one batched bundle per trace step, holding the rays of all phases phase by phase, so
+    the rays of a single phase are a contiguous slice of every bundle.
+    """
+
+    def __init__(self, settings, values, offsets, traces, n_rays):
+        """
+        Create a wobble result
+        :param settings: The wobbled settings (e.g. "OL.f" or "tilt")
+        :param values: The values of the wobbled settings in each phase, keyed by setting
+        :param offsets: The offsets of the wobbled settings from their current values in each phase, keyed by setting
+        :param traces: The batched ray bundles of each trace step
+        :param n_rays: The number of rays traced in each phase
+        :type settings: tuple
+        :type values: dict
+        :type offsets: dict
+        :type traces: list
+        :type n_rays: int
+        """
+        self.settings = tuple(settings)
+        self.values = values
+        self.offsets = offsets
+        self.traces = traces
+        self.n_rays = int(n_rays)
+        self._segments = None
+
+    def __len__(self):
+        return len(self.traces[0]) // self.n_rays
+
+    def __repr__(self):
+        return '{self.__class__.__name__}(<{n} phases of {self.n_rays} rays>, settings={self.settings!r})'.format(
+            self=self, n=len(self))
+
+    def frame(self, phase):
+        """
+        Return the traced rays of a phase
+        :param phase: The phase index
+        :type phase: int
+        :return: The ray bundles of each trace step
+        :rtype: list
+        """
+        item = slice(phase * self.n_rays, (phase + 1) * self.n_rays)
+        return [bundle[item] for bundle in self.traces]
+
+    def segments(self):
+        """
+        Return the start and end points of every ray segment in every phase.
+
+        In each phase, the segments are ordered ray by ray and then along the beam, like the concatenated traces of
+        the rays traced one at a time.
+        :return: The segments as an array of shape (phases, rays * steps, 2, 2) holding (x, y) start and end points
+        :rtype: np.ndarray
+        """
+        if self._segments is None:
+            points = np.array([[bundle.start_x, bundle.start_y, bundle.stop_x, bundle.stop_y]
+                               for bundle in self.traces])
+            points = points.reshape(len(self.traces), 2, 2, len(self), self.n_rays)
+            self._segments = points.transpose(3, 4, 0, 1, 2).reshape(len(self), -1, 2, 2)
+        return self._segments
+
+    def lens(self, lens, phase):
+        """
+        Return a copy of a lens with the wobbled settings of a phase, e.g. for showing it
+        :param lens: The lens
+        :param phase: The phase index
+        :type lens: Lens, ObjectiveLens
+        :type phase: int
+        :rtype: Lens, ObjectiveLens
+        """
+        offsets = {}
+        for parameter in WOBBLE_PARAMETERS:
+            setting = '{name}.{parameter}'.format(name=lens.name, parameter=parameter)
+            if setting in self.offsets:
+                offsets[parameter] = self.offsets[setting][phase]
+        return _wobbled_lens(lens, **offsets)
+
+
+class Wobbler(object):
+    """
+    Traces all phases of a sinusoidal wobble of column settings in one batch, caching the results.
+
+    Lens settings are wobbled as "<lens>.x", "<lens>.y" or "<lens>.f", and the beam tilt (the angle of the initial
+    rays, in degrees, as with `Ray.tilt`) as "tilt". In phase k of n, a setting with amplitude a and c cycles has the
+    value v + a sin(2 pi c k / n), where v is its current value.
+    """
+
+    def __init__(self, column, phases=32, cache_size=16):
+        """
+        Create a wobbler
+        :param column: The column to wobble
+        :param phases: The number of phases per wobble period. Default is 32
+        :param cache_size: The number of wobbles to cache. Default is 16
+        :type column: Column
+        :type phases: int
+        :type cache_size: int
+        """
+        if int(phases) < 1:
+            raise ValueError('A wobble must have at least one phase, not {phases}'.format(phases=phases))
+        self.column = column
+        self.phases = int(phases)
+        self.cache_size = int(cache_size)
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.column!r}, phases={self.phases!r}, ' \
+               'cache_size={self.cache_size!r})'.format(self=self)
+
+    def clear_cache(self):
+        """
+        Clear the cached wobbles
+        """
+        self._cache.clear()
+
+    def wobble(self, rays, amplitudes, lenses=None, cycles=None):
+        """
+        Return the rays traced through every phase of a wobble.
+
+        Wobbles are cached, keyed by the rays, the amplitudes and the current state of the column.
+        :param rays: The initial rays
+        :param amplitudes: The amplitudes of the wobbled settings, keyed by setting (e.g. {"OL.f": 0.1})
+        :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+        :param cycles: The number of wobble cycles per period, keyed by setting. Default is None (one cycle each)
+        :type rays: Ray, list, RayBundle
+        :type amplitudes: dict
+        :type lenses: list, None
+        :type cycles: dict, None
+        :rtype: Wobble
+        """
+        bundle = _as_bundle(rays)
+        cycles = {} if cycles is None else dict(cycles)
+        key = (tuple(sorted((setting, float(amplitude), int(cycles.get(setting, 1)))
+                            for setting, amplitude in amplitudes.items())),
+               None if lenses is None else tuple(lenses), self.phases, self._signature(bundle))
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = wobble(self.column, bundle, amplitudes, phases=self.phases, lenses=lenses, cycles=cycles)
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _signature(self, bundle):
+        source = self.column.source
+        return (tuple((lens.name, lens.parameters()) for lens in self.column), self.column.screen,
+                (source.x, source.y, source.size, source.z),
+                tuple(np.concatenate([bundle.start_x, bundle.start_y, bundle.stop_y, bundle.angles]).tolist()))
+
+
+def wobble(column, rays, amplitudes, phases=32, lenses=None, cycles=None):
+    """
+    Trace rays through every phase of a sinusoidal wobble of column settings in one batch.
+
+    The rays of all phases are traced together as one bundle, with the wobbled lenses seeing different settings for
+    the rays of each phase. See `Wobbler` for the wobbled settings.
+    :param column: The column to wobble
+    :param rays: The initial rays
+    :param amplitudes: The amplitudes of the wobbled settings, keyed by setting (e.g. {"OL.f": 0.1})
+    :param phases: The number of phases per wobble period. Default is 32
+    :param lenses: The names of the lenses to trace through. Default is None (all lenses)
+    :param cycles: The number of wobble cycles per period, keyed by setting. Default is None (one cycle each)
+    :type column: Column
+    :type rays: Ray, list, RayBundle
+    :type amplitudes: dict
+    :type phases: int
+    :type lenses: list, None
+    :type cycles: dict, None
+    :return: The traced rays of every phase
+    :rtype: Wobble
+    """
+    bundle = _as_bundle(rays)
+    n_rays = len(bundle)
+    cycles = {} if cycles is None else cycles
+    phase = 2 * np.pi * np.arange(phases) / phases
+    values = {}
+    offsets = {}
+    overrides = {}
+    for setting, amplitude in amplitudes.items():
+        offsets[setting] = float(amplitude) * np.sin(int(cycles.get(setting, 1)) * phase)
+        if setting == 'tilt':
+            values[setting] = offsets[setting]
+            continue
+        name, _, parameter = setting.rpartition('.')
+        if parameter not in WOBBLE_PARAMETERS:
+            raise WobbleError('Cannot wobble {setting!r}. Please specify "tilt" or one of "<lens>.{parameters}"'.format(
+                setting=setting, parameters='", "<lens>.'.join(WOBBLE_PARAMETERS)))
+        lens = column[name]
+        if not isinstance(lens, (Lens, ObjectiveLens)):
+            raise WobbleError('Cannot wobble {setting!r} of {lens!r}'.format(setting=setting, lens=lens))
+        values[setting] = _current(lens, parameter) + offsets[setting]
+        overrides.setdefault(lens.name, {})[parameter] = np.repeat(offsets[setting], n_rays)
+
+    batch = RayBundle.from_arrays(np.tile(bundle.start_x, phases), np.tile(bundle.start_y, phases),
+                                  np.tile(bundle.stop_y, phases), np.tile(bundle.angles, phases), name=bundle.name)
+    if 'tilt' in values:
+        batch.tilt(np.repeat(values['tilt'], n_rays))
+    traces = [batch]
+    for lens in column:
+        if lenses is not None and lens.name not in lenses:
+            continue
+        try:
+            transmitted = _transmit(lens, traces[-1], overrides.get(lens.name, {}))
+        except (ZeroDivisionError, RayBlockedError):
+            break
+        except RayTransmitError:
+            continue
+        traces.extend(transmitted)
+    return Wobble(amplitudes.keys(), values, offsets, traces, n_rays)
+
+
+def _as_bundle(rays):
+    if isinstance(rays, RayBundle):
+        return rays
+    if isinstance(rays, Ray):
+        rays = [rays]
+    return RayBundle.from_rays(rays)
+
+
+def _current(lens, parameter):
+    if parameter == 'f':
+        return lens.focal_lengths[1] if isinstance(lens, ObjectiveLens) else lens.focal_length
+    return getattr(lens, parameter)
+
+
+def _transmit(lens, bundle, offsets):
+    """
+    Transmit a bundle through a lens with settings offset per ray, returning the transmitted bundles.
+
+    The fields of an objective lens are offset together.
+    """
+    if not offsets:
+        transmitted = lens(bundle)
+        return transmitted if isinstance(transmitted, list) else [transmitted]
+    transmitted = []
+    for field in lens.get_fields():
+        settings = {}
+        if 'x' in offsets:
+            settings['x'] = field.x + offsets['x']
+        if 'y' in offsets:
+            settings['y'] = field.y + offsets['y']
+        if 'f' in offsets:
+            settings['focal_length'] = field.focal_length + offsets['f']
+        bundle = field.transmit_bundle(bundle, **settings)
+        transmitted.append(bundle)
+    return transmitted
+
+
+def _wobbled_lens(lens, x=0., y=0., f=0.):
+    if isinstance(lens, ObjectiveLens):
+        return ObjectiveLens(lens.y + y, tuple(focal_length + f for focal_length in lens.focal_lengths), lens.gap,
+                             x=lens.x + x, size=lens.size, name=lens.name, z=lens.z)
+    return Lens(lens.y + y, lens.focal_length + f, x=lens.x + x, size=lens.size, name=lens.name, z=lens.z)
@@ -1 +1,2 @@
-from .lens import *
\ No newline at end of file
+from .lens import *
+from .aperture import *
@@ -0,0 +1,195 @@
+from vTEM.Rays import Ray, RayNode, RayBundle
+from vTEM.Lenses.lens import RayTransmitError
+from math import tan
+import numpy as np
+
+
+class RayBlockedError(RayTransmitError):
+    pass
+
+
+class Aperture(object):
+    """
+    An aperture (e.g. a condenser, objective or selected-area aperture) stopping rays outside a circular opening.
+
+    Rays pass the aperture unchanged. In ray bundles, rays outside the opening are marked as blocked in the mask of the
+    transmitted bundle, so that later lenses skip them. A single blocked ray raises a RayBlockedError.
+    """
+
+    def __init__(self, y, diameter, x=0, size=None, name='', z=0):
+        """
+        Create an aperture.
+        :param y: The position of the aperture along the optical axis
+        :param diameter: The diameter of the opening
+        :param x: The position of the centre of the opening perpendicular to the optical axis. Default is 0
+        :param size: The size of the aperture blades when shown. Default is None (twice the diameter)
+        :param name: The name of the aperture. Default is ""
+        :param z: The position of the centre of the opening along the second transverse axis. Default is 0
+        :type y: float
+        :type diameter: float
+        :type x: float
+        :type size: float, None
+        :type name: str
+        :type z: float
+        """
+        self.y = float(y)
+        self.diameter = abs(float(diameter))
+        self.x = float(x)
+        self.size = 2 * self.diameter if size is None else abs(float(size))
+        self.name = str(name)
+        self.z = float(z)
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.y!r}, {self.diameter!r}, x={self.x!r}, size={self.size!r}, ' \
+               'name={self.name!r}, z={self.z!r})'.format(self=self)
+
+    def __str__(self):
+        return '{self.__class__.__name__} {self.name}: {self.y:.2f} ({self.diameter:.2f}) | {self.x:.2f}'.format(
+            self=self)
+
+    def __lt__(self, other):
+        return self.y < other
+
+    def __gt__(self, other):
+        return self.y > other
+
+    def __call__(self, ray, *args, stop=None, **kwargs):
+        if isinstance(ray, RayBundle):
+            return self.transmit_bundle(ray, stop=stop)
+        if not isinstance(ray, Ray):
+            raise TypeError('Ray {ray!r} must be type Ray or RayBundle, not {t}'.format(ray=ray, t=type(ray)))
+        if not self < ray.start:
+            raise RayTransmitError(
+                'Aperture {self} must be positioned after start of ray {ray}'.format(self=self, ray=ray))
+        angle = ray.angle(deg=False)
+        if stop is None or not stop < self.y:
+            stop = ray.stop.y if ray.stop.y < self.y else self.y + ray.dy()
+        ray.extend(self.y)
+        if abs(ray.stop.x - self.x) > self.diameter / 2:
+            raise RayBlockedError('Ray {ray} is blocked by aperture {self}'.format(ray=ray, self=self))
+        return Ray(ray.stop, RayNode(ray.stop.x + tan(angle) * (self.y - stop), stop), name=ray.name)
+
+    def transmit_bundle(self, bundle, stop=None):
+        """
+        Transmit the rays in a bundle through the aperture.
+
+        The incoming rays are extended to the aperture and the transmitted rays continue from the aperture to `stop`,
+        e.g. the next element or the screen. Without a stop below the aperture, they continue to where the incoming
+        rays ended, or as far below the aperture as the incoming rays reached along the optical axis if they ended
+        above it. Rays outside the opening (in the x-z plane for skew rays) are added to the blocked rays of the
+        bundle. The transmitted bundle shares the angles and energies of the incoming bundle.
+        :param bundle: The rays to transmit
+        :param stop: The position along the optical axis where the transmitted rays end. Default is None
+        :type bundle: RayBundle
+        :type stop: float, None
+        :return: The transmitted rays
+        :rtype: RayBundle
+        """
+        if not np.all(self.y < bundle.start_y):
+            raise RayTransmitError('Aperture {self} must be positioned after start of all rays in {bundle!r}'.format(
+                self=self, bundle=bundle))
+        if stop is not None and stop < self.y:
+            stop_y = np.full_like(bundle.stop_y, stop)
+        else:
+            stop_y = np.where(bundle.stop_y < self.y, bundle.stop_y, self.y - (bundle.start_y - bundle.stop_y))
+        bundle.extend(self.y)
+        x = bundle.x_at_y(self.y, check=False)
+        offset = np.abs(x - self.x)
+        z = None
+        if bundle.skew:
+            z = bundle.z_at_y(self.y, check=False)
+            offset = np.hypot(offset, z - self.z)
+        with np.errstate(invalid='ignore'):
+            blocked = ~(offset <= self.diameter / 2)
+        if bundle.blocked is not None:
+            blocked |= bundle.blocked
+        if blocked.any():
+            x[blocked] = np.nan
+            if z is not None:
+                z[blocked] = np.nan
+        return RayBundle.from_arrays(x, np.full_like(x, self.y), stop_y, bundle.angles, name=bundle.name, start_z=z,
+                                     angles_z=bundle.angles_z, energies=bundle.energies, blocked=blocked)
+
+    def set_x(self, x):
+        self.x = float(x)
+
+    def set_y(self, y):
+        self.y = float(y)
+
+    def set_z(self, z):
+        self.z = float(z)
+
+    def set_diameter(self, diameter):
+        self.diameter = abs(float(diameter))
+
+    def set_size(self, size):
+        self.size = abs(float(size))
+
+    def parameters(self):
+        """
+        Return the parameters that determine how the aperture transmits rays
+        :rtype: tuple
+        """
+        return self.x, self.y, self.diameter, self.z
+
+    def matrix(self, augmented=False, axis='x'):
+        """
+        Return the paraxial ray-transfer matrix of the aperture, which is the identity
+        :param augmented: Whether to return the augmented 3x3 matrix or not. Default is False
+        :param axis: The transverse axis of the offsets in the augmented matrix. Not used
+        :type augmented: bool
+        :type axis: str
+        :rtype: np.ndarray
+        """
+        return np.eye(3 if augmented else 2)
+
+    @property
+    def entrance(self):
+        """The position along the optical axis where rays enter the aperture"""
+        return self.y
+
+    @property
+    def exit(self):
+        """The position along the optical axis where rays leave the aperture"""
+        return self.y
+
+    def lines(self):
+        """
+        Return the line used to show the aperture blades as an (x-data, y-data) pair keyed by "lens"
+        :rtype: dict
+        """
+        radius = self.diameter / 2
+        outer = max(self.size / 2, radius)
+        return {'lens': ([self.x - outer, self.x - radius, np.nan, self.x + radius, self.x + outer],
+                         [self.y] * 5)}
+
+    def labels(self):
+        """
+        Return the label used to show the aperture as a (text, position) pair keyed by "lens"
+        :rtype: dict
+        """
+        return {'lens': ('{self.name}'.format(self=self), (self.x + max(self.size, self.diameter) / 2, self.y))}
+
+    def get_fields(self):
+        """
+        Return the elements acting on rays, for drawing and tracing
+        :rtype: list
+        """
+        return [self]
+
+    def show(self, ax, *args, lensprops=None, label_lens=True, **kwargs):
+        """
+        Show the aperture
+        :param ax: matplotlib.pyplot.Axes object
+        :param args: Optional positional arguments passed to ax.plot()
+        :param lensprops: Line properties for the "lens" line. Default is None
+        :param label_lens: Whether to label the aperture or not. Default is True
+        """
+        style = {'linestyle': '-', 'color': 'k', 'alpha': 0.5}
+        if lensprops is not None:
+            style.update(lensprops.get('lens', {}))
+        x, y = self.lines()['lens']
+        ax.plot(x, y, *args, **style)
+        if label_lens:
+            text, position = self.labels()['lens']
+            ax.annotate(text, xy=position, ha='left', va='center')
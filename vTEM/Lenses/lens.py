@@ -1,5 +1,8 @@
-from vTEM.Rays import Ray, RayNode
+from vTEM.Rays import Ray, RayNode, RayBundle
+from vTEM.Profiling import timed
 from math import atan
+from collections import OrderedDict
+import numpy as np
 
 class Error(Exception):
     pass
@@ -7,12 +10,53 @@ class Error(Exception):
 class RayTransmitError(Error):
     pass
 
+
+class _LRUCache(object):
+    """
+    A bounded mapping discarding the least recently used entries
+    """
+
+    def __init__(self, size):
+        self.size = int(size)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self._data.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
 class Lens(object):
     """
     A lens object for creating images of objects and bending rays
+
+    Rays transmitted by the lens are cached, keyed by the lens parameters and the incoming ray rounded to
+    `cache_decimals` decimals, so retracing an unchanged ray only rebuilds the transmitted ray. Since the lens parameters
+    are part of the key, changing them needs no invalidation, and returning to earlier settings hits the cache again.
     """
 
-    def __init__(self, y, focal_length, x=0, size=1, name=''):
+    transmit_cache_size = 256
+    cache_decimals = 12
+
+    def __init__(self, y, focal_length, x=0, size=1, name='', z=0):
         """
         Create a lens object.
         :param y: The position of the lens along the optical axis
@@ -20,11 +64,13 @@ class Lens(object):
         :param x: The position of the center of the lens perpendicular to the optical axis. Default is 0
         :param size: The size of the lens. Default is 1.
         :param name: The name of the lens. Default is ""
+        :param z: The position of the center of the lens along the second transverse axis, for skew rays. Default is 0
         :type y: float
         :type focal_length: float
         :type x: float
         :type size: float
         :type name: str
+        :type z: float
         """
 
         self.y = float(y)
@@ -32,10 +78,11 @@ class Lens(object):
         self.x = float(x)
         self.size = abs(float(size))
         self.name = str(name)
+        self.z = float(z)
 
     def __repr__(self):
         return '{self.__class__.__name__}({self.y!r}, {self.focal_length!r}, x={self.x!r}, size={self.size!r}, ' \
-               'name={self.name!r})'.format(self=self)
+               'name={self.name!r}, z={self.z!r})'.format(self=self)
 
     def __format__(self, format_spec):
         return '{self.y:{f}} ({self.focal_length:{f}})'.format(self=self, f=format_spec)
@@ -93,12 +140,26 @@ class Lens(object):
     def __pow__(self, power, modulo=None):
         return self.y.__pow__(power, modulo)
 
+    @timed('Lens.__call__')
     def __call__(self, ray, *args, **kwargs):
+        if isinstance(ray, RayBundle):
+            return self.transmit_bundle(ray)
         if not isinstance(ray, Ray):
-            raise TypeError('Ray {ray!r} must be type Ray, not {t}'.format(ray=ray, t=type(ray)))
+            raise TypeError('Ray {ray!r} must be type Ray or RayBundle, not {t}'.format(ray=ray, t=type(ray)))
 
         if not self < ray.start:
             raise RayTransmitError('Lens {self} must be positioned after start of ray {ray}'.format(self=self, ray=ray))
+        key = (self.x, self.y, self.focal_length, round(ray.start.x, self.cache_decimals),
+               round(ray.start.y, self.cache_decimals), round(ray.angle(deg=False), self.cache_decimals))
+        cache = self.transmit_cache()
+        transmitted = cache.get(key)
+        if transmitted is not None:
+            ray.extend(self.y)
+            start_x, start_y, stop_x, stop_y, shared = transmitted
+            if shared:
+                ray.stop.x, ray.stop.y = start_x, start_y
+                return Ray(ray.stop, RayNode(stop_x, stop_y))
+            return Ray(RayNode(start_x, start_y), RayNode(stop_x, stop_y))
         ray.extend(self.y)
         transmitted_ray = Ray(ray.stop, RayNode(self.x, self.y - self.focal_length))
         transmitted_ray.set_angle(ray.angle(deg=False) - atan((transmitted_ray.start.x - self.x) / self.focal_length),
@@ -108,8 +169,79 @@ class Lens(object):
                                   name=transmitted_ray.name)
         transmitted_ray.extend(self.y - self.focal_length)
         transmitted_ray.cut(self.y)
+        cache.put(key, (transmitted_ray.start.x, transmitted_ray.start.y, transmitted_ray.stop.x,
+                        transmitted_ray.stop.y, transmitted_ray.start is ray.stop))
         return transmitted_ray
 
+    def transmit_cache(self):
+        """
+        Return the cache of transmitted rays
+        :rtype: _LRUCache
+        """
+        cache = self.__dict__.get('_transmit_cache')
+        if cache is None:
+            cache = self._transmit_cache = _LRUCache(self.transmit_cache_size)
+        return cache
+
+    def clear_cache(self):
+        """
+        Clear the cache of transmitted rays
+        """
+        self.transmit_cache().clear()
+
+    def transmit_bundle(self, bundle, x=None, y=None, focal_length=None):
+        """
+        Transmit all rays in a bundle through the lens using array operations.
+
+        Equivalent to calling the lens on each ray separately: the incoming rays are extended to the lens and the
+        returned bundle spans from the lens to its back focal plane. Skew rays are bent in both transverse directions,
+        sharing the propagation along the optical axis between them.
+
+        Rays with a relative energy deviation dE/E see the first-order chromatic focal length f(1 + dE/E), so the
+        transmitted rays of a polychromatic bundle end at different back focal planes.
+
+        Rays blocked by an aperture are skipped, and their transmitted positions and angles are NaN.
+
+        The lens parameters can be overridden with one value per ray, to trace several lens settings in one batch.
+        :param bundle: The rays to transmit
+        :param x: The position of the lens centre seen by each ray. Default is None (the position of the lens)
+        :param y: The position of the lens along the optical axis seen by each ray. Default is None (the lens position)
+        :param focal_length: The focal length seen by each ray. Default is None (the focal length of the lens)
+        :type bundle: RayBundle
+        :type x: float, np.ndarray, None
+        :type y: float, np.ndarray, None
+        :type focal_length: float, np.ndarray, None
+        :return: The transmitted rays
+        :rtype: RayBundle
+        """
+        x0 = self.x if x is None else np.asarray(x, dtype=float)
+        y0 = self.y if y is None else np.asarray(y, dtype=float)
+        focal_length = self.focal_length if focal_length is None else np.abs(np.asarray(focal_length, dtype=float))
+        if not np.all(y0 < bundle.start_y):
+            raise RayTransmitError(
+                'Lens {self} must be positioned after start of all rays in {bundle!r}'.format(self=self, bundle=bundle))
+        if np.any(focal_length == 0):
+            raise ZeroDivisionError('Cannot transmit rays through lens {self} with zero focal length'.format(self=self))
+        bundle.extend(y0)
+        active = _active(bundle)
+        n = len(bundle)
+        dy = bundle.start_y[active] - bundle.stop_y[active]
+        x = bundle.start_x[active] + np.tan(bundle.angles[active]) * dy
+        focal_length = _select(focal_length, active)
+        if bundle.energies is not None:
+            focal_length = focal_length * (1 + bundle.energies[active])
+        angles = _bend(bundle.angles[active], x - _select(x0, active), focal_length)
+        x, angles = _scatter(x, active, n), _scatter(angles, active, n)
+        y = np.zeros_like(x) + y0
+        stop_y = y - _scatter(focal_length, active, n) if np.ndim(focal_length) else y - focal_length
+        z, angles_z = None, None
+        if bundle.start_z is not None:
+            z = bundle.start_z[active] + np.tan(bundle.angles_z[active]) * dy
+            angles_z = _scatter(_bend(bundle.angles_z[active], z - self.z, focal_length), active, n)
+            z = _scatter(z, active, n)
+        return RayBundle.from_arrays(x, y, stop_y, angles, name=bundle.name, start_z=z, angles_z=angles_z,
+                                     energies=bundle.energies, blocked=bundle.blocked)
+
     def set_x(self, x):
         self.x = float(x)
 
@@ -119,9 +251,77 @@ class Lens(object):
     def set_y(self, y):
         self.y = float(y)
 
+    def set_z(self, z):
+        self.z = float(z)
+
     def set_size(self, size):
         self.size = abs(float(size))
 
+    def parameters(self):
+        """
+        Return the parameters that determine how the lens transmits rays
+        :rtype: tuple
+        """
+        return self.x, self.y, self.focal_length, self.z
+
+    def matrix(self, augmented=False, axis='x'):
+        """
+        Return the paraxial ray-transfer (ABCD) matrix of the lens.
+
+        The matrix acts on (x, angle) column vectors, with the angle in radians. The 2x2 matrix describes the lens
+        relative to its own centre and is the same for both transverse axes. The augmented 3x3 matrix acts on
+        (x, angle, 1) and includes the lens offset along `axis`.
+        :param augmented: Whether to return the augmented 3x3 matrix or not. Default is False
+        :param axis: The transverse axis of the lens offset in the augmented matrix, "x" or "z". Default is "x"
+        :type augmented: bool
+        :type axis: str
+        :return: The transfer matrix
+        :rtype: np.ndarray
+        """
+        power = 1 / self.focal_length
+        if augmented:
+            return np.array([[1., 0., 0.], [-power, 1., _offset(self, axis) * power], [0., 0., 1.]])
+        return np.array([[1., 0.], [-power, 1.]])
+
+    @property
+    def entrance(self):
+        """The position along the optical axis where rays enter the lens"""
+        return self.y
+
+    @property
+    def exit(self):
+        """The position along the optical axis where rays leave the lens"""
+        return self.y
+
+    def lines(self):
+        """
+        Return the lines used to show the lens as (x-data, y-data) pairs keyed by "lens", "ffp", "bfp" and "axis"
+        :rtype: dict
+        """
+        left = self.x - self.size / 2
+        right = self.x + self.size / 2
+        return {'lens': ([left, right], [self.y, self.y]),
+                'ffp': ([left, right], [self.y + self.focal_length, self.y + self.focal_length]),
+                'bfp': ([left, right], [self.y - self.focal_length, self.y - self.focal_length]),
+                'axis': ([self.x, self.x], [self.y + self.focal_length, self.y + self.focal_length])}
+
+    def labels(self):
+        """
+        Return the labels used to show the lens as (text, position) pairs keyed by "lens", "ffp" and "bfp"
+        :rtype: dict
+        """
+        right = self.x + self.size / 2
+        return {'lens': ('{self.name}'.format(self=self), (right, self.y)),
+                'ffp': ('{self.name} FFP'.format(self=self), (right, self.y + self.focal_length)),
+                'bfp': ('{self.name} BFP'.format(self=self), (right, self.y - self.focal_length))}
+
+    def get_fields(self):
+        """
+        Return the lenses acting on rays, for drawing and tracing
+        :rtype: list
+        """
+        return [self]
+
     def show(self, ax, *args, lensprops=None, label_lens = True, label_focal_planes=True):  # , **kwargs):
         plotstyle = {'ffp': {'linestyle': '--', 'color': 'k', 'alpha': 0.2},
                      'bfp': {'linestyle': '--', 'color': 'k', 'alpha': 0.2},
@@ -130,23 +330,28 @@ class Lens(object):
         if lensprops is None:
             lensprops = {}
         plotstyle.update(lensprops)
-        ax.plot([self.x - self.size / 2, self.x + self.size / 2], [self.y, self.y], *args, **plotstyle.get('lens'))
-        ax.plot([self.x - self.size / 2, self.x + self.size / 2],
-                [self.y + self.focal_length, self.y + self.focal_length], *args, **plotstyle.get('ffp'))
-        ax.plot([self.x - self.size / 2, self.x + self.size / 2],
-                [self.y - self.focal_length, self.y - self.focal_length], *args, **plotstyle.get('bfp'))
-        ax.plot([self.x, self.x], [self.y + self.focal_length, self.y + self.focal_length], *args, **plotstyle.get('axis'))
+        for key, (x, y) in self.lines().items():
+            ax.plot(x, y, *args, **plotstyle.get(key))
 
+        labels = self.labels()
         if label_lens:
-            ax.annotate('{self.name}'.format(self=self), xy=(self.x + self.size / 2, self.y), ha='left', va='center')
+            ax.annotate(labels['lens'][0], xy=labels['lens'][1], ha='left', va='center')
         if label_focal_planes:
-            ax.annotate('{self.name} FFP'.format(self=self), xy=(self.x + self.size / 2, self.y + self.focal_length),
-                        ha='left', va='center')
-            ax.annotate('{self.name} BFP'.format(self=self), xy=(self.x + self.size / 2, self.y - self.focal_length),
-                        ha='left', va='center')
+            ax.annotate(labels['ffp'][0], xy=labels['ffp'][1], ha='left', va='center')
+            ax.annotate(labels['bfp'][0], xy=labels['bfp'][1], ha='left', va='center')
 
 class ObjectiveLens(object):
-    def __init__(self, y, focal_lengths, gap, x=0.0, size=1, name='OL', coupled=False):
+    """
+    An objective lens with a prefield and a postfield
+
+    The prefield and postfield lenses are cached for the last `field_cache_size` lens settings, so that they (and the
+    rays they have transmitted) are reused rather than rebuilt on every call. Changing the lens through the setters
+    selects (or builds) the fields for the new settings.
+    """
+
+    field_cache_size = 8
+
+    def __init__(self, y, focal_lengths, gap, x=0.0, size=1, name='OL', coupled=False, z=0.0):
         """
         Create an objective lens with a prefield and a postfield acting as coupled or decoupled lenses.
         :param y: The position of the middle of the objective lens along the optical axis.
@@ -156,6 +361,7 @@ class ObjectiveLens(object):
         :param size: The size of the lens. Default is 1
         :param name: The name of the lens. Default is "OL".
         :param coupled: Whether to couple the prefield and postfield.
+        :param z: The position of the centre of the lens along the second transverse axis. Default is 0.0
         :type y: float
         :type focal_length: tuple
         :type gap: float
@@ -163,6 +369,7 @@ class ObjectiveLens(object):
         :type size: float
         :type name: str
         :type coupled: bool
+        :type z: float
         """
         self.gap = abs(float(gap))
         self.y = float(y)
@@ -171,6 +378,7 @@ class ObjectiveLens(object):
         self.focal_lengths = (abs(float(focal_lengths[0])), abs(float(focal_lengths[1])))
         self.name = str(name)
         self.coupled = bool(coupled)
+        self.z = float(z)
 
     def __repr__(self):
         return '{self.__class__.__name__}({self.y!r}, {self.focal_lengths!r}, {self.gap!r}, x={self.x!r}, size={self.size!r}, ' \
@@ -233,8 +441,9 @@ class ObjectiveLens(object):
         return self.y.__pow__(power, modulo)
 
     def __call__(self, ray, *args, **kwargs):
-        prefield = self.get_prefield()
-        postfield = self.get_postfield()
+        if not isinstance(ray, (Ray, RayBundle)):
+            raise TypeError('Ray {ray!r} must be type Ray or RayBundle, not {t}'.format(ray=ray, t=type(ray)))
+        prefield, postfield = self._get_fields()
         prefield_ray = prefield(ray)
         postfield_ray = postfield(prefield_ray)
         return [prefield_ray, postfield_ray]
@@ -268,20 +477,89 @@ class ObjectiveLens(object):
     def set_gap(self, gap):
         self.gap = abs(float(gap))
 
+    def set_z(self, z):
+        self.z = float(z)
+
     def set_size(self, size):
         self.size = abs(float(size))
 
+    def field_cache(self):
+        """
+        Return the cache of prefield and postfield lenses
+        :rtype: _LRUCache
+        """
+        cache = self.__dict__.get('_field_cache')
+        if cache is None:
+            cache = self._field_cache = _LRUCache(self.field_cache_size)
+        return cache
+
+    def clear_cache(self):
+        """
+        Clear the cached prefield and postfield lenses
+        """
+        self.field_cache().clear()
+
+    def _get_fields(self):
+        key = (self.x, self.y, self.focal_lengths, self.gap, self.name, self.z)
+        cache = self.field_cache()
+        fields = cache.get(key)
+        if fields is None:
+            fields = (Lens(self.y + self.gap / 2, focal_length=self.focal_lengths[0], x=self.x, size=self.size,
+                           name='{name} prefield'.format(name=self.name), z=self.z),
+                      Lens(self.y - self.gap / 2, focal_length=self.focal_lengths[1], x=self.x, size=self.size,
+                           name='{name} postfield'.format(name=self.name), z=self.z))
+            cache.put(key, fields)
+        elif fields[0].size != self.size:
+            for field in fields:
+                field.set_size(self.size)
+        return fields
+
     def get_prefield(self):
-        return Lens(self.y + self.gap / 2, focal_length=self.focal_lengths[0], x=self.x, size=self.size,
-                    name='{name} prefield'.format(name=self.name))
+        return self._get_fields()[0]
 
     def get_postfield(self):
-        return Lens(self.y - self.gap / 2, focal_length=self.focal_lengths[1], x=self.x, size=self.size,
-                    name='{name} postfield'.format(name=self.name))
+        return self._get_fields()[1]
+
+    def parameters(self):
+        """
+        Return the parameters that determine how the lens transmits rays
+        :rtype: tuple
+        """
+        return self.x, self.y, self.focal_lengths, self.gap, self.z
+
+    def matrix(self, augmented=False, axis='x'):
+        """
+        Return the paraxial ray-transfer (ABCD) matrix from the prefield to the postfield, including the gap.
+        :param augmented: Whether to return the augmented 3x3 matrix including the lens offset or not. Default is False
+        :param axis: The transverse axis of the lens offset in the augmented matrix, "x" or "z". Default is "x"
+        :type augmented: bool
+        :type axis: str
+        :return: The transfer matrix
+        :rtype: np.ndarray
+        """
+        return self.get_postfield().matrix(augmented, axis) @ drift_matrix(self.gap, augmented) @ \
+               self.get_prefield().matrix(augmented, axis)
+
+    @property
+    def entrance(self):
+        """The position along the optical axis where rays enter the prefield"""
+        return self.y + self.gap / 2
+
+    @property
+    def exit(self):
+        """The position along the optical axis where rays leave the postfield"""
+        return self.y - self.gap / 2
+
+    def get_fields(self):
+        """
+        Return the prefield and postfield lenses
+        :rtype: list
+        """
+        return list(self._get_fields())
 
     def show(self, ax, *args, **kwargs):
-        self.get_prefield().show(ax, *args, **kwargs)
-        self.get_postfield().show(ax, *args, **kwargs)
+        for field in self.get_fields():
+            field.show(ax, *args, **kwargs)
 
 
 class Source(object):
@@ -289,22 +567,25 @@ class Source(object):
     A source capable of emitting rays
     """
 
-    def __init__(self, x, y, size, name=''):
+    def __init__(self, x, y, size, name='', z=0):
         """
         Create a new source
         :param x: x-position of source (position of source centre perpendicular to the optical axis)
         :param y: y-position of source (position of source along the optical axis)
         :param size: Size of the source
         :param name: Name of the source. Default is ""
+        :param z: z-position of source (position of source centre along the second transverse axis). Default is 0
         :type x: float
         :type y: float
         :type size: float
         :type name: str
+        :type z: float
         """
         self.x = float(x)
         self.y = float(y)
         self.size = abs(float(size))
         self.name = str(name)
+        self.z = float(z)
 
     def __str__(self):
         return '{self.__class__.__name__} {self.name} with size {self.size:.2f} at ({self.x:.2f}, {self.y:.2f})'.format(
@@ -319,6 +600,9 @@ class Source(object):
     def set_size(self, size):
         self.size = abs(float(size))
 
+    def set_z(self, z):
+        self.z = float(z)
+
     def show(self, ax, *args, **kwargs):
         """
         Show the source
@@ -329,17 +613,279 @@ class Source(object):
         """
         ax.plot((self.x - self.size / 2, self.x + self.size / 2), (self.y, self.y))
 
+    @timed('emit_ray')
     def emit_ray(self, angle, position=0, length=1):
         """
         Return a ray emitted from the source
+
+        If `angle` or `position` are arrays, a RayBundle with one ray per element is returned instead.
         :param length: The length of the emitted ray along the optical axis.
         :param angle: The angle of the emitted ray in degrees
         :param position: The initial point of the ray in a fraction of the size of the source size
         :return: The emitted ray
-        :rtype: Ray
+        :rtype: Ray, RayBundle
         """
+        if np.ndim(angle) > 0 or np.ndim(position) > 0:
+            return self.emit_bundle(angle, position, length)
         start = RayNode(self.x + (position * self.size / 2), self.y)
         stop = RayNode(self.x, self.y - abs(length))
         ray = Ray(start, stop, angle=angle, name='Emitted from {self.name}'.format(self=self))
         # ray.extend(abs(length), relative=True)
         return ray
+
+    def emit_bundle(self, angles, positions=0, length=1, angles_z=None, positions_z=None):
+        """
+        Return a bundle of rays emitted from the source
+
+        Skew rays are emitted if `angles_z` or `positions_z` are given.
+        :param angles: The angles of the emitted rays in degrees
+        :param positions: The initial points of the rays in a fraction of the size of the source size
+        :param length: The length of the emitted rays along the optical axis.
+        :param angles_z: The angles of the emitted rays in the z-y plane in degrees. Default is None
+        :param positions_z: The initial z-points of the rays in a fraction of the size of the source. Default is None
+        :type angles: float, np.ndarray
+        :type positions: float, np.ndarray
+        :type length: float
+        :type angles_z: float, np.ndarray, None
+        :type positions_z: float, np.ndarray, None
+        :return: The emitted rays
+        :rtype: RayBundle
+        """
+        z = None
+        if angles_z is not None or positions_z is not None:
+            z = self.z + np.asarray(0 if positions_z is None else positions_z, dtype=float) * self.size / 2
+            angles_z = 0 if angles_z is None else angles_z
+        return RayBundle(self.x + np.asarray(positions, dtype=float) * self.size / 2, self.y, angles, length=length,
+                         name='Emitted from {self.name}'.format(self=self), z=z, angle_z=angles_z)
+
+    def sample(self, n, spot='uniform', angle=0, spread=0, angular='gaussian', energy_spread=0, skew=True, length=1,
+               seed=None):
+        """
+        Return a bundle of randomly sampled rays emitted from the source.
+
+        Start points are drawn from a uniform disc with the diameter of the source (`spot="uniform"`) or a Gaussian
+        spot with the source size as full width at half maximum (`spot="gaussian"`). Angles are spread around `angle`,
+        either uniformly within a cone of half-angle `spread` (`angular="uniform"`) or normally with standard deviation
+        `spread` (`angular="gaussian"`). Meridional rays (`skew=False`) are drawn from the corresponding
+        one-dimensional distributions.
+        :param n: The number of rays
+        :param spot: The spatial distribution, "uniform" or "gaussian". Default is "uniform"
+        :param angle: The mean angle of the rays in degrees. Default is 0
+        :param spread: The angular spread of the rays in degrees. Default is 0
+        :param angular: The angular distribution, "uniform" or "gaussian". Default is "gaussian"
+        :param energy_spread: The standard deviation of the relative energy deviations dE/E. Default is 0 (monochromatic)
+        :param skew: Whether to sample skew rays or meridional rays. Default is True
+        :param length: The length of the emitted rays along the optical axis. Default is 1
+        :param seed: The seed or random number generator. Default is None (fresh entropy)
+        :type n: int
+        :type spot: str
+        :type angle: float
+        :type spread: float
+        :type angular: str
+        :type energy_spread: float
+        :type skew: bool
+        :type length: float
+        :type seed: int, np.random.Generator, None
+        :return: The sampled rays
+        :rtype: RayBundle
+        """
+        rng = np.random.default_rng(seed)
+        n = int(n)
+        if n < 0:
+            raise ValueError('Cannot sample {n} rays'.format(n=n))
+        dimensions = 2 if skew else 1
+        positions = _sample(rng, n, dimensions, spot, self.size / 2, self.size / (2 * np.sqrt(2 * np.log(2))))
+        angles = _sample(rng, n, dimensions, angular, abs(spread), abs(spread))
+        energies = rng.normal(0., abs(energy_spread), n) if energy_spread else None
+        return RayBundle(self.x + positions[0], self.y, angle + angles[0], length=length,
+                         name='Emitted from {self.name}'.format(self=self), z=self.z + positions[1] if skew else None,
+                         angle_z=angles[1] if skew else None, energy=energies)
+
+    def stream(self, n, chunk_size=100000, seed=None, **kwargs):
+        """
+        Generate randomly sampled rays emitted from the source in bundles of at most `chunk_size` rays.
+
+        The chunks are drawn from a single generator, so a seeded stream is reproducible.
+        :param n: The total number of rays
+        :param chunk_size: The maximum number of rays per bundle. Default is 100000
+        :param seed: The seed or random number generator. Default is None (fresh entropy)
+        :param kwargs: Optional keyword arguments passed to Source.sample()
+        :type n: int
+        :type chunk_size: int
+        :type seed: int, np.random.Generator, None
+        :return: The sampled bundles
+        :rtype: generator
+        """
+        chunk_size = int(chunk_size)
+        if chunk_size < 1:
+            raise ValueError('Chunk size must be positive, not {chunk_size}'.format(chunk_size=chunk_size))
+        rng = np.random.default_rng(seed)
+        for start in range(0, int(n), chunk_size):
+            yield self.sample(min(chunk_size, int(n) - start), seed=rng, **kwargs)
+
+
+def _sample(rng, n, dimensions, distribution, radius, sigma):
+    """
+    Return n points from a uniform disc (or segment) of a given radius or a normal distribution as a (2, n) array
+    """
+    points = np.zeros((2, n))
+    if distribution == 'uniform':
+        if dimensions == 1:
+            points[0] = rng.uniform(-radius, radius, n)
+        else:
+            r = radius * np.sqrt(rng.random(n))
+            phi = rng.uniform(0., 2 * np.pi, n)
+            points[0] = r * np.cos(phi)
+            points[1] = r * np.sin(phi)
+    elif distribution == 'gaussian':
+        points[:dimensions] = rng.normal(0., sigma, (dimensions, n))
+    else:
+        raise ValueError('Distribution {distribution!r} not recognized. Please specify "uniform" or "gaussian"'.format(
+            distribution=distribution))
+    return points
+
+
+def _bend(angles, offsets, focal_length):
+    """
+    Return the angles of rays bent by a lens, given their offsets from the lens centre
+    """
+    angles = angles - np.arctan(offsets / focal_length)
+    return (angles + np.pi / 2) % np.pi - np.pi / 2  # Rays bent backwards are traced along the same line
+
+
+def _active(bundle):
+    """
+    Return an index selecting the rays of a bundle that are not blocked
+    """
+    if bundle.blocked is None or not bundle.blocked.any():
+        return slice(None)
+    return np.flatnonzero(~bundle.blocked)
+
+
+def _select(values, active):
+    """
+    Return the values of the active rays of a bundle, for values given per ray or shared by all rays
+    """
+    if np.ndim(values) == 0:
+        return values
+    return values[active]
+
+
+def _scatter(values, active, n):
+    """
+    Return values computed for the active rays of a bundle of n rays, with NaN for the blocked rays
+    """
+    if isinstance(active, slice):
+        return values
+    array = np.full(n, np.nan)
+    array[active] = values
+    return array
+
+
+def _offset(lens, axis):
+    if axis == 'x':
+        return lens.x
+    elif axis == 'z':
+        return lens.z
+    raise ValueError('Axis {axis!r} not recognized. Please specify "x" or "z"'.format(axis=axis))
+
+
+def drift_matrix(distance, augmented=False):
+    """
+    Return the ray-transfer matrix for free propagation a distance along the optical axis
+    :param distance: The distance travelled along the optical axis
+    :param augmented: Whether to return the augmented 3x3 matrix or not. Default is False
+    :type distance: float
+    :type augmented: bool
+    :return: The transfer matrix
+    :rtype: np.ndarray
+    """
+    if augmented:
+        return np.array([[1., float(distance), 0.], [0., 1., 0.], [0., 0., 1.]])
+    return np.array([[1., float(distance)], [0., 1.]])
+
+
+def system_matrix(lenses, start=None, stop=None, augmented=False, axis='x'):
+    """
+    Return the ray-transfer matrix of a contiguous range of the column.
+
+    The lenses must be ordered along the beam, i.e. by decreasing position along the optical axis. Drifts between the
+    lenses are included, and so are drifts from `start` to the first lens and from the last lens to `stop`.
+    :param lenses: The lenses to compose
+    :param start: The position along the optical axis where the range starts. Default is the entrance of the first lens
+    :param stop: The position along the optical axis where the range stops. Default is the exit of the last lens
+    :param augmented: Whether to return the augmented 3x3 matrix including lens offsets or not. Default is False
+    :param axis: The transverse axis of the lens offsets in the augmented matrix, "x" or "z". Default is "x"
+    :type lenses: list
+    :type start: float, None
+    :type stop: float, None
+    :type augmented: bool
+    :type axis: str
+    :return: The transfer matrix
+    :rtype: np.ndarray
+    """
+    lenses = list(lenses)
+    if start is None:
+        start = lenses[0].entrance if lenses else 0.
+    if stop is None:
+        stop = lenses[-1].exit if lenses else start
+    matrix = np.eye(3 if augmented else 2)
+    y = float(start)
+    for lens in lenses:
+        if lens.entrance > y:
+            raise RayTransmitError(
+                'Lens {lens} must be positioned after {y:.2f} to be part of the system'.format(lens=lens, y=y))
+        matrix = lens.matrix(augmented, axis) @ drift_matrix(y - lens.entrance, augmented) @ matrix
+        y = lens.exit
+    if stop > y:
+        raise RayTransmitError('Stop position {stop:.2f} must be after the last lens at {y:.2f}'.format(stop=stop, y=y))
+    return drift_matrix(y - stop, augmented) @ matrix
+
+
+def transfer(matrix, x, angle, deg=True):
+    """
+    Propagate rays with a ray-transfer matrix.
+
+    The 2x2 matrix is the same for both transverse axes, so the x and z components of skew rays can be propagated
+    together by stacking them along a new first axis.
+    :param matrix: The 2x2 or augmented 3x3 transfer matrix
+    :param x: The positions of the rays perpendicular to the optical axis
+    :param angle: The angles of the rays relative to the optical axis
+    :param deg: Whether the angles are given (and returned) in degrees or not. Default is True
+    :type matrix: np.ndarray
+    :type x: float, np.ndarray
+    :type angle: float, np.ndarray
+    :type deg: bool
+    :return: The positions and angles of the propagated rays
+    :rtype: tuple
+    """
+    x = np.asarray(x, dtype=float)
+    angle = np.asarray(angle, dtype=float)
+    if deg:
+        angle = np.deg2rad(angle)
+    x_out = matrix[0, 0] * x + matrix[0, 1] * angle
+    angle_out = matrix[1, 0] * x + matrix[1, 1] * angle
+    if matrix.shape == (3, 3):
+        x_out = x_out + matrix[0, 2]
+        angle_out = angle_out + matrix[1, 2]
+    if deg:
+        angle_out = np.rad2deg(angle_out)
+    return x_out, angle_out
+
+
+def image_plane(lenses, y):
+    """
+    Return the position and magnification of the image formed by the lenses of an object plane.
+    :param lenses: The lenses forming the image, ordered along the beam
+    :param y: The position of the object plane along the optical axis
+    :type lenses: list
+    :type y: float
+    :return: The position of the image plane along the optical axis and the lateral magnification
+    :rtype: tuple
+    """
+    lenses = list(lenses)
+    matrix = system_matrix(lenses, start=y)
+    with np.errstate(divide='ignore'):
+        distance = np.float64(-matrix[0, 1]) / matrix[1, 1]
+        magnification = np.float64(1.) / matrix[1, 1]
+    return float(lenses[-1].exit - distance), float(magnification)
@@ -0,0 +1,154 @@
+import os
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+
+class Profiler(object):
+    """
+    Opt-in call counters and timers for the stages of the trace and render pipeline.
+
+    While disabled, instrumented functions only pay for a check of `enabled`. Stages are timed inclusively, so a
+    stage calling another instrumented stage includes its time.
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Create a profiler
+        :param enabled: Whether to start recording immediately or not. Default is False
+        :type enabled: bool
+        """
+        self.enabled = bool(enabled)
+        self._stages = {}
+        self._frame = {}
+
+    def __repr__(self):
+        return '{self.__class__.__name__}(enabled={self.enabled!r})'.format(self=self)
+
+    def __str__(self):
+        return self.summary()
+
+    def enable(self, enabled=True):
+        """
+        Start (or stop) recording
+        :param enabled: Whether to record or not. Default is True
+        :type enabled: bool
+        """
+        self.enabled = bool(enabled)
+
+    def disable(self):
+        """
+        Stop recording
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Discard all recorded counts and times
+        """
+        self._stages.clear()
+        self._frame.clear()
+
+    def new_frame(self):
+        """
+        Start a new frame, e.g. a redraw, discarding the counts and times of the previous frame
+        """
+        self._frame.clear()
+
+    def record(self, stage, seconds, count=1):
+        """
+        Record calls of a stage
+        :param stage: The name of the stage
+        :param seconds: The time spent in the stage
+        :param count: The number of calls. Default is 1
+        :type stage: str
+        :type seconds: float
+        :type count: int
+        """
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = self._stages[stage] = [0, 0., 0.]
+        stats[0] += count
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        frame = self._frame.get(stage)
+        if frame is None:
+            frame = self._frame[stage] = [0, 0.]
+        frame[0] += count
+        frame[1] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time the enclosed block as a call of a stage, if the profiler is enabled
+        :param stage: The name of the stage
+        :type stage: str
+        """
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, perf_counter() - start)
+
+    def stats(self, frame=False):
+        """
+        Return the recorded counts and times of each stage.
+
+        Times are in seconds: "total" is the time spent in all calls, and "mean" and "max" the mean and longest call.
+        :param frame: Whether to only include calls in the current frame or not. Default is False
+        :type frame: bool
+        :rtype: dict
+        """
+        if frame:
+            return {stage: {'count': count, 'total': total, 'mean': total / count if count else 0.}
+                    for stage, (count, total) in self._frame.items()}
+        return {stage: {'count': count, 'total': total, 'mean': total / count if count else 0., 'max': longest}
+                for stage, (count, total, longest) in self._stages.items()}
+
+    def summary(self, stages=None, frame=False, sep=' | '):
+        """
+        Return a one-line summary of the total time spent in each stage in milliseconds, with the number of calls
+        :param stages: The stages to include, in order. Default is None (all recorded stages)
+        :param frame: Whether to only include calls in the current frame or not. Default is False
+        :param sep: The separator between stages. Default is " | "
+        :type stages: list, None
+        :type frame: bool
+        :type sep: str
+        :rtype: str
+        """
+        stats = self.stats(frame)
+        if stages is None:
+            stages = sorted(stats)
+        return sep.join('{stage} {total:.1f} ms ({count})'.format(stage=stage, total=stats[stage]['total'] * 1e3,
+                                                                  count=stats[stage]['count'])
+                        for stage in stages if stage in stats)
+
+
+profiler = Profiler(enabled=bool(os.environ.get('VTEM_PROFILE')))
+
+
+def timed(stage):
+    """
+    Decorate a function to record its calls as a stage of the global profiler
+    :param stage: The name of the stage
+    :type stage: str
+    :return: The decorator
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(stage, perf_counter() - start)
+
+        return wrapper
+
+    return decorator
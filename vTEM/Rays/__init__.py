@@ -1 +1,2 @@
-from .ray import *
\ No newline at end of file
+from .ray import *
+from .bundle import *
@@ -0,0 +1,384 @@
+import numpy as np
+from vTEM.Rays.ray import Ray, RayNode, ray_angle
+
+
+class RayBundle(object):
+    """
+    A bundle of N straight ray segments stored as arrays.
+
+    Each ray starts at (start_x, start_y), travels down the optical axis to stop_y and has an angle relative to the
+    optical axis (positive counterclockwise, as for `Ray`). Angles are stored in radians.
+
+    Skew bundles also have a second transverse coordinate, with start positions start_z and angles angles_z in the
+    z-y plane. For meridional bundles these are None.
+
+    Bundles may also carry the relative energy deviations dE/E of the rays in `energies`, which lenses use to shift
+    their focal lengths. For monochromatic bundles this is None.
+
+    Rays stopped by an aperture are marked in the boolean mask `blocked`, which is None when no aperture has been
+    passed. The positions and angles of blocked rays after the aperture are NaN.
+    """
+
+    def __init__(self, x, y, angle, length=1, deg=True, name='', z=None, angle_z=None, energy=None):
+        """
+        Create a new ray bundle.
+
+        All array arguments are broadcast against each other, so scalars can be used for values shared by all rays.
+
+        :param x: The start positions of the rays perpendicular to the optical axis
+        :param y: The start positions of the rays along the optical axis
+        :param angle: The angles of the rays relative to the optical axis
+        :param length: The length of the rays along the optical axis. Default is 1
+        :param deg: Whether the angles are given in degrees or not. Default is True
+        :param name: The name of the bundle. Default is ""
+        :param z: The start positions of skew rays along the second transverse axis. Default is None
+        :param angle_z: The angles of skew rays in the z-y plane. Default is None
+        :param energy: The relative energy deviations dE/E of the rays. Default is None (monochromatic)
+        :type x: float, np.ndarray
+        :type y: float, np.ndarray
+        :type angle: float, np.ndarray
+        :type length: float, np.ndarray
+        :type deg: bool
+        :type name: str
+        :type z: float, np.ndarray, None
+        :type angle_z: float, np.ndarray, None
+        :type energy: float, np.ndarray, None
+        """
+        if not isinstance(name, str):
+            raise TypeError(
+                'Parameter "name" must be type str, recieved {name!r} of type {t}'.format(name=name, t=type(name)))
+        skew = z is not None or angle_z is not None
+        values = (x, y, angle, length) + ((0 if z is None else z, 0 if angle_z is None else angle_z) if skew else ())
+        values = np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype=float)) for value in values])
+        x, y, angle, length = values[:4]
+        if x.ndim != 1:
+            raise ValueError('Ray bundles must be one-dimensional, not of shape {shape!r}'.format(shape=x.shape))
+        self.start_x = x.copy()
+        self.start_y = y.copy()
+        self.stop_y = y - np.abs(length)
+        if deg:
+            self.angles = np.deg2rad(angle)
+        else:
+            self.angles = angle.copy()
+        self.start_z = None
+        self.angles_z = None
+        if skew:
+            self.start_z = values[4].copy()
+            self.angles_z = np.deg2rad(values[5]) if deg else values[5].copy()
+        self.energies = None
+        self.blocked = None
+        if energy is not None:
+            self.energies = np.broadcast_to(np.asarray(energy, dtype=float), x.shape).copy()
+        self.name = name
+
+    @classmethod
+    def from_rays(cls, rays, name=''):
+        """
+        Create a bundle from a sequence of rays.
+
+        :param rays: The rays to collect in the bundle
+        :param name: The name of the bundle. Default is ""
+        :type rays: list
+        :type name: str
+        :return: The ray bundle
+        :rtype: RayBundle
+        """
+        rays = list(rays)
+        for ray in rays:
+            if not isinstance(ray, Ray):
+                raise TypeError('Ray {ray!r} must be type Ray, not {t}'.format(ray=ray, t=type(ray)))
+        points = np.array([(ray.start.x, ray.start.y, ray.stop.x, ray.stop.y) for ray in rays], dtype=float)
+        points = points.reshape(-1, 4)
+        angles = ray_angle(points[:, 2] - points[:, 0], points[:, 3] - points[:, 1], deg=False)
+        return cls.from_arrays(points[:, 0].copy(), points[:, 1].copy(), points[:, 3].copy(), angles, name=name)
+
+    def __len__(self):
+        return len(self.start_x)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self.to_ray(item)
+        return self.from_arrays(self.start_x[item], self.start_y[item], self.stop_y[item], self.angles[item],
+                                name=self.name, start_z=_take(self.start_z, item), angles_z=_take(self.angles_z, item),
+                                energies=_take(self.energies, item), blocked=_take(self.blocked, item))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.to_ray(i)
+
+    def __repr__(self):
+        return '{self.__class__.__name__}(<{n} {skew}rays>, name={self.name!r})'.format(
+            self=self, n=len(self), skew='skew ' if self.skew else '')
+
+    def __str__(self):
+        return '{self.__class__.__name__} "{self.name}" with {n} {skew}rays'.format(
+            self=self, n=len(self), skew='skew ' if self.skew else '')
+
+    @property
+    def skew(self):
+        """
+        Whether the rays have a second transverse coordinate or not
+        :rtype: bool
+        """
+        return self.start_z is not None
+
+    @property
+    def transmitted(self):
+        """
+        The number of rays that have not been blocked
+        :rtype: int
+        """
+        if self.blocked is None:
+            return len(self)
+        return len(self) - int(np.count_nonzero(self.blocked))
+
+    @property
+    def stop_x(self):
+        """
+        The end positions of the rays perpendicular to the optical axis
+        :rtype: np.ndarray
+        """
+        return self.start_x + np.tan(self.angles) * (self.start_y - self.stop_y)
+
+    @property
+    def stop_z(self):
+        """
+        The end positions of skew rays along the second transverse axis, or None for meridional rays
+        :rtype: np.ndarray, None
+        """
+        if self.start_z is None:
+            return None
+        return self.start_z + np.tan(self.angles_z) * (self.start_y - self.stop_y)
+
+    @property
+    def start(self):
+        """
+        The start points of the rays as an (N, 2) array
+        :rtype: np.ndarray
+        """
+        return np.column_stack((self.start_x, self.start_y))
+
+    @property
+    def stop(self):
+        """
+        The end points of the rays as an (N, 2) array
+        :rtype: np.ndarray
+        """
+        return np.column_stack((self.stop_x, self.stop_y))
+
+    def copy(self):
+        """
+        Return a copy of the bundle
+        :rtype: RayBundle
+        """
+        return self.from_arrays(self.start_x.copy(), self.start_y.copy(), self.stop_y.copy(), self.angles.copy(),
+                                name=self.name, start_z=_take(self.start_z), angles_z=_take(self.angles_z),
+                                energies=_take(self.energies), blocked=_take(self.blocked))
+
+    @classmethod
+    def from_arrays(cls, start_x, start_y, stop_y, angles, name='', start_z=None, angles_z=None, energies=None,
+                    blocked=None):
+        """
+        Create a bundle directly from its arrays without copying them.
+
+        :param start_x: The start positions of the rays perpendicular to the optical axis
+        :param start_y: The start positions of the rays along the optical axis
+        :param stop_y: The end positions of the rays along the optical axis
+        :param angles: The angles of the rays in radians
+        :param name: The name of the bundle. Default is ""
+        :param start_z: The start positions of skew rays along the second transverse axis. Default is None
+        :param angles_z: The angles of skew rays in the z-y plane in radians. Default is None
+        :param energies: The relative energy deviations dE/E of the rays. Default is None
+        :param blocked: Whether each ray has been blocked by an aperture or not. Default is None (no rays blocked)
+        :type start_x: np.ndarray
+        :type start_y: np.ndarray
+        :type stop_y: np.ndarray
+        :type angles: np.ndarray
+        :type name: str
+        :type start_z: np.ndarray, None
+        :type angles_z: np.ndarray, None
+        :type energies: np.ndarray, None
+        :type blocked: np.ndarray, None
+        :return: The ray bundle
+        :rtype: RayBundle
+        """
+        bundle = cls.__new__(cls)
+        bundle.start_x = start_x
+        bundle.start_y = start_y
+        bundle.stop_y = stop_y
+        bundle.angles = angles
+        bundle.start_z = start_z
+        bundle.angles_z = angles_z
+        bundle.energies = energies
+        bundle.blocked = blocked
+        bundle.name = str(name)
+        return bundle
+
+    def to_ray(self, i):
+        """
+        Return a single ray from the bundle as a Ray object. Skew rays are projected onto the x-y plane
+        :param i: The index of the ray
+        :type i: int
+        :rtype: Ray
+        """
+        return Ray(RayNode(float(self.start_x[i]), float(self.start_y[i])),
+                   RayNode(float(self.stop_x[i]), float(self.stop_y[i])), name=self.name)
+
+    def to_rays(self):
+        """
+        Return the bundle as a list of Ray objects
+        :rtype: list
+        """
+        return list(self)
+
+    def dx(self):
+        """
+        Return pathlengths perpendicular to optical axis
+        :rtype: np.ndarray
+        """
+        return self.stop_x - self.start_x
+
+    def dy(self):
+        """
+        Return pathlengths along optical axis
+        :rtype: np.ndarray
+        """
+        return self.stop_y - self.start_y
+
+    def length(self):
+        """
+        Return lengths of the rays
+        :rtype: np.ndarray
+        """
+        return np.hypot(self.dx(), self.dy())
+
+    def angle(self, deg=True):
+        """
+        Return angles of the rays
+        :param deg: Whether to return angles in degrees or not. Default is True
+        :type deg: bool
+        :rtype: np.ndarray
+        """
+        if deg:
+            return np.rad2deg(self.angles)
+        return self.angles.copy()
+
+    def set_angle(self, angle, deg=True):
+        """
+        Change the angles of the rays, keeping the start points fixed.
+
+        :param angle: The new angles. Positive counterclockwise
+        :param deg: Whether the angles are given in degrees or not. Default is True
+        :type angle: float, np.ndarray
+        :type deg: bool
+        """
+        angle = np.broadcast_to(np.asarray(angle, dtype=float), self.angles.shape)
+        if deg:
+            angle = np.deg2rad(angle)
+        self.angles = np.array(angle)
+
+    def tilt(self, angle, deg=True):
+        """
+        Tilt the rays by a certain angle, keeping the start points fixed.
+
+        :param angle: The angle to tilt the rays with. Positive counterclockwise
+        :param deg: Whether the angle is given in degrees or not. Default is True
+        :type angle: float, np.ndarray
+        :type deg: bool
+        """
+        if deg:
+            angle = np.deg2rad(angle)
+        self.angles = self.angles + angle
+
+    def extend(self, y, relative=False):
+        """
+        Extend (or shrink) the rays to end at a new position.
+        :param y: The new end position in absolute position (`relative=False`) or in relative position (`relative=True`)
+        :param relative: Whether the termination point is relative or not. Default is False
+        :type y: float, np.ndarray
+        :type relative: bool
+        """
+        if relative:
+            self.stop_y = self.start_y + y
+        else:
+            self.stop_y = np.broadcast_to(np.asarray(y, dtype=float), self.start_y.shape).copy()
+
+    def cut(self, y, relative=False):
+        """
+        Cut the rays a distance from the start, making this the new start point.
+
+        :param y: Distance along optical axis
+        :param relative: Whether the distance should be measured relative to the start points or in absolute coordinates. Default is False
+        :type y: float, np.ndarray
+        :type relative: bool
+        """
+        if relative:
+            new_y = self.start_y - y
+        else:
+            new_y = np.broadcast_to(np.asarray(y, dtype=float), self.start_y.shape)
+        if self.skew:
+            self.start_z = self.z_at_y(new_y, check=False)
+        self.start_x = self.x_at_y(new_y, check=False)
+        self.start_y = np.array(new_y)
+
+    def x_at_y(self, y, relative=False, check=True):
+        """
+        Return the x-positions of the rays at position y along the optical axis.
+        :param y: The position to "extrapolate" to.
+        :param relative: Whether y is relative to start of the rays or absolute
+        :param check: Whether to check that y lies within the rays or not. Default is True
+        :type y: float, np.ndarray
+        :type relative: bool
+        :type check: bool
+        :return: The x-positions at y
+        :rtype: np.ndarray
+        """
+        return self.start_x + self._dy(y, relative, check) * np.tan(self.angles)
+
+    def z_at_y(self, y, relative=False, check=True):
+        """
+        Return the z-positions of skew rays at position y along the optical axis.
+        :param y: The position to "extrapolate" to.
+        :param relative: Whether y is relative to start of the rays or absolute
+        :param check: Whether to check that y lies within the rays or not. Default is True
+        :type y: float, np.ndarray
+        :type relative: bool
+        :type check: bool
+        :return: The z-positions at y
+        :rtype: np.ndarray
+        """
+        if not self.skew:
+            raise ValueError('{self!r} has no z-coordinates'.format(self=self))
+        return self.start_z + self._dy(y, relative, check) * np.tan(self.angles_z)
+
+    def _dy(self, y, relative, check):
+        if relative:
+            dy = np.asarray(y, dtype=float)
+        else:
+            dy = self.start_y - y
+        if check and not np.all((0 <= dy) & (dy <= self.start_y - self.stop_y)):
+            raise ValueError('Position {y!r} does not lie within y-range of {self!r}'.format(y=y, self=self))
+        return dy
+
+    def show(self, ax, **kwargs):
+        """
+        Show the rays in the axes as a single LineCollection
+        :param ax: The axes to show the rays in
+        :param kwargs: Optional keyword arguments passed to vTEM.Rendering.RayCollection
+        :type ax: matplotlib.pyplot.axes
+        :return: The collection holding the artists
+        :rtype: vTEM.Rendering.RayCollection
+        """
+        from vTEM.Rendering import show_rays
+        return show_rays(ax, self, **kwargs)
+
+
+def _take(values, item=None):
+    """
+    Return a copy of an optional array, or of a part of it
+    """
+    if values is None:
+        return None
+    if item is None:
+        return values.copy()
+    return values[item]
@@ -1,6 +1,5 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from math import nan, pi, sqrt, inf, sin, cos, tan, asin, acos, atan
+from math import nan, pi, sqrt, inf, sin, cos, tan, asin, acos, atan, atan2, copysign
 
 
 class RayNode(object):
@@ -8,6 +7,8 @@ class RayNode(object):
     A node object for controlling the start and stop end points of a ray
     """
 
+    __slots__ = ('x', 'y', '_name', '_role')
+
     def __init__(self, *args, name=''):
         """
         Create a new node.
@@ -50,7 +51,30 @@ class RayNode(object):
 
         self.x = x
         self.y = y
-        self.name = name
+        self._name = name
+        self._role = None
+
+    @property
+    def name(self):
+        """
+        The name of the node. Nodes of a ray are named after the ray, and the name is only formatted when requested.
+        :rtype: str
+        """
+        if self._role is None:
+            return self._name
+        return '{name} ({role})'.format(name=self._name, role=self._role)
+
+    @name.setter
+    def name(self, name):
+        if not isinstance(name, str):
+            raise TypeError(
+                'Parameter "name" must be type str, recieved {name!r} of type {t}'.format(name=name, t=type(name)))
+        self._name = name
+        self._role = None
+
+    def _set_ray_name(self, name, role):
+        self._name = name
+        self._role = role
 
     @property
     def position(self):
@@ -176,6 +200,8 @@ class Ray(object):
     A ray object describing a ray path
     """
 
+    __slots__ = ('start', 'stop', 'name')
+
     def __init__(self, start, stop, angle=None, name=''):
         """
         Create a new ray.
@@ -199,8 +225,8 @@ class Ray(object):
                 'Endpoint must be a RayNode, not {stop!r} of type {t}'.format(stop=stop, t=type(stop)))
         self.start = start
         self.stop = stop
-        self.start.name = '{name} (start)'.format(name=name)
-        self.stop.name = '{name} (end)'.format(name=name)
+        self.start._set_ray_name(name, 'start')
+        self.stop._set_ray_name(name, 'end')
         self.name = name
 
         if angle is not None:
@@ -251,16 +277,7 @@ class Ray(object):
         :rtype: float
 
         """
-        angle = acos(self.dy() / self.length()) * 180. / pi
-
-        if self.dx() < 0:
-            angle = angle - 180
-        else:
-            angle = 180 - angle
-
-        if not deg:
-            angle = angle * pi / 180
-        return angle
+        return ray_angle(self.dx(), self.dy(), deg=deg)
 
     def set_angle(self, angle, fixed='start', deg=True):
         """Change the angle of the ray
@@ -285,33 +302,8 @@ class Ray(object):
             raise ValueError(
                 'Fixed position {fixed!r} not recognized. Please specify "start" or "stop"'.format(fixed=fixed))
 
-        if not deg:
-            angle = angle * 180 / pi
-
-        length = abs(self.dy())  # length of ray along optical axis
-
-        reduced_angle = reduce_angle(angle)  # Angle reduced to (-180, 180)
-        if reduced_angle == 0:
-            x = fixed_point.x
-            y = fixed_point.y - sign * length
-        elif reduced_angle == 180:
-            x = fixed_point.x
-            y = fixed_point.y + sign * length
-        elif reduced_angle % 90 == 0:
-            if reduced_angle < 0:
-                x = -inf
-            else:
-                x = inf
-            y = fixed_point.y
-        else:
-            if abs(reduced_angle) < 90:
-                x = fixed_point.x + sign * tan(reduced_angle * pi / 180.) * length
-                y = fixed_point.y - sign * length
-            else:
-                x = fixed_point.x - sign * tan(reduced_angle * pi / 180.) * length
-                y = fixed_point.y + sign * length
-        variable_point.x = x
-        variable_point.y = y
+        variable_point.x, variable_point.y = angle_endpoint(fixed_point.x, fixed_point.y, angle, self.dy(), sign=sign,
+                                                            deg=deg)
 
     def tilt(self, angle, fixed='start', deg=True):
         """
@@ -502,14 +494,96 @@ class Ray(object):
 
 def reduce_angle(angle):
     """
-    Reduces an angle to (-180, 180)
-    :param angle: The angle to reduce
-    :type angle: int, float
+    Reduces an angle to (-180, 180]
+    :param angle: The angle to reduce, or an array of angles
+    :type angle: int, float, np.ndarray
     :return: reduced angle
-    :rtype: float
+    :rtype: float, np.ndarray
+    """
+    if np.ndim(angle) == 0:
+        angle = float(angle)
+        angle = angle % 360
+        if angle > 180:
+            angle = angle - 360
+        return angle
+    angle = np.mod(np.asarray(angle, dtype=float), 360)
+    return np.where(angle > 180, angle - 360, angle)
+
+
+def ray_angle(dx, dy, deg=True):
     """
-    angle = float(angle)
-    angle = angle % 360
-    if angle > 180:
-        angle = angle - 360
+    Return the angles of ray segments from their extent, as `Ray.angle` does for a single ray.
+
+    Segments of zero length have an undefined angle and return nan.
+    :param dx: The pathlengths perpendicular to the optical axis
+    :param dy: The pathlengths along the optical axis
+    :param deg: Whether to return angles in degrees or not. Default is True
+    :type dx: float, np.ndarray
+    :type dy: float, np.ndarray
+    :return: The angles, positive counterclockwise from the downward optical axis
+    :rtype: float, np.ndarray
+    """
+    if np.ndim(dx) == 0 and np.ndim(dy) == 0:
+        dx, dy = float(dx), float(dy)
+        if dx == 0 and dy == 0:
+            return nan
+        angle = pi if dx == 0 and dy > 0 else atan2(dx, -dy)
+        if deg:
+            return angle * 180 / pi
+        return angle
+    dx = np.asarray(dx, dtype=float)
+    dy = np.asarray(dy, dtype=float)
+    angle = np.where((dx == 0) & (dy == 0), nan, np.arctan2(dx, -dy))
+    angle = np.where((dx == 0) & (dy > 0), pi, angle)  # Straight up is 180, also for dx = -0.0
+    if deg:
+        return np.rad2deg(angle)
     return angle
+
+
+def angle_endpoint(x, y, angle, length, sign=1, deg=True):
+    """
+    Return the end points of ray segments with a given angle and extent along the optical axis from fixed points.
+
+    This is the array version of the point placement in `Ray.set_angle`: a sign of 1 places the points after the fixed
+    points (fixed start), a sign of -1 before them (fixed stop). Angles of +-90 degrees give points at +-infinity.
+    :param x: The fixed positions perpendicular to the optical axis
+    :param y: The fixed positions along the optical axis
+    :param angle: The angles of the segments. Positive counterclockwise
+    :param length: The extents of the segments along the optical axis
+    :param sign: Whether the end points lie after (1) or before (-1) the fixed points. Default is 1
+    :param deg: Whether the angles are given in degrees or not. Default is True
+    :type x: float, np.ndarray
+    :type y: float, np.ndarray
+    :type angle: float, np.ndarray
+    :type length: float, np.ndarray
+    :type sign: int
+    :type deg: bool
+    :return: The positions of the end points perpendicular to and along the optical axis
+    :rtype: tuple
+    """
+    if np.ndim(x) == 0 and np.ndim(y) == 0 and np.ndim(angle) == 0 and np.ndim(length) == 0:
+        if not deg:
+            angle = angle * 180 / pi
+        length = abs(length)
+        reduced_angle = reduce_angle(angle)
+        if abs(reduced_angle) == 90:
+            return copysign(inf, reduced_angle), float(y)
+        offset = 0. if reduced_angle == 180 else sign * tan(reduced_angle * pi / 180) * length
+        if abs(reduced_angle) < 90:
+            return x + offset, y - sign * length
+        return x - offset, y + sign * length
+    x, y, angle, length = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in (x, y, angle, length)])
+    if not deg:
+        angle = np.rad2deg(angle)
+    length = np.abs(length)
+    reduced_angle = reduce_angle(angle)
+    forward = np.abs(reduced_angle) < 90
+    perpendicular = np.abs(reduced_angle) == 90
+    with np.errstate(invalid='ignore', over='ignore'):
+        offset = sign * np.tan(np.deg2rad(reduced_angle)) * length
+    offset = np.where((reduced_angle == 0) | (reduced_angle == 180), 0., offset)
+    end_x = np.where(forward, x + offset, x - offset)
+    end_x = np.where(perpendicular, np.copysign(inf, reduced_angle), end_x)
+    end_y = np.where(forward, y - sign * length, y + sign * length)
+    end_y = np.where(perpendicular, y, end_y)
+    return end_x, end_y
@@ -0,0 +1,3 @@
+from .renderer import *
+from .rays import *
+from .export import *
@@ -0,0 +1,397 @@
+import copy
+import itertools
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from vTEM.Rays import Ray, RayBundle
+from vTEM.Lenses import Error
+from vTEM.Column import apply_setting
+from vTEM.Storage import load_column
+from vTEM.Rendering.renderer import ColumnRenderer
+
+ANIMATION_FORMATS = ('.gif', '.mp4')
+MAX_ARROWS = 200
+
+
+class ExportError(Error):
+    pass
+
+
+def diagram_rays(column, angles=(1.,), symmetric=False):
+    """
+    Return the initial rays of a ray diagram, emitted from the edge of the source as in the GUI
+    :param column: The column
+    :param angles: The angles of the rays in degrees. Default is (1,)
+    :param symmetric: Whether to add the rays emitted from the opposite edge at the opposite angles. Default is False
+    :type column: Column
+    :type angles: tuple, list
+    :type symmetric: bool
+    :rtype: list
+    """
+    rays = [column.source.emit_ray(angle, 1) for angle in angles]
+    if symmetric:
+        rays.extend(column.source.emit_ray(-angle, -1) for angle in angles)
+    return rays
+
+
+def draw_column(renderer, column, rays=None, lenses=None, margin=0.05, lensprops=None, arrowprops=None,
+                arrow_step=None, label_lens=True, label_focal_planes=True, label_rays=False, limits=None):
+    """
+    Trace rays through a column and draw the source, the lenses and the traced rays with a renderer.
+
+    As in the GUI, the lenses are resized to span the traced rays and the axes are scaled to the lenses and rays, unless
+    the limits are given. All rays are drawn as one ray collection, with arrowheads on a subsample of the segments.
+    :param renderer: The renderer to draw with
+    :param column: The column to draw
+    :param rays: The initial rays. Default is None (see `diagram_rays`)
+    :param lenses: The names of the lenses to draw and trace through. Default is None (all lenses)
+    :param margin: The margin added along the optical axis, as a fraction of the drawn range. Default is 0.05
+    :param lensprops: Line properties for the "lens", "ffp", "bfp" and "axis" lines. Default is None
+    :param arrowprops: Line properties of the rays, e.g. color, alpha or lw. Default is None
+    :param arrow_step: Draw an arrowhead on every `arrow_step`-th ray segment. Default is None (every segment, or about
+        `MAX_ARROWS` segments when there are more)
+    :param label_lens: Whether to label the lenses or not. Default is True
+    :param label_focal_planes: Whether to label the focal planes or not. Default is True
+    :param label_rays: Whether to label single rays or not. Default is False
+    :param limits: The x- and y-limits of the axes as ((xmin, xmax), (ymin, ymax)). Default is None (scale the axes)
+    :type renderer: ColumnRenderer
+    :type column: Column
+    :type rays: Ray, RayBundle, list, None
+    :type lenses: list, None
+    :type margin: float
+    :type lensprops: dict, None
+    :type arrowprops: dict, None
+    :type arrow_step: int, None
+    :type label_lens: bool
+    :type label_focal_planes: bool
+    :type label_rays: bool
+    :type limits: tuple, None
+    :return: The traced rays
+    :rtype: list
+    """
+    if rays is None:
+        rays = diagram_rays(column)
+    elif isinstance(rays, (Ray, RayBundle)):
+        rays = [rays]
+    traces = [ray for initial_ray in rays for ray in column.trace(initial_ray, lenses=lenses)]
+    single = [ray for ray in traces if isinstance(ray, Ray)]
+    bundles = [ray for ray in traces if isinstance(ray, RayBundle)]
+    active = [lens for lens in column.get_lenses() if lenses is None or lens.name in lenses]
+
+    x = np.concatenate([[ray.start.x for ray in single], [ray.stop.x for ray in single]] +
+                       [np.concatenate([bundle.start_x, bundle.stop_x]) for bundle in bundles])
+    y = np.concatenate([[ray.start.y for ray in single], [ray.stop.y for ray in single]] +
+                       [np.concatenate([bundle.start_y, bundle.stop_y]) for bundle in bundles] +
+                       [[column.source.y], [lens.y for lens in active]])
+    x = x[np.isfinite(x)]
+    if len(x):
+        for lens in active:
+            lens.set_size(2 * max(abs(np.min(x) - lens.x), abs(np.max(x) - lens.x)))
+
+    renderer.update_source(column.source)
+    renderer.update_lenses(active, lensprops=lensprops, label_lens=label_lens, label_focal_planes=label_focal_planes)
+    if arrow_step is None:
+        segments = len(single) + sum(len(bundle) for bundle in bundles)
+        arrow_step = max(1, -(-segments // MAX_ARROWS))
+    renderer.update_ray_collection(traces, rayprops=arrowprops, arrow_step=arrow_step, show_label=label_rays)
+
+    if limits is not None:
+        renderer.ax.set_xlim(*limits[0])
+        renderer.ax.set_ylim(*limits[1])
+        return traces
+    if active:
+        renderer.ax.set_xlim(min(lens.x - lens.size / 2 for lens in active),
+                             max(lens.x + lens.size / 2 for lens in active))
+    y = y[np.isfinite(y)]
+    padding = margin * max(np.ptp(y), 1.)
+    renderer.ax.set_ylim(np.min(y) - padding, np.max(y) + padding)
+    return traces
+
+
+def render_column(column, path, rays=None, lenses=None, figsize=(6., 8.), dpi=100, **kwargs):
+    """
+    Draw a column and save the drawing to a file, without a GUI.
+
+    The figure is drawn by the Agg backend directly, so no window is opened and no display is needed.
+    :param column: The column to draw
+    :param path: The path of the file. The format follows the extension (e.g. .png, .svg or .pdf)
+    :param rays: The initial rays. Default is None (see `diagram_rays`)
+    :param lenses: The names of the lenses to draw and trace through. Default is None (all lenses)
+    :param figsize: The size of the figure in inches. Default is (6, 8)
+    :param dpi: The resolution of raster images in dots per inch. Default is 100
+    :param kwargs: Optional keyword arguments passed to `draw_column`
+    :type column: Column
+    :type path: str, Path
+    :type rays: Ray, RayBundle, list, None
+    :type lenses: list, None
+    :type figsize: tuple
+    :type dpi: float
+    :return: The traced rays
+    :rtype: list
+    """
+    return FrameExporter(figsize=figsize, dpi=dpi, lenses=lenses, **kwargs).export(column, path, rays=rays)
+
+
+class FrameExporter(object):
+    """
+    Draw many columns to files or images with one offscreen figure.
+
+    The figure is drawn by the Agg backend, and the lens and ray artists are created for the first column and then only
+    updated for the following ones, so each frame costs little more than tracing the rays and drawing the figure.
+    """
+
+    def __init__(self, figsize=(6., 8.), dpi=100, angles=(1.,), symmetric=False, lenses=None, **kwargs):
+        """
+        Create an exporter
+        :param figsize: The size of the figure in inches. Default is (6, 8)
+        :param dpi: The resolution of raster images in dots per inch. Default is 100
+        :param angles: The angles of the rays drawn when no rays are given. Default is (1,) (see `diagram_rays`)
+        :param symmetric: Whether to also draw the symmetric rays when no rays are given. Default is False
+        :param lenses: The names of the lenses to draw and trace through. Default is None (all lenses)
+        :param kwargs: Optional keyword arguments passed to `draw_column` (e.g. lensprops or limits)
+        :type figsize: tuple
+        :type dpi: float
+        :type angles: tuple, list
+        :type symmetric: bool
+        :type lenses: list, None
+        """
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.renderer = ColumnRenderer(self.figure.add_subplot(), blit=False)
+        self.dpi = dpi
+        self.angles = tuple(angles)
+        self.symmetric = bool(symmetric)
+        self.lenses = lenses
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return '{self.__class__.__name__}(figsize={figsize!r}, dpi={self.dpi!r})'.format(
+            self=self, figsize=tuple(self.figure.get_size_inches()))
+
+    def draw(self, column, rays=None):
+        """
+        Draw a column in the figure
+        :param column: The column, or the path of a column saved with `vTEM.save_column`
+        :param rays: The initial rays. Default is None (the rays given by `angles` and `symmetric`)
+        :type column: Column, str, Path
+        :type rays: Ray, RayBundle, list, None
+        :return: The traced rays
+        :rtype: list
+        """
+        column = _get_column(column)
+        if rays is None:
+            rays = diagram_rays(column, self.angles, self.symmetric)
+        return draw_column(self.renderer, column, rays, lenses=self.lenses, **self.kwargs)
+
+    def export(self, column, path, rays=None):
+        """
+        Draw a column and save the figure to a file
+        :param column: The column, or the path of a column saved with `vTEM.save_column`
+        :param path: The path of the file. The format follows the extension (e.g. .png, .svg or .pdf)
+        :param rays: The initial rays. Default is None (the rays given by `angles` and `symmetric`)
+        :type column: Column, str, Path
+        :type path: str, Path
+        :type rays: Ray, RayBundle, list, None
+        :return: The traced rays
+        :rtype: list
+        """
+        traces = self.draw(column, rays)
+        self.figure.savefig(str(path), dpi=self.dpi)
+        return traces
+
+    def frame(self, column, rays=None):
+        """
+        Draw a column and return the figure as an image
+        :param column: The column, or the path of a column saved with `vTEM.save_column`
+        :param rays: The initial rays. Default is None (the rays given by `angles` and `symmetric`)
+        :type column: Column, str, Path
+        :type rays: Ray, RayBundle, list, None
+        :return: The RGBA image as an array of shape (height, width, 4)
+        :rtype: np.ndarray
+        """
+        self.draw(column, rays)
+        self.canvas.draw()
+        return np.array(self.canvas.buffer_rgba())
+
+    def limits(self):
+        """
+        Return the current limits of the axes, e.g. for keeping them fixed in an animation
+        :return: The x- and y-limits as ((xmin, xmax), (ymin, ymax))
+        :rtype: tuple
+        """
+        return tuple(self.renderer.ax.get_xlim()), tuple(self.renderer.ax.get_ylim())
+
+
+_exporter = None
+
+
+def _start_worker(kwargs):
+    global _exporter
+    _exporter = FrameExporter(**kwargs)
+
+
+def _export(column, path):
+    _exporter.export(column, path)
+    return path
+
+
+def _frame(column):
+    return _exporter.frame(column)
+
+
+def _map(function, arguments, processes, chunksize, kwargs):
+    """
+    Map a function over the argument tuples with one exporter per worker process, yielding the results in order
+    """
+    if processes == 0:
+        _start_worker(kwargs)
+        for argument in arguments:
+            yield function(*argument)
+        return
+    from concurrent.futures import ProcessPoolExecutor  # Imported here to keep multiprocessing out of import vTEM
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_start_worker, initargs=(kwargs,)) as executor:
+        for result in executor.map(function, *zip(*arguments), chunksize=chunksize):
+            yield result
+
+
+def export_columns(columns, paths, processes=None, chunksize=1, **kwargs):
+    """
+    Draw columns to image files in a pool of worker processes.
+
+    Each worker draws its share of the columns with one `FrameExporter`, reusing the figure and artists between
+    frames.
+    :param columns: The columns, or the paths of columns saved with `vTEM.save_column`
+    :param paths: The path of the file of each column. The format follows the extension (e.g. .png, .svg or .pdf)
+    :param processes: The number of worker processes. Default is None (one per CPU). Use 0 to draw in this process
+    :param chunksize: The number of columns sent to a worker at a time. Default is 1
+    :param kwargs: Optional keyword arguments passed to `FrameExporter` (e.g. figsize, dpi, angles or lensprops)
+    :type columns: list
+    :type paths: list
+    :type processes: int, None
+    :type chunksize: int
+    :return: The paths of the files
+    :rtype: list
+    """
+    columns = list(columns)
+    paths = [str(path) for path in paths]
+    if len(columns) != len(paths):
+        raise ValueError('Got {n} columns but {m} paths'.format(n=len(columns), m=len(paths)))
+    if not columns:
+        return []
+    return list(_map(_export, list(zip(columns, paths)), processes, chunksize, kwargs))
+
+
+def sweep_columns(column, parameters):
+    """
+    Return copies of a column with the settings of each step of a slider sweep
+    :param column: The column to sweep. It is not changed
+    :param parameters: The values of each step, keyed by parameter (e.g. {"CL1.f": np.linspace(1, 3, 50)}). All
+        parameters are swept together, so they must have the same number of values
+    :type column: Column
+    :type parameters: dict
+    :rtype: generator
+    """
+    lengths = {len(values) for values in parameters.values()}
+    if len(lengths) != 1:
+        raise ValueError('All swept parameters must have the same number of values, not {lengths}'.format(
+            lengths=sorted(lengths)))
+    for step in range(lengths.pop()):
+        configuration = copy.deepcopy(column)
+        configuration.clear_cache()
+        for key, values in parameters.items():
+            apply_setting(configuration, key, values[step])
+        yield configuration
+
+
+def animate_sweep(column, parameters, path, fps=10, processes=None, chunksize=4, limits='first', **kwargs):
+    """
+    Draw a slider sweep of column settings as an animated GIF or MP4 video.
+
+    The frames are drawn offscreen in a pool of worker processes and written in order as they are finished. MP4 videos
+    are encoded by ffmpeg, which must be installed. GIFs are written with Pillow.
+    :param column: The column to sweep. It is not changed
+    :param parameters: The values of each frame, keyed by parameter (e.g. {"CL1.f": np.linspace(1, 3, 50)}). All
+        parameters are swept together, so they must have the same number of values
+    :param path: The path of the animation, ending in .gif or .mp4
+    :param fps: The number of frames per second. Default is 10
+    :param processes: The number of worker processes. Default is None (one per CPU). Use 0 to draw in this process
+    :param chunksize: The number of frames sent to a worker at a time. Default is 4
+    :param limits: The x- and y-limits of the axes as ((xmin, xmax), (ymin, ymax)), "first" to keep the limits of
+        the first frame, or None to scale each frame. Default is "first"
+    :param kwargs: Optional keyword arguments passed to `FrameExporter` (e.g. figsize, dpi, angles or lensprops)
+    :type column: Column
+    :type parameters: dict
+    :type path: str, Path
+    :type fps: float
+    :type processes: int, None
+    :type chunksize: int
+    :type limits: tuple, str, None
+    :return: The number of frames
+    :rtype: int
+    """
+    path = Path(path)
+    if path.suffix.lower() not in ANIMATION_FORMATS:
+        raise ExportError('Cannot write animation {path}. The format must be one of {formats}'.format(
+            path=path, formats=', '.join(ANIMATION_FORMATS)))
+    ffmpeg = _ffmpeg(path) if path.suffix.lower() == '.mp4' else None
+    columns = list(sweep_columns(column, parameters))
+    if limits == 'first':
+        exporter = FrameExporter(**kwargs)
+        exporter.draw(columns[0])
+        limits = exporter.limits()
+    kwargs['limits'] = limits
+    frames = _map(_frame, [(configuration,) for configuration in columns], processes, chunksize, kwargs)
+    if path.suffix.lower() == '.gif':
+        _write_gif(frames, path, fps)
+    else:
+        _write_video(frames, path, fps, ffmpeg)
+    return len(columns)
+
+
+def _write_gif(frames, path, fps):
+    from PIL import Image  # Pillow is a dependency of matplotlib
+
+    images = [Image.fromarray(frame).convert('RGB') for frame in frames]
+    images[0].save(str(path), save_all=True, append_images=images[1:], duration=round(1000 / fps), loop=0)
+
+
+def _ffmpeg(path):
+    ffmpeg = shutil.which(rcParams['animation.ffmpeg_path'])
+    if ffmpeg is None:
+        raise ExportError('Cannot write {path} since ffmpeg was not found. Please install ffmpeg or set '
+                          'matplotlib.rcParams["animation.ffmpeg_path"]'.format(path=path))
+    return ffmpeg
+
+
+def _write_video(frames, path, fps, ffmpeg):
+    """
+    Pipe raw RGBA frames to ffmpeg as they arrive
+    """
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape[:2]
+    # H.264 in yuv420p needs an even width and height
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+               '-s', '{width}x{height}'.format(width=width, height=height), '-r', str(fps), '-i', '-',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', str(path)]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for frame in itertools.chain([first], frames):
+            process.stdin.write(np.ascontiguousarray(frame).tobytes())
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise ExportError('ffmpeg failed to write {path}'.format(path=path))
+
+
+def _get_column(column):
+    if isinstance(column, (str, os.PathLike)):
+        return load_column(column)
+    return column
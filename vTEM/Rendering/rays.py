@@ -0,0 +1,202 @@
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.quiver import Quiver
+from vTEM.Rays import Ray, RayBundle
+
+LINE_STYLE = {'color': 'r', 'linewidth': 1.}
+NODE_STYLE = {'s': 4, 'color': 'k'}
+ARROW_STYLE = {'color': 'r', 'units': 'dots', 'width': 1., 'headwidth': 5, 'headlength': 7, 'headaxislength': 6}
+
+
+def ray_segments(rays):
+    """
+    Return the start and end points of rays as an (N, 2, 2) array of segments
+    :param rays: The rays. Any mix of Ray and RayBundle objects, or a single RayBundle
+    :type rays: list, RayBundle
+    :rtype: np.ndarray
+    """
+    if isinstance(rays, (Ray, RayBundle)):
+        rays = [rays]
+    segments = []
+    single = []
+    for ray in rays:
+        if isinstance(ray, RayBundle):
+            if single:
+                segments.append(np.array(single, dtype=float).reshape(-1, 2, 2))
+                single = []
+            segments.append(np.stack((ray.start, ray.stop), axis=1))
+        elif isinstance(ray, Ray):
+            single.append(((ray.start.x, ray.start.y), (ray.stop.x, ray.stop.y)))
+        else:
+            raise TypeError('Ray {ray!r} must be type Ray or RayBundle, not {t}'.format(ray=ray, t=type(ray)))
+    if single:
+        segments.append(np.array(single, dtype=float).reshape(-1, 2, 2))
+    if not segments:
+        return np.empty((0, 2, 2))
+    return np.concatenate(segments)
+
+
+def _ray_values(rays, c, n):
+    """
+    Broadcast per-ray colour values to per-segment values.
+
+    Values can be given per segment, or per ray in a bundle when all bundles have the same number of rays
+    """
+    c = np.asarray(c)
+    if len(c) == n:
+        return c
+    if isinstance(rays, RayBundle):
+        rays = [rays]
+    lengths = set(len(ray) if isinstance(ray, RayBundle) else 1 for ray in rays)
+    if len(lengths) == 1 and len(c) == lengths.pop() and n % len(c) == 0:
+        return np.tile(c, n // len(c))
+    raise ValueError('Could not match {m} colour values to {n} ray segments'.format(m=len(c), n=n))
+
+
+class RayCollection(object):
+    """
+    Draw any number of rays as a single LineCollection.
+
+    Node markers are drawn as one scatter, and arrowheads are drawn as one quiver on a subsample of the rays. The
+    artists are created once and updated in place by `set_rays`.
+    """
+
+    def __init__(self, ax, c=None, cmap=None, norm=None, nodeprops=None, arrowprops=None, arrow_step=None,
+                 arrow_size=0.1, animated=False, **kwargs):
+        """
+        Create a ray collection
+        :param ax: The axes to draw in
+        :param c: Values mapped to colours with `cmap`, one per segment or one per ray in each bundle. Default is None
+        :param cmap: The colormap used for `c`. Default is None (the matplotlib default)
+        :param norm: The normalization used for `c`. Default is None (linear between the extremes of `c`)
+        :param nodeprops: Scatter properties for the ray nodes. Default is None (no nodes)
+        :param arrowprops: Quiver properties for the arrowheads. Default is None
+        :param arrow_step: Draw an arrowhead on every `arrow_step`-th ray. Default is None (no arrowheads)
+        :param arrow_size: The length of the arrowheads in inches. Default is 0.1
+        :param animated: Whether the artists are animated (for blitting) or not. Default is False
+        :param kwargs: Optional keyword arguments passed to the LineCollection
+        :type ax: matplotlib.pyplot.Axes
+        :type c: np.ndarray, None
+        :type nodeprops: dict, None
+        :type arrowprops: dict, None
+        :type arrow_step: int, None
+        :type arrow_size: float
+        :type animated: bool
+        """
+        self.ax = ax
+        self.c = c
+        self.nodeprops = nodeprops
+        self.arrowprops = dict(ARROW_STYLE)
+        if arrowprops is not None:
+            self.arrowprops.update(arrowprops)
+        self.arrow_step = arrow_step
+        self.arrow_size = float(arrow_size)
+        self.animated = bool(animated)
+
+        style = dict(LINE_STYLE)
+        if c is not None:
+            style.pop('color', None)
+        self.lines = LineCollection([], cmap=cmap, norm=norm, animated=self.animated, **style)
+        ax.add_collection(self.lines, autolim=False)
+        self.nodes = None
+        self.arrows = None
+        self.set_style(**kwargs)
+
+    def artists(self):
+        """
+        Return the artists of the collection
+        :rtype: list
+        """
+        return [artist for artist in (self.lines, self.nodes, self.arrows) if artist is not None]
+
+    def set_style(self, **kwargs):
+        """
+        Update the line properties of the rays. The colour and transparency also apply to the arrowheads
+        :param kwargs: LineCollection properties, e.g. color, alpha or linewidth
+        """
+        self.lines.update(kwargs)
+        arrowprops = {key: value for key, value in kwargs.items() if key in ('color', 'alpha')}
+        self.arrowprops.update(arrowprops)
+        if self.arrows is not None:
+            self.arrows.update(arrowprops)
+
+    def set_rays(self, rays, c=None):
+        """
+        Update the collection with new rays
+        :param rays: The rays. Any mix of Ray and RayBundle objects, or a single RayBundle
+        :param c: New colour values. Default is None (keep the current values)
+        :type rays: list, RayBundle
+        :type c: np.ndarray, None
+        """
+        if c is not None:
+            self.c = c
+        segments = ray_segments(rays)
+        if self.c is not None:
+            self.lines.set_array(_ray_values(rays, self.c, len(segments)))
+        self.set_segments(segments)
+
+    def set_segments(self, segments):
+        """
+        Move the rays to new positions, keeping their colour values, e.g. for animating precomputed rays
+        :param segments: The start and end points of the rays as an array of shape (N, 2, 2)
+        :type segments: np.ndarray
+        """
+        self.lines.set_segments(segments)
+
+        if self.nodeprops is not None:
+            nodes = segments.reshape(-1, 2)
+            if self.nodes is None:
+                style = dict(NODE_STYLE)
+                style.update(self.nodeprops)
+                self.nodes = self.ax.scatter(nodes[:, 0], nodes[:, 1], animated=self.animated, **style)
+            else:
+                self.nodes.set_offsets(nodes)
+
+        if self.arrow_step:
+            self._set_arrows(segments[::int(self.arrow_step)])
+        elif self.arrows is not None:
+            self.arrows.remove()
+            self.arrows = None
+
+    def _set_arrows(self, segments):
+        direction = segments[:, 1] - segments[:, 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            direction = direction / np.hypot(direction[:, 0], direction[:, 1])[:, np.newaxis]
+        if self.arrows is not None and self.arrows.N != len(segments):
+            self.arrows.remove()
+            self.arrows = None
+        if self.arrows is None:
+            # Added without updating the data limits, which would otherwise include the arrowheads and grow the
+            # autoscaled limits on every update
+            self.arrows = Quiver(self.ax, segments[:, 1, 0], segments[:, 1, 1], direction[:, 0], direction[:, 1],
+                                 angles='xy', pivot='tip', scale_units='inches', scale=1 / self.arrow_size,
+                                 animated=self.animated, **self.arrowprops)
+            self.ax.add_collection(self.arrows, autolim=False)
+        else:
+            self.arrows.set_offsets(segments[:, 1])
+            self.arrows.set_UVC(direction[:, 0], direction[:, 1])
+
+    def remove(self):
+        """
+        Remove the artists from the axes
+        """
+        for artist in self.artists():
+            artist.remove()
+        self.nodes = None
+        self.arrows = None
+
+
+def show_rays(ax, rays, **kwargs):
+    """
+    Show any number of rays in the axes using a single LineCollection
+    :param ax: The axes to show the rays in
+    :param rays: The rays. Any mix of Ray and RayBundle objects, or a single RayBundle
+    :param kwargs: Optional keyword arguments passed to RayCollection
+    :type ax: matplotlib.pyplot.Axes
+    :type rays: list, RayBundle
+    :return: The collection holding the artists
+    :rtype: RayCollection
+    """
+    collection = RayCollection(ax, **kwargs)
+    collection.set_rays(rays)
+    return collection
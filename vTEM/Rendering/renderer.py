@@ -0,0 +1,247 @@
+from matplotlib.lines import Line2D
+from vTEM.Profiling import profiler
+from vTEM.Rays import Ray, RayBundle
+from vTEM.Rendering.rays import RayCollection
+
+LENS_STYLE = {'ffp': {'linestyle': '--', 'color': 'k', 'alpha': 0.2},
+              'bfp': {'linestyle': '--', 'color': 'k', 'alpha': 0.2},
+              'lens': {'linestyle': '-', 'color': 'k', 'alpha': 0.5},
+              'axis': {'linestyle': '-', 'color': 'k', 'alpha': 0.2}}
+
+
+class ColumnRenderer(object):
+    """
+    Draw a column in a matplotlib axes with persistent artists.
+
+    The artists for the source, lenses and rays are created once and then only have their data and style updated.
+    When blitting is enabled, all artists are animated, so when the axes limits are unchanged, updates restore the
+    cached static background (axes, ticks and labels) and only redraw the artists. Without blitting, the artists are
+    ordinary artists drawn with the figure, e.g. when saving it to a file.
+    """
+
+    def __init__(self, ax, blit=True):
+        """
+        Create a renderer
+        :param ax: The axes to draw in
+        :param blit: Whether to use blitting when possible or not. Default is True
+        :type ax: matplotlib.pyplot.Axes
+        :type blit: bool
+        """
+        self.ax = ax
+        self.blit = bool(blit)
+        self._source = None
+        self._lenses = {}
+        self._ray_labels = []
+        self._label_segments = []
+        self._ray_collection = None
+        self._background = None
+        self._background_state = None
+        self.full_draws = 0
+        self.blitted_draws = 0
+        self._draw_connection = self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    @property
+    def canvas(self):
+        return self.ax.figure.canvas
+
+    def artists(self):
+        """
+        Return all visible artists managed by the renderer
+        :rtype: list
+        """
+        artists = []
+        if self._source is not None:
+            artists.append(self._source)
+        for lens_artists in self._lenses.values():
+            for field in lens_artists:
+                artists.extend(field['lines'].values())
+                artists.extend(field['labels'].values())
+        if self._ray_collection is not None:
+            artists.extend(self._ray_collection.artists())
+        artists.extend(self._ray_labels)
+        return [artist for artist in artists if artist.get_visible()]
+
+    def _add_line(self, **kwargs):
+        line = Line2D([], [], animated=self.blit, **kwargs)
+        self.ax.add_line(line)
+        return line
+
+    def _add_text(self):
+        return self.ax.text(0, 0, '', ha='left', va='center', animated=self.blit)
+
+    def update_source(self, source):
+        """
+        Update the source artist
+        :param source: The source to show
+        :type source: Source
+        """
+        if self._source is None:
+            self._source = self._add_line(color='C0')
+        self._source.set_data((source.x - source.size / 2, source.x + source.size / 2), (source.y, source.y))
+        self._source.set_visible(True)
+
+    def update_lenses(self, lenses, lensprops=None, label_lens=True, label_focal_planes=True):
+        """
+        Update the lens artists. Artists of lenses that are not given are hidden.
+
+        Artists are kept per lens name, so they are reused when drawing another column with the same lenses.
+        :param lenses: The lenses to show
+        :param lensprops: Line properties for the "lens", "ffp", "bfp" and "axis" lines
+        :param label_lens: Whether to label the lenses or not. Default is True
+        :param label_focal_planes: Whether to label the focal planes or not. Default is True
+        :type lenses: list
+        :type lensprops: dict, None
+        :type label_lens: bool
+        :type label_focal_planes: bool
+        """
+        style = dict(LENS_STYLE)
+        if lensprops is not None:
+            style.update(lensprops)
+        label_visibility = {'lens': label_lens, 'ffp': label_focal_planes, 'bfp': label_focal_planes}
+
+        shown = set()
+        for lens in lenses:
+            fields = lens.get_fields()
+            lens_artists = self._lenses.setdefault(_lens_key(lens), [])
+            while len(lens_artists) < len(fields):
+                lens_artists.append({'lines': {key: self._add_line() for key in LENS_STYLE},
+                                     'labels': {key: self._add_text() for key in label_visibility}})
+            for field, artists in zip(fields, lens_artists):
+                for key, (x, y) in field.lines().items():
+                    artists['lines'][key].set_data(x, y)
+                    artists['lines'][key].update(style.get(key, {}))
+                    artists['lines'][key].set_visible(True)
+                for key, (text, position) in field.labels().items():
+                    artists['labels'][key].set_text(text)
+                    artists['labels'][key].set_position(position)
+                    artists['labels'][key].set_visible(label_visibility[key])
+            shown.add(_lens_key(lens))
+
+        for key, lens_artists in self._lenses.items():
+            if key not in shown:
+                for field in lens_artists:
+                    for artist in list(field['lines'].values()) + list(field['labels'].values()):
+                        artist.set_visible(False)
+
+    def move_rays(self, segments):
+        """
+        Move the rays of the last `update_ray_collection` call to new positions, keeping their style.
+
+        This only swaps the artist data, for animating precomputed rays.
+        :param segments: The start and end points of the rays as an array of shape (N, 2, 2)
+        :type segments: np.ndarray
+        """
+        if self._ray_collection is None:
+            return
+        self._ray_collection.set_segments(segments)
+        for index, label in zip(self._label_segments, self._ray_labels):
+            label.set_position(segments[index][1])
+
+    def move_lens(self, lens, wobbled):
+        """
+        Move the artists of a shown lens to show another version of it, keeping their style.
+
+        This only swaps the artist data, for animating lens changes.
+        :param lens: The lens shown by the artists
+        :param wobbled: The lens to show instead, with the same number of fields
+        :type lens: Lens, ObjectiveLens
+        :type wobbled: Lens, ObjectiveLens
+        """
+        for field, artists in zip(wobbled.get_fields(), self._lenses.get(_lens_key(lens), [])):
+            for key, (x, y) in field.lines().items():
+                artists['lines'][key].set_data(x, y)
+            for key, (text, position) in field.labels().items():
+                artists['labels'][key].set_position(position)
+
+    def update_ray_collection(self, rays, c=None, rayprops=None, arrow_step=None, show_label=False, **kwargs):
+        """
+        Update the rays, drawn as a single LineCollection with the arrowheads as a single quiver.
+
+        The collection is created on the first call, with keyword arguments passed to RayCollection. Later calls
+        update the rays, colour values, style and arrowheads of the same artists.
+        :param rays: The rays. Any mix of Ray and RayBundle objects, or a single RayBundle
+        :param c: Values mapped to colours, one per segment or one per ray in each bundle. Default is None
+        :param rayprops: Line properties of the rays, e.g. color, alpha or linewidth. Default is None (keep the style)
+        :param arrow_step: Draw an arrowhead on every `arrow_step`-th ray segment. Default is None (no arrowheads)
+        :param show_label: Whether to label the single rays with their names or not. Default is False
+        :type rays: list, RayBundle
+        :type c: np.ndarray, None
+        :type rayprops: dict, None
+        :type arrow_step: int, None
+        :type show_label: bool
+        """
+        if self._ray_collection is None:
+            self._ray_collection = RayCollection(self.ax, c=c, animated=self.blit, **kwargs)
+        if rayprops is not None:
+            self._ray_collection.set_style(**rayprops)
+        self._ray_collection.arrow_step = arrow_step
+        self._ray_collection.set_rays(rays, c=c)
+        self._update_ray_labels(rays, show_label)
+
+    def _update_ray_labels(self, rays, show_label):
+        if isinstance(rays, RayBundle):
+            rays = [rays]
+        self._label_segments = []
+        labelled = []
+        index = 0
+        for ray in rays:
+            if isinstance(ray, Ray):
+                self._label_segments.append(index)
+                labelled.append(ray)
+                index += 1
+            else:
+                index += len(ray)
+        while len(self._ray_labels) < len(labelled):
+            self._ray_labels.append(self._add_text())
+        for ray, label in zip(labelled, self._ray_labels):
+            label.set_text(ray.name)
+            label.set_position((ray.stop.x, ray.stop.y))
+            label.set_visible(show_label)
+        for label in self._ray_labels[len(labelled):]:
+            label.set_visible(False)
+
+    def _state(self):
+        return (tuple(self.ax.get_xlim()), tuple(self.ax.get_ylim()), tuple(self.ax.figure.bbox.bounds))
+
+    def _on_draw(self, event):
+        if not self.blit or event is not None and event.canvas is not self.canvas:
+            return
+        if hasattr(self.canvas, 'copy_from_bbox'):
+            self._background = self.canvas.copy_from_bbox(self.ax.figure.bbox)
+            self._background_state = self._state()
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists():
+            self.ax.draw_artist(artist)
+
+    def invalidate(self):
+        """
+        Force the next draw to redraw the static background
+        """
+        self._background = None
+
+    def draw(self):
+        """
+        Draw the figure, blitting the artists onto the cached background when possible
+        """
+        if self.blit and self._background is not None and self._background_state == self._state():
+            with profiler.timer('blit'):
+                self.canvas.restore_region(self._background)
+                self._draw_artists()
+                self.canvas.blit(self.ax.figure.bbox)
+            self.blitted_draws += 1
+        else:
+            with profiler.timer('canvas.draw'):
+                self.canvas.draw()
+            self.full_draws += 1
+
+    def disconnect(self):
+        """
+        Stop listening to draw events of the canvas
+        """
+        self.canvas.mpl_disconnect(self._draw_connection)
+
+
+def _lens_key(lens):
+    return lens.name if lens.name else id(lens)
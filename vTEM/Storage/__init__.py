@@ -0,0 +1,2 @@
+from .serialization import *
+from .store import *
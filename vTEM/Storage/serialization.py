@@ -0,0 +1,275 @@
+import json
+import zipfile
+import numpy as np
+from vTEM.Rays import RayBundle
+from vTEM.Lenses import Lens, ObjectiveLens, Aperture, Source, Error
+from vTEM.Column import Column
+
+FORMAT_VERSION = 1
+BUNDLE_ARRAYS = ('start_x', 'start_y', 'stop_y', 'angles', 'start_z', 'angles_z', 'energies', 'blocked')
+
+
+class StorageError(Error):
+    pass
+
+
+def source_to_dict(source):
+    """
+    Return the parameters of a source as a dictionary
+    :type source: Source
+    :rtype: dict
+    """
+    return {'x': source.x, 'y': source.y, 'size': source.size, 'name': source.name, 'z': source.z}
+
+
+def element_to_dict(element):
+    """
+    Return the type and parameters of a lens, objective lens or aperture as a dictionary
+    :type element: Lens, ObjectiveLens, Aperture
+    :rtype: dict
+    """
+    if isinstance(element, ObjectiveLens):
+        return {'type': 'ObjectiveLens', 'y': element.y, 'focal_lengths': list(element.focal_lengths),
+                'gap': element.gap, 'x': element.x, 'size': element.size, 'name': element.name,
+                'coupled': element.coupled, 'z': element.z}
+    if isinstance(element, Lens):
+        return {'type': 'Lens', 'y': element.y, 'focal_length': element.focal_length, 'x': element.x,
+                'size': element.size, 'name': element.name, 'z': element.z}
+    if isinstance(element, Aperture):
+        return {'type': 'Aperture', 'y': element.y, 'diameter': element.diameter, 'x': element.x,
+                'size': element.size, 'name': element.name, 'z': element.z}
+    raise TypeError('Cannot serialize {element!r} of type {t}'.format(element=element, t=type(element)))
+
+
+def element_from_dict(data):
+    """
+    Create a lens, objective lens or aperture from a dictionary made by `element_to_dict`
+    :type data: dict
+    :rtype: Lens, ObjectiveLens, Aperture
+    """
+    data = dict(data)
+    kind = data.pop('type', None)
+    if kind == 'ObjectiveLens':
+        return ObjectiveLens(data.pop('y'), tuple(data.pop('focal_lengths')), data.pop('gap'), **data)
+    if kind == 'Lens':
+        return Lens(data.pop('y'), data.pop('focal_length'), **data)
+    if kind == 'Aperture':
+        return Aperture(data.pop('y'), data.pop('diameter'), **data)
+    raise StorageError('Element type {kind!r} not recognized'.format(kind=kind))
+
+
+def column_to_dict(column):
+    """
+    Return the source, elements and screen of a column as a dictionary of plain values
+    :type column: Column
+    :rtype: dict
+    """
+    return {'name': column.name, 'screen': column.screen, 'source': source_to_dict(column.source),
+            'lenses': [element_to_dict(lens) for lens in column.get_lenses()]}
+
+
+def column_from_dict(data):
+    """
+    Create a column from a dictionary made by `column_to_dict`
+    :type data: dict
+    :rtype: Column
+    """
+    return Column(Source(**data['source']), [element_from_dict(lens) for lens in data['lenses']],
+                  screen=data.get('screen', 0.), name=data.get('name', ''))
+
+
+def save_column(column, path):
+    """
+    Save a column to a versioned JSON file
+    :param column: The column to save
+    :param path: The path of the file
+    :type column: Column
+    :type path: str, Path
+    """
+    with open(str(path), 'w') as file:
+        json.dump({'format': 'vTEM column', 'version': FORMAT_VERSION, 'column': column_to_dict(column)}, file,
+                  indent=2)
+
+
+def load_column(path):
+    """
+    Load a column saved with `save_column`
+    :param path: The path of the file
+    :type path: str, Path
+    :rtype: Column
+    """
+    with open(str(path)) as file:
+        data = json.load(file)
+    _check_version(data, 'vTEM column', path)
+    return column_from_dict(data['column'])
+
+
+class BundleWriter(object):
+    """
+    Write ray bundles one at a time to a columnar .npz archive, e.g. while streaming traces of many rays to disk.
+
+    The archive is complete when the writer is closed, and can be read with `load_bundles`.
+    """
+
+    def __init__(self, path, compress=False):
+        """
+        Create an archive and open it for writing
+        :param path: The path of the archive
+        :param compress: Whether to compress the archive or not. Default is False
+        :type path: str, Path
+        :type compress: bool
+        """
+        self.path = str(path)
+        self.names = []
+        self._archive = zipfile.ZipFile(self.path, mode='w', compression=zipfile.ZIP_DEFLATED if compress else
+                                        zipfile.ZIP_STORED, allowZip64=True)
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.path!r}) with {n} bundles'.format(self=self, n=len(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, bundle):
+        """
+        Add a bundle to the archive
+        :param bundle: The bundle
+        :type bundle: RayBundle
+        """
+        if self._archive is None:
+            raise StorageError('Cannot write to {self!r}, which is closed'.format(self=self))
+        if not isinstance(bundle, RayBundle):
+            raise TypeError('Bundle {bundle!r} must be type RayBundle, not {t}'.format(bundle=bundle, t=type(bundle)))
+        for key in BUNDLE_ARRAYS:
+            value = getattr(bundle, key)
+            if value is not None:
+                self._write_array('{i}/{key}'.format(i=len(self.names), key=key),
+                                  np.broadcast_to(value, bundle.start_x.shape))
+        self.names.append(bundle.name)
+
+    def close(self):
+        """
+        Write the metadata and close the archive
+        """
+        if self._archive is None:
+            return
+        metadata = {'format': 'vTEM bundles', 'version': FORMAT_VERSION, 'names': self.names}
+        self._write_array('metadata', np.array(json.dumps(metadata)))
+        self._archive.close()
+        self._archive = None
+
+    def _write_array(self, name, array):
+        with self._archive.open('{name}.npy'.format(name=name), mode='w', force_zip64=True) as member:
+            np.lib.format.write_array(member, array, allow_pickle=False)
+
+
+def save_bundles(path, bundles, compress=False):
+    """
+    Save ray bundles, e.g. the bundles of a trace, to a columnar .npz archive.
+
+    Each array of each bundle is stored as a separate member. Uncompressed archives can be memory-mapped by
+    `load_bundles`. Compressed archives are smaller, but are read into memory when loaded.
+    :param path: The path of the archive
+    :param bundles: The bundle or bundles to save
+    :param compress: Whether to compress the archive or not. Default is False
+    :type path: str, Path
+    :type bundles: RayBundle, list
+    :type compress: bool
+    """
+    if isinstance(bundles, RayBundle):
+        bundles = [bundles]
+    with BundleWriter(path, compress=compress) as writer:
+        for bundle in bundles:
+            writer.write(bundle)
+
+
+def load_bundles(path, mmap=True):
+    """
+    Load ray bundles saved with `save_bundles`.
+
+    The arrays of uncompressed archives are memory-mapped copy-on-write, so loading is instant and only the parts
+    that are used are read from disk. Changes to the arrays are not written back to the archive.
+    :param path: The path of the archive
+    :param mmap: Whether to memory-map the arrays when possible or not. Default is True
+    :type path: str, Path
+    :type mmap: bool
+    :return: The bundles
+    :rtype: list
+    """
+    path = str(path)
+    if mmap:
+        members = _map_npz(path)
+    else:
+        with np.load(path, allow_pickle=False) as archive:
+            members = {name: archive[name] for name in archive.files}
+    if 'metadata' not in members:
+        raise StorageError('{path} is not a vTEM bundles file'.format(path=path))
+    metadata = json.loads(str(members.pop('metadata')))
+    _check_version(metadata, 'vTEM bundles', path)
+    bundles = []
+    for i, name in enumerate(metadata['names']):
+        arrays = {key: members.get('{i}/{key}'.format(i=i, key=key)) for key in BUNDLE_ARRAYS}
+        bundles.append(RayBundle.from_arrays(name=name, **arrays))
+    return bundles
+
+
+def _map_npz(path):
+    """
+    Return the arrays of an .npz archive, memory-mapping the arrays of uncompressed members.
+
+    The archive is mapped once and the arrays are views into the mapping, so the number of members is not limited by
+    the number of open files.
+    """
+    arrays = {}
+    headers = {}
+    mapping = None
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            file.seek(info.header_offset)
+            header = file.read(30)
+            file.seek(info.header_offset + 30 + int.from_bytes(header[26:28], 'little') +
+                      int.from_bytes(header[28:30], 'little'))
+            start = file.tell()
+            version = np.lib.format.read_magic(file)
+            length = int.from_bytes(file.read(2 if version == (1, 0) else 4), 'little')
+            raw = file.read(length)
+            if raw not in headers:
+                # Members of the same shape and type share headers, so each header is only parsed once
+                file.seek(start + np.lib.format.MAGIC_LEN)
+                if version == (1, 0):
+                    headers[raw] = np.lib.format.read_array_header_1_0(file)
+                else:
+                    headers[raw] = np.lib.format.read_array_header_2_0(file)
+            shape, fortran_order, dtype = headers[raw]
+            if dtype.hasobject:
+                raise StorageError('Cannot memory-map object array {name!r} in {path}'.format(name=name, path=path))
+            size = int(np.prod(shape))
+            if size == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            if mapping is None:
+                mapping = np.memmap(path, dtype=np.uint8, mode='c')
+            offset = file.tell()
+            data = mapping[offset:offset + size * dtype.itemsize].view(dtype)
+            arrays[name] = data.reshape(shape, order='F' if fortran_order else 'C')
+    return arrays
+
+
+def _check_version(data, kind, path):
+    if data.get('format') != kind:
+        raise StorageError('{path} is not a {kind} file'.format(path=path, kind=kind))
+    if data.get('version', 0) > FORMAT_VERSION:
+        raise StorageError('{path} has format version {version}, but only versions up to {supported} are supported. '
+                           'Please update vTEM'.format(path=path, version=data.get('version'),
+                                                       supported=FORMAT_VERSION))
@@ -0,0 +1,171 @@
+import json
+import numpy as np
+from pathlib import Path
+from vTEM.Column import SweepResult
+from vTEM.Storage.serialization import FORMAT_VERSION, StorageError, _check_version
+
+SWEEP_FIELDS = ('x', 'angle')
+
+
+class ResultStore(object):
+    """
+    The screen positions and angles of a parameter sweep, stored on disk and memory-mapped.
+
+    A store is a directory with a JSON metadata file, one .npy file per result field and a mask of the configurations
+    that have been traced. The field arrays have one axis per swept parameter followed by one axis for the rays, as in
+    `SweepResult`. They are memory-mapped, so slicing them by configuration or by ray only reads the sliced values from
+    disk, and a store of any size opens instantly.
+    """
+
+    def __init__(self, path, mode='r'):
+        """
+        Open an existing result store
+        :param path: The directory of the store
+        :param mode: "r" to open the store read-only or "r+" to write to it. Default is "r"
+        :type path: str, Path
+        :type mode: str
+        """
+        if mode not in ('r', 'r+'):
+            raise ValueError('Mode {mode!r} must be "r" or "r+"'.format(mode=mode))
+        self.path = Path(path)
+        self.mode = mode
+        metadata_path = self.path / 'metadata.json'
+        if not metadata_path.is_file():
+            raise StorageError('{path} is not a vTEM sweep store'.format(path=self.path))
+        with open(str(metadata_path)) as file:
+            metadata = json.load(file)
+        _check_version(metadata, 'vTEM sweep', self.path)
+        self.parameters = {key: np.asarray(values) for key, values in metadata['parameters'].items()}
+        self.screen = float(metadata['screen'])
+        self.n_rays = int(metadata['n_rays'])
+        self.x = np.load(str(self.path / 'x.npy'), mmap_mode=mode)
+        self.angle = np.load(str(self.path / 'angle.npy'), mmap_mode=mode)
+        self.done = np.load(str(self.path / 'done.npy'), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, path, parameters, n_rays, screen=0., dtype=float):
+        """
+        Create an empty result store for a sweep and open it for writing.
+
+        The field files are allocated at their full size, but are only written to disk as configurations are traced.
+        :param path: The directory of the store. It is created if it does not exist, and must not hold a store already
+        :param parameters: The values to sweep, keyed by parameter (e.g. {"CL1.f": np.linspace(1, 3, 10)})
+        :param n_rays: The number of rays traced through every configuration
+        :param screen: The position of the screen along the optical axis. Default is 0
+        :param dtype: The data type of the stored positions and angles. Default is float
+        :type path: str, Path
+        :type parameters: dict
+        :type n_rays: int
+        :type screen: float
+        :type dtype: type, str, np.dtype
+        :rtype: ResultStore
+        """
+        path = Path(path)
+        if (path / 'metadata.json').exists():
+            raise StorageError('{path} already holds a sweep store'.format(path=path))
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            raise TypeError('Data type {dtype} of a sweep store must be a floating point type'.format(dtype=dtype))
+        parameters = {key: np.asarray(values).tolist() for key, values in parameters.items()}
+        shape = tuple(len(values) for values in parameters.values()) + (int(n_rays),)
+        path.mkdir(parents=True, exist_ok=True)
+        for field in SWEEP_FIELDS:
+            np.lib.format.open_memmap(str(path / '{field}.npy'.format(field=field)), mode='w+', dtype=dtype,
+                                      shape=shape).flush()
+        np.lib.format.open_memmap(str(path / 'done.npy'), mode='w+', dtype=bool, shape=shape[:-1]).flush()
+        # The metadata is written last, so an interrupted creation does not leave a store that can be opened
+        with open(str(path / 'metadata.json'), 'w') as file:
+            json.dump({'format': 'vTEM sweep', 'version': FORMAT_VERSION, 'parameters': parameters,
+                       'screen': float(screen), 'n_rays': int(n_rays), 'fields': list(SWEEP_FIELDS)}, file, indent=2)
+        return cls(path, mode='r+')
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({path!r}, shape={self.shape!r}, done={done}/{total})'.format(
+            self=self, path=str(self.path), done=int(np.count_nonzero(self.done)), total=self.done.size)
+
+    def __len__(self):
+        return self.done.size
+
+    @property
+    def shape(self):
+        return self.x.shape
+
+    @property
+    def complete(self):
+        """Whether every configuration has been traced or not"""
+        return bool(np.all(self.done))
+
+    def settings(self, index):
+        """
+        Return the parameter values of a configuration
+        :param index: The index of the configuration in the parameter grid, or its flat index
+        :type index: tuple, int
+        :rtype: dict
+        """
+        if np.ndim(index) == 0:
+            index = np.unravel_index(index, self.done.shape)
+        return {key: values[i] for (key, values), i in zip(self.parameters.items(), index)}
+
+    def configuration(self, index, rays=slice(None)):
+        """
+        Return the screen positions and angles of the rays of a configuration, read lazily from the store
+        :param index: The index of the configuration in the parameter grid, or its flat index
+        :param rays: The rays to return, as an index, slice or mask. Default is all rays
+        :type index: tuple, int
+        :return: The positions and angles of the rays at the screen
+        :rtype: tuple
+        """
+        if np.ndim(index) == 0:
+            index = np.unravel_index(index, self.done.shape)
+        index = tuple(index) + (rays,)
+        return self.x[index], self.angle[index]
+
+    def rays(self, rays):
+        """
+        Return the screen positions and angles of some rays in every configuration, read lazily from the store
+        :param rays: The rays to return, as an index, slice or mask
+        :return: The positions and angles of the rays at the screen, with one axis per swept parameter first
+        :rtype: tuple
+        """
+        return self.x[..., rays], self.angle[..., rays]
+
+    def write(self, indices, x, angle):
+        """
+        Write the screen positions and angles of traced configurations and mark them as done
+        :param indices: The flat indices of the configurations
+        :param x: The positions of the rays at the screen, with one row per configuration
+        :param angle: The angles of the rays at the screen in degrees, with one row per configuration
+        :type indices: int, np.ndarray
+        :type x: np.ndarray
+        :type angle: np.ndarray
+        """
+        if self.mode == 'r':
+            raise StorageError('Cannot write to {self!r}, which is opened read-only'.format(self=self))
+        self.x.reshape(-1, self.n_rays)[indices] = x
+        self.angle.reshape(-1, self.n_rays)[indices] = angle
+        self.done.reshape(-1)[indices] = True
+
+    def flush(self):
+        """
+        Write changes to disk
+        """
+        if self.mode != 'r':
+            for array in (self.x, self.angle, self.done):
+                array.flush()
+
+    def result(self):
+        """
+        Return the store as a sweep result with memory-mapped arrays
+        :rtype: SweepResult
+        """
+        return SweepResult(self.parameters, self.x, self.angle, self.screen)
+
+
+def load_sweep(path):
+    """
+    Open a sweep saved to a result store as a read-only, memory-mapped sweep result
+    :param path: The directory of the store
+    :type path: str, Path
+    :rtype: SweepResult
+    """
+    return ResultStore(path).result()
@@ -1,3 +1,40 @@
+import importlib
+
+from .Profiling import *
 from .Rays import *
 from .Lenses import *
-from .gui import *
\ No newline at end of file
+from .Column import *
+from .Storage import *
+
+# The GUI and rendering pull in PyQt5 and matplotlib, so they are only imported when first accessed.
+_lazy_attributes = {
+    'gui': ('.gui', None),
+    'Rendering': ('.Rendering', None),
+    'ColumnRenderer': ('.Rendering', 'ColumnRenderer'),
+    'draw_column': ('.Rendering', 'draw_column'),
+    'render_column': ('.Rendering', 'render_column'),
+    'MainWindow': ('.gui', 'MainWindow'),
+    'vTEMModel': ('.gui', 'vTEMModel'),
+    'vTEMController': ('.gui', 'vTEMController'),
+    'run_gui': ('.gui', 'run_gui'),
+    'main': ('.gui', 'main'),
+    'MplCanvas': ('.gui', 'MplCanvas'),
+    'MplWidget': ('.gui', 'MplWidget'),
+    'RedrawScheduler': ('.gui', 'RedrawScheduler'),
+    'WobbleWindow': ('.gui', 'WobbleWindow'),
+    'WobbleController': ('.gui', 'WobbleController'),
+}
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
+    module_name, attribute = _lazy_attributes[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
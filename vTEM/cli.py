@@ -0,0 +1,309 @@
+"""
+Command line interface for tracing, sweeping and drawing columns without the GUI.
+
+Usage::
+
+    vtem trace column.json --rays 1e6 --out results.npz
+    vtem sweep column.json --parameter CL1.f=1:3:20 --parameter OL.x=-0.1,0,0.1 --rays 1000 --out sweep
+    vtem render column.json [other.json ...] --out diagrams --format svg --processes 4
+    vtem animate column.json --parameter CL1.f=1:3:50 --out sweep.gif --fps 10
+    vtem table column.json --targets 1000 5000 10000 --out table.csv
+
+Columns are given as JSON files saved with `vTEM.save_column`, or as "standard" for `Column.standard()`. Figures are
+drawn with the Agg backend, so no display is needed.
+"""
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from vTEM.Column import Column, Autofocus
+from vTEM.Lenses import Error
+from vTEM.Storage import BundleWriter, StorageError, load_column
+
+
+def count(value):
+    """
+    Parse a number of rays, allowing scientific notation such as "1e6"
+    :rtype: int
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('{value!r} is not a number'.format(value=value))
+    if number < 0 or number != int(number):
+        raise argparse.ArgumentTypeError('{value!r} is not a whole number of rays'.format(value=value))
+    return int(number)
+
+
+def sweep_parameter(value):
+    """
+    Parse a swept parameter given as "<parameter>=<start>:<stop>:<number>" or "<parameter>=<value>,<value>,..."
+    :return: The parameter and its values
+    :rtype: tuple
+    """
+    key, _, values = value.partition('=')
+    try:
+        if ':' in values:
+            start, stop, number = values.split(':')
+            return key, np.linspace(float(start), float(stop), int(number))
+        return key, np.array([float(v) for v in values.split(',')])
+    except ValueError:
+        raise argparse.ArgumentTypeError('Parameter {value!r} must be given as "<parameter>=<start>:<stop>:<number>" '
+                                         'or "<parameter>=<value>,<value>,..."'.format(value=value))
+
+
+def get_column(config):
+    """
+    Load the column of a configuration file, or the standard column for "standard"
+    :rtype: Column
+    """
+    if config == 'standard':
+        return Column.standard()
+    return load_column(config)
+
+
+def add_sampling_arguments(parser):
+    parser.add_argument('--rays', type=count, default=1000, help='The number of rays to sample. Default is 1000')
+    parser.add_argument('--spot', choices=('uniform', 'gaussian'), default='uniform',
+                        help='The spatial distribution of the rays at the source. Default is uniform')
+    parser.add_argument('--angle', type=float, default=0., help='The mean angle of the rays in degrees. Default is 0')
+    parser.add_argument('--spread', type=float, default=0.,
+                        help='The angular spread of the rays in degrees. Default is 0')
+    parser.add_argument('--angular', choices=('uniform', 'gaussian'), default='gaussian',
+                        help='The angular distribution of the rays. Default is gaussian')
+    parser.add_argument('--energy-spread', type=float, default=0.,
+                        help='The standard deviation of the relative energy deviations dE/E. Default is 0')
+    parser.add_argument('--seed', type=int, help='The seed of the random number generator')
+    parser.add_argument('--lenses', nargs='+', help='The names of the lenses to trace through. Default is all lenses')
+
+
+def sampling(arguments):
+    return {'spot': arguments.spot, 'angle': arguments.angle, 'spread': arguments.spread,
+            'angular': arguments.angular, 'energy_spread': arguments.energy_spread}
+
+
+def trace(arguments):
+    """
+    Trace sampled rays through a column in chunks, streaming the traced bundles of each chunk to an archive
+    """
+    column = get_column(arguments.config)
+    start = time.perf_counter()
+    transmitted = 0
+    with BundleWriter(arguments.out, compress=arguments.compress) as writer:
+        for bundle in column.source.stream(arguments.rays, chunk_size=arguments.chunk_size, seed=arguments.seed,
+                                           skew=not arguments.meridional, **sampling(arguments)):
+            traced = column.trace(bundle, lenses=arguments.lenses, cache=False)
+            traced[-1].extend(column.screen)
+            for step in traced if arguments.all_steps else traced[-1:]:
+                writer.write(step)
+            transmitted += traced[-1].transmitted
+    print('Traced {n} rays ({transmitted} transmitted) in {t:.2f} s to {out}'.format(
+        n=arguments.rays, transmitted=transmitted, t=time.perf_counter() - start, out=arguments.out))
+
+
+def sweep(arguments):
+    """
+    Sweep column settings, writing the screen positions and angles of sampled rays to a result store
+    """
+    if (Path(arguments.out) / 'metadata.json').is_file():
+        if not arguments.resume:
+            raise StorageError('{out} already holds a sweep store. Use --resume to continue it'.format(
+                out=arguments.out))
+        if arguments.seed is None:
+            raise ValueError('Resuming a sweep needs the --seed of the sweep, so the same rays are traced')
+    column = get_column(arguments.config)
+    rays = column.source.sample(arguments.rays, seed=arguments.seed, skew=False, **sampling(arguments))
+    start = time.perf_counter()
+    result = column.sweep(dict(arguments.parameter), rays, lenses=arguments.lenses, processes=arguments.processes,
+                          chunksize=arguments.chunk_size, store=arguments.out)
+    print('Swept {shape} in {t:.2f} s to {out}'.format(shape=result.shape, t=time.perf_counter() - start,
+                                                      out=arguments.out))
+
+
+def render(arguments):
+    """
+    Draw ray diagrams of columns to image files in a pool of worker processes
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from vTEM.Rendering import export_columns
+
+    out = Path(arguments.out)
+    if len(arguments.configs) == 1 and out.suffix:
+        paths = [out]
+    else:
+        out.mkdir(parents=True, exist_ok=True)
+        paths = [out / '{name}.{format}'.format(name=name, format=arguments.format)
+                 for name in output_names(arguments.configs)]
+    # Configuration files are loaded by the workers, so only the paths are sent to them
+    columns = [Column.standard() if config == 'standard' else config for config in arguments.configs]
+    for path in export_columns(columns, paths, processes=arguments.processes, **drawing(arguments)):
+        print(path)
+
+
+def output_names(configs):
+    """
+    Return unique output file names for columns, without extension.
+
+    Columns are named after their file, e.g. "column" for "configs/column.json". Columns whose names are not unique
+    (e.g. "a/column.json" and "b/column.json", or "standard" given twice) are numbered in order, e.g. "column-1" and
+    "column-2", skipping names that are taken by other columns.
+    :param configs: The column JSON files, or "standard"
+    :type configs: list
+    :rtype: list
+    """
+    stems = [Path(config).stem for config in configs]
+    used = {stem for stem in stems if stems.count(stem) == 1}
+    indices = {}
+    names = []
+    for stem in stems:
+        if stems.count(stem) == 1:
+            names.append(stem)
+            continue
+        index = indices.get(stem, 0)
+        name = stem
+        while name in used or name == stem:
+            index += 1
+            name = '{stem}-{index}'.format(stem=stem, index=index)
+        indices[stem] = index
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def animate(arguments):
+    """
+    Draw a slider sweep of column settings as an animated GIF or MP4 video
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from vTEM.Rendering import animate_sweep
+
+    start = time.perf_counter()
+    frames = animate_sweep(get_column(arguments.config), dict(arguments.parameter), arguments.out, fps=arguments.fps,
+                           processes=arguments.processes, limits=None if arguments.rescale else 'first',
+                           **drawing(arguments))
+    print('Animated {frames} frames in {t:.2f} s to {out}'.format(frames=frames, t=time.perf_counter() - start,
+                                                                 out=arguments.out))
+
+
+def add_drawing_arguments(parser):
+    parser.add_argument('--angles', type=float, nargs='+', default=[1.],
+                        help='The angles of the rays emitted from the edge of the source. Default is 1')
+    parser.add_argument('--symmetric', action='store_true',
+                        help='Also draw the rays emitted from the opposite edge at the opposite angles')
+    parser.add_argument('--lenses', nargs='+', help='The names of the lenses to draw. Default is all lenses')
+    parser.add_argument('--figsize', type=float, nargs=2, default=[6., 8.], metavar=('WIDTH', 'HEIGHT'),
+                        help='The figure size in inches. Default is 6 8')
+    parser.add_argument('--dpi', type=float, default=100, help='The resolution of raster images. Default is 100')
+    parser.add_argument('--processes', type=int,
+                        help='The number of worker processes. Default is one per CPU. Use 0 for none')
+
+
+def drawing(arguments):
+    return {'angles': arguments.angles, 'symmetric': arguments.symmetric, 'lenses': arguments.lenses,
+            'figsize': tuple(arguments.figsize), 'dpi': arguments.dpi}
+
+
+def table(arguments):
+    """
+    Solve the projector lenses of a column for a list of magnifications or camera lengths and write them as CSV
+    """
+    autofocus = Autofocus(get_column(arguments.config), variables=arguments.variables)
+    rows = autofocus.table(arguments.targets, mode=arguments.mode)
+    file = sys.stdout if arguments.out is None else open(arguments.out, 'w', newline='')
+    try:
+        writer = csv.writer(file)
+        writer.writerow([arguments.mode] + list(autofocus.variables))
+        for target, focal_lengths in zip(arguments.targets, rows):
+            writer.writerow([target] + [focal_lengths[variable] for variable in autofocus.variables])
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='vtem', description='Trace, sweep and draw vTEM columns without the GUI')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    parser_trace = commands.add_parser('trace', help='Trace sampled rays and stream the traced bundles to an .npz')
+    parser_trace.add_argument('config', help='The column JSON file, or "standard"')
+    parser_trace.add_argument('--out', required=True, help='The .npz archive to write the traced bundles to')
+    add_sampling_arguments(parser_trace)
+    parser_trace.add_argument('--meridional', action='store_true', help='Sample meridional rays instead of skew rays')
+    parser_trace.add_argument('--chunk-size', type=count, default=100000,
+                              help='The number of rays traced at a time. Default is 100000')
+    parser_trace.add_argument('--all-steps', action='store_true',
+                              help='Write the bundles of every trace step instead of only the rays at the screen')
+    parser_trace.add_argument('--compress', action='store_true',
+                              help='Compress the archive. Compressed archives cannot be memory-mapped')
+    parser_trace.set_defaults(function=trace)
+
+    parser_sweep = commands.add_parser('sweep', help='Sweep column settings into an on-disk result store')
+    parser_sweep.add_argument('config', help='The column JSON file, or "standard"')
+    parser_sweep.add_argument('--out', required=True, help='The directory of the result store')
+    parser_sweep.add_argument('--parameter', type=sweep_parameter, action='append', required=True,
+                              help='A swept parameter as "<parameter>=<start>:<stop>:<number>" or '
+                                   '"<parameter>=<value>,<value>,...", e.g. "CL1.f=1:3:20". Can be repeated')
+    add_sampling_arguments(parser_sweep)
+    parser_sweep.add_argument('--processes', type=int,
+                              help='The number of worker processes. Default is one per CPU. Use 0 for none')
+    parser_sweep.add_argument('--chunk-size', type=count, help='The number of configurations per task')
+    parser_sweep.add_argument('--resume', action='store_true',
+                              help='Continue an interrupted sweep in the result store, skipping the configurations '
+                                   'that are done. Needs the same arguments and --seed as the interrupted sweep')
+    parser_sweep.set_defaults(function=sweep)
+
+    parser_render = commands.add_parser('render', help='Draw ray diagrams of columns to image files')
+    parser_render.add_argument('configs', nargs='+', help='The column JSON files, or "standard"')
+    parser_render.add_argument('--out', required=True,
+                               help='The image file for a single column, or the directory to write the images to')
+    parser_render.add_argument('--format', default='png',
+                               help='The image format when writing to a directory, e.g. png, svg or pdf. '
+                                    'Default is png')
+    add_drawing_arguments(parser_render)
+    parser_render.set_defaults(function=render)
+
+    parser_animate = commands.add_parser('animate', help='Draw a slider sweep of column settings as a GIF or MP4')
+    parser_animate.add_argument('config', help='The column JSON file, or "standard"')
+    parser_animate.add_argument('--out', required=True, help='The animation file, ending in .gif or .mp4')
+    parser_animate.add_argument('--parameter', type=sweep_parameter, action='append', required=True,
+                                help='A swept parameter as "<parameter>=<start>:<stop>:<number>" or '
+                                     '"<parameter>=<value>,<value>,...". Repeated parameters are swept together '
+                                     'and must have the same number of values')
+    parser_animate.add_argument('--fps', type=float, default=10, help='The frames per second. Default is 10')
+    parser_animate.add_argument('--rescale', action='store_true',
+                                help='Scale the axes of every frame instead of keeping those of the first frame')
+    add_drawing_arguments(parser_animate)
+    parser_animate.set_defaults(function=animate)
+
+    parser_table = commands.add_parser('table', help='Tabulate projector lens settings for magnifications or camera '
+                                                     'lengths as CSV')
+    parser_table.add_argument('config', help='The column JSON file, or "standard"')
+    parser_table.add_argument('--targets', type=float, nargs='+', required=True,
+                              help='The target magnifications or camera lengths')
+    parser_table.add_argument('--mode', choices=Autofocus.modes, default='magnification',
+                              help='Whether the targets are magnifications or camera lengths. Default is magnification')
+    parser_table.add_argument('--variables', nargs='+', default=['IL1', 'IL2', 'IL3', 'PL'],
+                              help='The lenses to solve for. Default is IL1 IL2 IL3 PL')
+    parser_table.add_argument('--out', help='The CSV file to write. Default is standard output')
+    parser_table.set_defaults(function=table)
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    arguments = parser.parse_args(argv)
+    try:
+        arguments.function(arguments)
+    except (Error, ValueError, KeyError, OSError) as error:
+        parser.exit(1, '{prog}: error: {error}\n'.format(prog=parser.prog, error=error))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,4 @@
 from .gui import *
-from .mplwidget import *
\ No newline at end of file
+from .mplwidget import *
+from .scheduler import *
+from .wobbler import *
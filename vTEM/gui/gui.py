@@ -1,105 +1,79 @@
+from concurrent.futures import ProcessPoolExecutor
 from PyQt5 import QtWidgets, uic
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
-from vTEM import Lens, ObjectiveLens, RayNode, Ray, Source, RayTransmitError
+from vTEM import Lens, ObjectiveLens, RayNode, Ray, Source, RayTransmitError, Column, save_column, load_column, \
+    column_to_dict, column_from_dict
+from vTEM.gui.scheduler import RedrawScheduler
+from vTEM.gui.wobbler import WobbleWindow, WobbleController
+from vTEM.Profiling import profiler, timed
+from vTEM.Rendering import ColumnRenderer, export_columns
 from pathlib import Path
-import matplotlib.pyplot as plt
+import matplotlib
+import multiprocessing
 
 import sys
 
+PROFILE_STAGES = ('emit_ray', 'Lens.__call__', 'make_raytraces', 'resize_lenses', 'show_lenses', 'show_raytrace',
+                  'canvas.draw', 'blit', 'show')
+
 
 class MainWindow(QtWidgets.QMainWindow):
+    closed = pyqtSignal()
+    message = pyqtSignal(str)
 
     def __init__(self, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
 
         # Load the UI Page
         uic.loadUi(str(Path(__file__).parent / 'source/qtcreator/mainwindow.ui'), self)
+        # Messages may be emitted from other threads, and are shown in the GUI thread
+        self.message.connect(self.statusbar.showMessage)
+
+    def closeEvent(self, event):
+        self.closed.emit()
+        super(MainWindow, self).closeEvent(event)
 
 
 class vTEMModel(QObject):
     updated = pyqtSignal([], [bool])
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, column=None, **kwargs):
 
         super(vTEMModel, self).__init__(*args, **kwargs)
-        self.source = Source(0, 220, 10, name='Source')
-        self.CL1 = Lens(200, 2, name='CL1')
-        self.CL2 = Lens(180, 2, name='CL2')
-        self.CL3 = Lens(160, 2, name='CL3')
-        self.CM = Lens(140, 2, name='CM')
-        self.OL = ObjectiveLens(120, (2, 2), 10)
-        self.OM = Lens(100, 2, name='OM')
-        self.IL1 = Lens(80, 2, name='IL1')
-        self.IL2 = Lens(60, 2, name='IL2')
-        self.IL3 = Lens(40, 2, name='IL3')
-        self.PL = Lens(20, 2, name='PL')
+        if column is None:
+            column = Column.standard()
+        self.column = column
+        self.source = self.column.source
+        self.CL1 = self.column['CL1']
+        self.CL2 = self.column['CL2']
+        self.CL3 = self.column['CL3']
+        self.CM = self.column['CM']
+        self.OL = self.column['OL']
+        self.OM = self.column['OM']
+        self.IL1 = self.column['IL1']
+        self.IL2 = self.column['IL2']
+        self.IL3 = self.column['IL3']
+        self.PL = self.column['PL']
 
     def __getitem__(self, item):
-        if isinstance(item, int):
-            return self.get_lenses()[item]
-        elif isinstance(item, str):
-            for lens in self:
-                if lens.name == item:
-                    return lens
-            raise KeyError('Lens {key} not found'.format(key=item))
-        raise TypeError(
-            'Error when indexing using {item!r}. Indexing using objects of type {t} is not supported'.format(item=item,
-                                                                                                             t=type(
-                                                                                                                 item)))
+        return self.column[item]
 
     def __iter__(self):
-        for lens in self.get_lenses():
+        for lens in self.column:
             yield lens
 
     def get_lenses(self, sort=True):
-        lenses = [self.CL1, self.CL2, self.CL3, self.CM, self.OL, self.OM, self.IL1, self.IL2, self.IL3, self.PL]
-        if sort:
-            lenses.sort(key=lambda x: x.y, reverse=True)
-        return lenses
+        return self.column.get_lenses(sort)
 
     def change_source(self, x=None, y=None, size=None):
-        changed = False
-        if x is not None:
-            self.source.set_x(x)
-            changed = True
-        if y is not None:
-            self.source.set_y(y)
-            changed = True
-        if size is not None:
-            self.source.set_size(size)
-            changed = True
-
+        changed = self.column.change_source(x=x, y=y, size=size)
         if changed:
             self.updated.emit()
         self.updated[bool].emit(changed)
 
     def change_lens(self, name, x=None, y=None, f=None, gap=None, prefield=None, postfield=None, couple=None):
-        if not isinstance(name, str):
-            raise TypeError('Name {name!r} must be of type str, not {t}'.format(name=name, t=type(name)))
-        lens = self[name]
-        changed = False
-        if x is not None:
-            lens.set_x(x)
-            changed = True
-        if y is not None:
-            lens.set_y(y)
-            changed = True
-        if f is not None:
-            lens.set_f(f)
-            changed = True
-        if isinstance(lens, ObjectiveLens) and gap is not None:
-            lens.set_gap(gap)
-            changed = True
-        if isinstance(lens, ObjectiveLens) and prefield is not None:
-            lens.set_prefield(prefield)
-            changed = True
-        if isinstance(lens, ObjectiveLens) and postfield is not None:
-            lens.set_postfield(postfield)
-            changed = True
-        if isinstance(lens, ObjectiveLens) and couple is not None:
-            lens.couple(couple)
-            changed = True
-
+        changed = self.column.change_lens(name, x=x, y=y, f=f, gap=gap, prefield=prefield, postfield=postfield,
+                                          couple=couple)
         if changed:
             self.updated.emit()
         self.updated[bool].emit(changed)
@@ -107,26 +81,47 @@ class vTEMModel(QObject):
 
 class vTEMController(object):
 
-    def __init__(self, view, model):
+    def __init__(self, view, model, redraw_interval=0, profile=None):
         """
         Create a controller for a vTEM
         :param view: The gui object to show and control the vTEM
         :param model: The vTEM model to control
+        :param redraw_interval: The frame budget in milliseconds within which changes are rendered together. Default is 0 (one render per event loop tick)
+        :param profile: Whether to profile redraws and show the stage timings in the status bar. Default is None (profile if the VTEM_PROFILE environment variable is set)
         :type view: MainWindow
         :type model: vTEMModel
+        :type redraw_interval: int
+        :type profile: bool, None
         """
         self._view = view
         self._model = model
+        if profile is None:
+            profile = profiler.enabled
+        elif profile:
+            profiler.enable()
+        self.profile = bool(profile)
+        self.scheduler = RedrawScheduler(self.show, interval=redraw_interval, parent=self._view)
+        self.renderer = ColumnRenderer(self._view.plotWidget.canvas.ax)
         self.setup_lens_widgets()
         #self.set_y_spinbox_limits()
         self.setup_source_control()
         self.setup_lens_control()
         self.setup_screen_control()
         self.setup_style_control()
-        self._view.plotPushButton.clicked.connect(self.show)
+        self._view.plotPushButton.clicked.connect(self.scheduler.request)
         self._view.exportPushButton.clicked.connect(self.export)
-        self._view.autoscaleRadioButton.toggled.connect(self.show)
-        self._model.updated.connect(self.show)
+        self.wobbler = None
+        self.exporter = None
+        self._autoscaled_limits = None
+        self._last_raytraces = None
+        self._restyle_requests = 0
+        self._rendered_requests = 0
+        self._view.closed.connect(self.close)
+        self._view.wobblerPushButton.clicked.connect(self.show_wobbler)
+        self._view.savePushButton.clicked.connect(self.save_column)
+        self._view.loadPushButton.clicked.connect(self.load_column)
+        self._view.autoscaleRadioButton.toggled.connect(self.scheduler.request)
+        self._model.updated.connect(self.scheduler.request)
 
         self.show()
 
@@ -134,11 +129,13 @@ class vTEMController(object):
         self._view.sourceXSpinBox.valueChanged.connect(lambda x: self._model.change_source(x=x))
         self._view.sourceYSpinBox.valueChanged.connect(lambda y: self._model.change_source(y=y))
         self._view.sourceSizeSpinBox.valueChanged.connect(lambda size: self._model.change_source(size=size))
-        self._view.sourceAngleSpinBox.valueChanged.connect(self.show)
-        self._view.symmetricSourceCheckBox.clicked.connect(self.show)
+        self._view.sourceAngleSpinBox.valueChanged.connect(self.scheduler.request)
+        self._view.symmetricSourceCheckBox.clicked.connect(self.scheduler.request)
 
     def setup_screen_control(self):
-        self._view.screenSpinBox.valueChanged.connect(self.show)
+        self._model.column.set_screen(self._view.screenSpinBox.value())
+        self._view.screenSpinBox.valueChanged.connect(self._model.column.set_screen)
+        self._view.screenSpinBox.valueChanged.connect(self.scheduler.request)
 
     def setup_lens_widgets(self):
         self._view.cl1FSpinBox.setSingleStep(0.01)
@@ -166,42 +163,42 @@ class vTEMController(object):
         self._view.plFSpinBox.setDecimals(5)
 
         #Connect spinboxes to sliders
-        self._view.cl1XSpinBox.valueChanged.connect(lambda x: self._view.cl1XSlider.setValue(x*1E2))
-        self._view.cl2XSpinBox.valueChanged.connect(lambda x: self._view.cl2XSlider.setValue(x*1E2))
-        self._view.cl3XSpinBox.valueChanged.connect(lambda x: self._view.cl3XSlider.setValue(x*1E2))
-        self._view.cmXSpinBox.valueChanged.connect(lambda x: self._view.cmXSlider.setValue(x*1E2))
-        self._view.olXSpinBox.valueChanged.connect(lambda x: self._view.olXSlider.setValue(x*1E2))
-        self._view.omXSpinBox.valueChanged.connect(lambda x: self._view.omXSlider.setValue(x*1E2))
-        self._view.il1XSpinBox.valueChanged.connect(lambda x: self._view.il1XSlider.setValue(x*1E2))
-        self._view.il2XSpinBox.valueChanged.connect(lambda x: self._view.il2XSlider.setValue(x*1E2))
-        self._view.il3XSpinBox.valueChanged.connect(lambda x: self._view.il3XSlider.setValue(x*1E2))
-        self._view.plXSpinBox.valueChanged.connect(lambda x: self._view.plXSlider.setValue(x*1E2))
-
-        self._view.cl1YSpinBox.valueChanged.connect(lambda x: self._view.cl1YSlider.setValue(x*1E2))
-        self._view.cl2YSpinBox.valueChanged.connect(lambda x: self._view.cl2YSlider.setValue(x*1E2))
-        self._view.cl3YSpinBox.valueChanged.connect(lambda x: self._view.cl3YSlider.setValue(x*1E2))
-        self._view.cmYSpinBox.valueChanged.connect(lambda x: self._view.cmYSlider.setValue(x*1E2))
-        self._view.olYSpinBox.valueChanged.connect(lambda x: self._view.olYSlider.setValue(x*1E2))
-        self._view.omYSpinBox.valueChanged.connect(lambda x: self._view.omYSlider.setValue(x*1E2))
-        self._view.il1YSpinBox.valueChanged.connect(lambda x: self._view.il1YSlider.setValue(x*1E2))
-        self._view.il2YSpinBox.valueChanged.connect(lambda x: self._view.il2YSlider.setValue(x*1E2))
-        self._view.il3YSpinBox.valueChanged.connect(lambda x: self._view.il3YSlider.setValue(x*1E2))
-        self._view.plYSpinBox.valueChanged.connect(lambda x: self._view.plYSlider.setValue(x*1E2))
-
-        self._view.cl1FSpinBox.valueChanged.connect(lambda x: self._view.cl1FSlider.setValue(x*1E5))
-        self._view.cl2FSpinBox.valueChanged.connect(lambda x: self._view.cl2FSlider.setValue(x*1E5))
-        self._view.cl3FSpinBox.valueChanged.connect(lambda x: self._view.cl3FSlider.setValue(x*1E5))
-        self._view.cmFSpinBox.valueChanged.connect(lambda x: self._view.cmFSlider.setValue(x*1E5))
-        self._view.olFSpinBox.valueChanged.connect(lambda x: self._view.olFSlider.setValue(x*1E5))
-        self._view.olPrefieldSpinBox.valueChanged.connect(lambda x: self._view.olPrefieldSlider.setValue(x*1E5))
-        self._view.omFSpinBox.valueChanged.connect(lambda x: self._view.omFSlider.setValue(x*1E5))
-        self._view.il1FSpinBox.valueChanged.connect(lambda x: self._view.il1FSlider.setValue(x*1E5))
-        self._view.il2FSpinBox.valueChanged.connect(lambda x: self._view.il2FSlider.setValue(x*1E5))
-        self._view.il3FSpinBox.valueChanged.connect(lambda x: self._view.il3FSlider.setValue(x*1E5))
-        self._view.plFSpinBox.valueChanged.connect(lambda x: self._view.plFSlider.setValue(x*1E5))
-
-        self._view.olGapSpinBox.valueChanged.connect(lambda x: self._view.olGapSlider.setValue(x*1E2))
-        self._view.olPrefieldSpinBox.valueChanged.connect(lambda x: self._view.olPrefieldSlider.setValue(x*1E5))
+        self._view.cl1XSpinBox.valueChanged.connect(lambda x: self._view.cl1XSlider.setValue(round(x*1E2)))
+        self._view.cl2XSpinBox.valueChanged.connect(lambda x: self._view.cl2XSlider.setValue(round(x*1E2)))
+        self._view.cl3XSpinBox.valueChanged.connect(lambda x: self._view.cl3XSlider.setValue(round(x*1E2)))
+        self._view.cmXSpinBox.valueChanged.connect(lambda x: self._view.cmXSlider.setValue(round(x*1E2)))
+        self._view.olXSpinBox.valueChanged.connect(lambda x: self._view.olXSlider.setValue(round(x*1E2)))
+        self._view.omXSpinBox.valueChanged.connect(lambda x: self._view.omXSlider.setValue(round(x*1E2)))
+        self._view.il1XSpinBox.valueChanged.connect(lambda x: self._view.il1XSlider.setValue(round(x*1E2)))
+        self._view.il2XSpinBox.valueChanged.connect(lambda x: self._view.il2XSlider.setValue(round(x*1E2)))
+        self._view.il3XSpinBox.valueChanged.connect(lambda x: self._view.il3XSlider.setValue(round(x*1E2)))
+        self._view.plXSpinBox.valueChanged.connect(lambda x: self._view.plXSlider.setValue(round(x*1E2)))
+
+        self._view.cl1YSpinBox.valueChanged.connect(lambda x: self._view.cl1YSlider.setValue(round(x*1E2)))
+        self._view.cl2YSpinBox.valueChanged.connect(lambda x: self._view.cl2YSlider.setValue(round(x*1E2)))
+        self._view.cl3YSpinBox.valueChanged.connect(lambda x: self._view.cl3YSlider.setValue(round(x*1E2)))
+        self._view.cmYSpinBox.valueChanged.connect(lambda x: self._view.cmYSlider.setValue(round(x*1E2)))
+        self._view.olYSpinBox.valueChanged.connect(lambda x: self._view.olYSlider.setValue(round(x*1E2)))
+        self._view.omYSpinBox.valueChanged.connect(lambda x: self._view.omYSlider.setValue(round(x*1E2)))
+        self._view.il1YSpinBox.valueChanged.connect(lambda x: self._view.il1YSlider.setValue(round(x*1E2)))
+        self._view.il2YSpinBox.valueChanged.connect(lambda x: self._view.il2YSlider.setValue(round(x*1E2)))
+        self._view.il3YSpinBox.valueChanged.connect(lambda x: self._view.il3YSlider.setValue(round(x*1E2)))
+        self._view.plYSpinBox.valueChanged.connect(lambda x: self._view.plYSlider.setValue(round(x*1E2)))
+
+        self._view.cl1FSpinBox.valueChanged.connect(lambda x: self._view.cl1FSlider.setValue(round(x*1E5)))
+        self._view.cl2FSpinBox.valueChanged.connect(lambda x: self._view.cl2FSlider.setValue(round(x*1E5)))
+        self._view.cl3FSpinBox.valueChanged.connect(lambda x: self._view.cl3FSlider.setValue(round(x*1E5)))
+        self._view.cmFSpinBox.valueChanged.connect(lambda x: self._view.cmFSlider.setValue(round(x*1E5)))
+        self._view.olFSpinBox.valueChanged.connect(lambda x: self._view.olFSlider.setValue(round(x*1E5)))
+        self._view.olPrefieldSpinBox.valueChanged.connect(lambda x: self._view.olPrefieldSlider.setValue(round(x*1E5)))
+        self._view.omFSpinBox.valueChanged.connect(lambda x: self._view.omFSlider.setValue(round(x*1E5)))
+        self._view.il1FSpinBox.valueChanged.connect(lambda x: self._view.il1FSlider.setValue(round(x*1E5)))
+        self._view.il2FSpinBox.valueChanged.connect(lambda x: self._view.il2FSlider.setValue(round(x*1E5)))
+        self._view.il3FSpinBox.valueChanged.connect(lambda x: self._view.il3FSlider.setValue(round(x*1E5)))
+        self._view.plFSpinBox.valueChanged.connect(lambda x: self._view.plFSlider.setValue(round(x*1E5)))
+
+        self._view.olGapSpinBox.valueChanged.connect(lambda x: self._view.olGapSlider.setValue(round(x*1E2)))
+        self._view.olPrefieldSpinBox.valueChanged.connect(lambda x: self._view.olPrefieldSlider.setValue(round(x*1E5)))
 
         #Connect sliders to spinboxes
         self._view.cl1XSlider.valueChanged.connect(lambda x: self._view.cl1XSpinBox.setValue(x*1E-2))
@@ -242,120 +239,120 @@ class vTEMController(object):
         self._view.olPrefieldSlider.valueChanged.connect(lambda x: self._view.olPrefieldSpinBox.setValue(x*1E-5))
         
         #Set limits
-        self._view.cl1XSlider.setMaximum(self._view.cl1XSpinBox.maximum() * 1E2)
-        self._view.cl2XSlider.setMaximum(self._view.cl2XSpinBox.maximum() * 1E2)
-        self._view.cl3XSlider.setMaximum(self._view.cl3XSpinBox.maximum() * 1E2)
-        self._view.cmXSlider.setMaximum(self._view.cmXSpinBox.maximum() * 1E2)
-        self._view.olXSlider.setMaximum(self._view.olXSpinBox.maximum() * 1E2)
-        self._view.omXSlider.setMaximum(self._view.omXSpinBox.maximum() * 1E2)
-        self._view.il1XSlider.setMaximum(self._view.il1XSpinBox.maximum() * 1E2)
-        self._view.il2XSlider.setMaximum(self._view.il2XSpinBox.maximum() * 1E2)
-        self._view.il3XSlider.setMaximum(self._view.il3XSpinBox.maximum() * 1E2)
-        self._view.plXSlider.setMaximum(self._view.plXSpinBox.maximum() * 1E2)
-
-        self._view.cl1YSlider.setMaximum(self._view.cl1YSpinBox.maximum() * 1E2)
-        self._view.cl2YSlider.setMaximum(self._view.cl2YSpinBox.maximum() * 1E2)
-        self._view.cl3YSlider.setMaximum(self._view.cl3YSpinBox.maximum() * 1E2)
-        self._view.cmYSlider.setMaximum(self._view.cmYSpinBox.maximum() * 1E2)
-        self._view.olYSlider.setMaximum(self._view.olYSpinBox.maximum() * 1E2)
-        self._view.omYSlider.setMaximum(self._view.omYSpinBox.maximum() * 1E2)
-        self._view.il1YSlider.setMaximum(self._view.il1YSpinBox.maximum() * 1E2)
-        self._view.il2YSlider.setMaximum(self._view.il2YSpinBox.maximum() * 1E2)
-        self._view.il3YSlider.setMaximum(self._view.il3YSpinBox.maximum() * 1E2)
-        self._view.plYSlider.setMaximum(self._view.plYSpinBox.maximum() * 1E2)
-
-        self._view.cl1FSlider.setMaximum(self._view.cl1FSpinBox.maximum() * 1E5)
-        self._view.cl2FSlider.setMaximum(self._view.cl2FSpinBox.maximum() * 1E5)
-        self._view.cl3FSlider.setMaximum(self._view.cl3FSpinBox.maximum() * 1E5)
-        self._view.cmFSlider.setMaximum(self._view.cmFSpinBox.maximum() * 1E5)
-        self._view.olFSlider.setMaximum(self._view.olFSpinBox.maximum() * 1E5)
-        self._view.omFSlider.setMaximum(self._view.omFSpinBox.maximum() * 1E5)
-        self._view.il1FSlider.setMaximum(self._view.il1FSpinBox.maximum() * 1E5)
-        self._view.il2FSlider.setMaximum(self._view.il2FSpinBox.maximum() * 1E5)
-        self._view.il3FSlider.setMaximum(self._view.il3FSpinBox.maximum() * 1E5)
-        self._view.plFSlider.setMaximum(self._view.plFSpinBox.maximum() * 1E5)
-        self._view.olPrefieldSlider.setMaximum(self._view.olPrefieldSpinBox.maximum() * 1E5)
-
-        self._view.cl1XSlider.setMinimum(self._view.cl1XSpinBox.minimum()*1E2)
-        self._view.cl2XSlider.setMinimum(self._view.cl2XSpinBox.minimum()*1E2)
-        self._view.cl3XSlider.setMinimum(self._view.cl3XSpinBox.minimum()*1E2)
-        self._view.cmXSlider.setMinimum(self._view.cmXSpinBox.minimum()*1E2)
-        self._view.olXSlider.setMinimum(self._view.olXSpinBox.minimum()*1E2)
-        self._view.omXSlider.setMinimum(self._view.omXSpinBox.minimum()*1E2)
-        self._view.il1XSlider.setMinimum(self._view.il1XSpinBox.minimum()*1E2)
-        self._view.il2XSlider.setMinimum(self._view.il2XSpinBox.minimum()*1E2)
-        self._view.il3XSlider.setMinimum(self._view.il3XSpinBox.minimum()*1E2)
-        self._view.plXSlider.setMinimum(self._view.plXSpinBox.minimum()*1E2)
-
-        self._view.cl1YSlider.setMinimum(self._view.cl1YSpinBox.minimum()*1E2)
-        self._view.cl2YSlider.setMinimum(self._view.cl2YSpinBox.minimum()*1E2)
-        self._view.cl3YSlider.setMinimum(self._view.cl3YSpinBox.minimum()*1E2)
-        self._view.cmYSlider.setMinimum(self._view.cmYSpinBox.minimum()*1E2)
-        self._view.olYSlider.setMinimum(self._view.olYSpinBox.minimum()*1E2)
-        self._view.omYSlider.setMinimum(self._view.omYSpinBox.minimum()*1E2)
-        self._view.il1YSlider.setMinimum(self._view.il1YSpinBox.minimum()*1E2)
-        self._view.il2YSlider.setMinimum(self._view.il2YSpinBox.minimum()*1E2)
-        self._view.il3YSlider.setMinimum(self._view.il3YSpinBox.minimum()*1E2)
-        self._view.plYSlider.setMinimum(self._view.plYSpinBox.minimum()*1E2)
-
-        self._view.cl1FSlider.setMinimum(self._view.cl1FSpinBox.minimum()*1E5)
-        self._view.cl2FSlider.setMinimum(self._view.cl2FSpinBox.minimum()*1E5)
-        self._view.cl3FSlider.setMinimum(self._view.cl3FSpinBox.minimum()*1E5)
-        self._view.cmFSlider.setMinimum(self._view.cmFSpinBox.minimum()*1E5)
-        self._view.olFSlider.setMinimum(self._view.olFSpinBox.minimum()*1E5)
-        self._view.omFSlider.setMinimum(self._view.omFSpinBox.minimum()*1E5)
-        self._view.il1FSlider.setMinimum(self._view.il1FSpinBox.minimum()*1E5)
-        self._view.il2FSlider.setMinimum(self._view.il2FSpinBox.minimum()*1E5)
-        self._view.il3FSlider.setMinimum(self._view.il3FSpinBox.minimum()*1E5)
-        self._view.plFSlider.setMinimum(self._view.plFSpinBox.minimum()*1E5)
-        self._view.olPrefieldSlider.setMinimum(self._view.olPrefieldSpinBox.minimum()*1E5)
+        self._view.cl1XSlider.setMaximum(round(self._view.cl1XSpinBox.maximum() * 1E2))
+        self._view.cl2XSlider.setMaximum(round(self._view.cl2XSpinBox.maximum() * 1E2))
+        self._view.cl3XSlider.setMaximum(round(self._view.cl3XSpinBox.maximum() * 1E2))
+        self._view.cmXSlider.setMaximum(round(self._view.cmXSpinBox.maximum() * 1E2))
+        self._view.olXSlider.setMaximum(round(self._view.olXSpinBox.maximum() * 1E2))
+        self._view.omXSlider.setMaximum(round(self._view.omXSpinBox.maximum() * 1E2))
+        self._view.il1XSlider.setMaximum(round(self._view.il1XSpinBox.maximum() * 1E2))
+        self._view.il2XSlider.setMaximum(round(self._view.il2XSpinBox.maximum() * 1E2))
+        self._view.il3XSlider.setMaximum(round(self._view.il3XSpinBox.maximum() * 1E2))
+        self._view.plXSlider.setMaximum(round(self._view.plXSpinBox.maximum() * 1E2))
+
+        self._view.cl1YSlider.setMaximum(round(self._view.cl1YSpinBox.maximum() * 1E2))
+        self._view.cl2YSlider.setMaximum(round(self._view.cl2YSpinBox.maximum() * 1E2))
+        self._view.cl3YSlider.setMaximum(round(self._view.cl3YSpinBox.maximum() * 1E2))
+        self._view.cmYSlider.setMaximum(round(self._view.cmYSpinBox.maximum() * 1E2))
+        self._view.olYSlider.setMaximum(round(self._view.olYSpinBox.maximum() * 1E2))
+        self._view.omYSlider.setMaximum(round(self._view.omYSpinBox.maximum() * 1E2))
+        self._view.il1YSlider.setMaximum(round(self._view.il1YSpinBox.maximum() * 1E2))
+        self._view.il2YSlider.setMaximum(round(self._view.il2YSpinBox.maximum() * 1E2))
+        self._view.il3YSlider.setMaximum(round(self._view.il3YSpinBox.maximum() * 1E2))
+        self._view.plYSlider.setMaximum(round(self._view.plYSpinBox.maximum() * 1E2))
+
+        self._view.cl1FSlider.setMaximum(round(self._view.cl1FSpinBox.maximum() * 1E5))
+        self._view.cl2FSlider.setMaximum(round(self._view.cl2FSpinBox.maximum() * 1E5))
+        self._view.cl3FSlider.setMaximum(round(self._view.cl3FSpinBox.maximum() * 1E5))
+        self._view.cmFSlider.setMaximum(round(self._view.cmFSpinBox.maximum() * 1E5))
+        self._view.olFSlider.setMaximum(round(self._view.olFSpinBox.maximum() * 1E5))
+        self._view.omFSlider.setMaximum(round(self._view.omFSpinBox.maximum() * 1E5))
+        self._view.il1FSlider.setMaximum(round(self._view.il1FSpinBox.maximum() * 1E5))
+        self._view.il2FSlider.setMaximum(round(self._view.il2FSpinBox.maximum() * 1E5))
+        self._view.il3FSlider.setMaximum(round(self._view.il3FSpinBox.maximum() * 1E5))
+        self._view.plFSlider.setMaximum(round(self._view.plFSpinBox.maximum() * 1E5))
+        self._view.olPrefieldSlider.setMaximum(round(self._view.olPrefieldSpinBox.maximum() * 1E5))
+
+        self._view.cl1XSlider.setMinimum(round(self._view.cl1XSpinBox.minimum()*1E2))
+        self._view.cl2XSlider.setMinimum(round(self._view.cl2XSpinBox.minimum()*1E2))
+        self._view.cl3XSlider.setMinimum(round(self._view.cl3XSpinBox.minimum()*1E2))
+        self._view.cmXSlider.setMinimum(round(self._view.cmXSpinBox.minimum()*1E2))
+        self._view.olXSlider.setMinimum(round(self._view.olXSpinBox.minimum()*1E2))
+        self._view.omXSlider.setMinimum(round(self._view.omXSpinBox.minimum()*1E2))
+        self._view.il1XSlider.setMinimum(round(self._view.il1XSpinBox.minimum()*1E2))
+        self._view.il2XSlider.setMinimum(round(self._view.il2XSpinBox.minimum()*1E2))
+        self._view.il3XSlider.setMinimum(round(self._view.il3XSpinBox.minimum()*1E2))
+        self._view.plXSlider.setMinimum(round(self._view.plXSpinBox.minimum()*1E2))
+
+        self._view.cl1YSlider.setMinimum(round(self._view.cl1YSpinBox.minimum()*1E2))
+        self._view.cl2YSlider.setMinimum(round(self._view.cl2YSpinBox.minimum()*1E2))
+        self._view.cl3YSlider.setMinimum(round(self._view.cl3YSpinBox.minimum()*1E2))
+        self._view.cmYSlider.setMinimum(round(self._view.cmYSpinBox.minimum()*1E2))
+        self._view.olYSlider.setMinimum(round(self._view.olYSpinBox.minimum()*1E2))
+        self._view.omYSlider.setMinimum(round(self._view.omYSpinBox.minimum()*1E2))
+        self._view.il1YSlider.setMinimum(round(self._view.il1YSpinBox.minimum()*1E2))
+        self._view.il2YSlider.setMinimum(round(self._view.il2YSpinBox.minimum()*1E2))
+        self._view.il3YSlider.setMinimum(round(self._view.il3YSpinBox.minimum()*1E2))
+        self._view.plYSlider.setMinimum(round(self._view.plYSpinBox.minimum()*1E2))
+
+        self._view.cl1FSlider.setMinimum(round(self._view.cl1FSpinBox.minimum()*1E5))
+        self._view.cl2FSlider.setMinimum(round(self._view.cl2FSpinBox.minimum()*1E5))
+        self._view.cl3FSlider.setMinimum(round(self._view.cl3FSpinBox.minimum()*1E5))
+        self._view.cmFSlider.setMinimum(round(self._view.cmFSpinBox.minimum()*1E5))
+        self._view.olFSlider.setMinimum(round(self._view.olFSpinBox.minimum()*1E5))
+        self._view.omFSlider.setMinimum(round(self._view.omFSpinBox.minimum()*1E5))
+        self._view.il1FSlider.setMinimum(round(self._view.il1FSpinBox.minimum()*1E5))
+        self._view.il2FSlider.setMinimum(round(self._view.il2FSpinBox.minimum()*1E5))
+        self._view.il3FSlider.setMinimum(round(self._view.il3FSpinBox.minimum()*1E5))
+        self._view.plFSlider.setMinimum(round(self._view.plFSpinBox.minimum()*1E5))
+        self._view.olPrefieldSlider.setMinimum(round(self._view.olPrefieldSpinBox.minimum()*1E5))
         
         #Set initial values:
-        self._view.cl1XSlider.setValue(self._view.cl1XSpinBox.value() * 1E2)
-        self._view.cl2XSlider.setValue(self._view.cl2XSpinBox.value() * 1E2)
-        self._view.cl3XSlider.setValue(self._view.cl3XSpinBox.value() * 1E2)
-        self._view.cmXSlider.setValue(self._view.cmXSpinBox.value() * 1E2)
-        self._view.olXSlider.setValue(self._view.olXSpinBox.value() * 1E2)
-        self._view.omXSlider.setValue(self._view.omXSpinBox.value() * 1E2)
-        self._view.il1XSlider.setValue(self._view.il1XSpinBox.value() * 1E2)
-        self._view.il2XSlider.setValue(self._view.il2XSpinBox.value() * 1E2)
-        self._view.il3XSlider.setValue(self._view.il3XSpinBox.value() * 1E2)
-        self._view.plXSlider.setValue(self._view.plXSpinBox.value() * 1E2)
-
-        self._view.cl1YSlider.setValue(self._view.cl1YSpinBox.value() * 1E2)
-        self._view.cl2YSlider.setValue(self._view.cl2YSpinBox.value() * 1E2)
-        self._view.cl3YSlider.setValue(self._view.cl3YSpinBox.value() * 1E2)
-        self._view.cmYSlider.setValue(self._view.cmYSpinBox.value() * 1E2)
-        self._view.olYSlider.setValue(self._view.olYSpinBox.value() * 1E2)
-        self._view.omYSlider.setValue(self._view.omYSpinBox.value() * 1E2)
-        self._view.il1YSlider.setValue(self._view.il1YSpinBox.value() * 1E2)
-        self._view.il2YSlider.setValue(self._view.il2YSpinBox.value() * 1E2)
-        self._view.il3YSlider.setValue(self._view.il3YSpinBox.value() * 1E2)
-        self._view.plYSlider.setValue(self._view.plYSpinBox.value() * 1E2)
-
-        self._view.cl1FSlider.setValue(self._view.cl1FSpinBox.value() * 1E5)
-        self._view.cl2FSlider.setValue(self._view.cl2FSpinBox.value() * 1E5)
-        self._view.cl3FSlider.setValue(self._view.cl3FSpinBox.value() * 1E5)
-        self._view.cmFSlider.setValue(self._view.cmFSpinBox.value() * 1E5)
-        self._view.olFSlider.setValue(self._view.olFSpinBox.value() * 1E5)
-        self._view.omFSlider.setValue(self._view.omFSpinBox.value() * 1E5)
-        self._view.il1FSlider.setValue(self._view.il1FSpinBox.value() * 1E5)
-        self._view.il2FSlider.setValue(self._view.il2FSpinBox.value() * 1E5)
-        self._view.il3FSlider.setValue(self._view.il3FSpinBox.value() * 1E5)
-        self._view.plFSlider.setValue(self._view.plFSpinBox.value() * 1E5)
-        self._view.olPrefieldSlider.setValue(self._view.olPrefieldSpinBox.value() * 1E5)
+        self._view.cl1XSlider.setValue(round(self._view.cl1XSpinBox.value() * 1E2))
+        self._view.cl2XSlider.setValue(round(self._view.cl2XSpinBox.value() * 1E2))
+        self._view.cl3XSlider.setValue(round(self._view.cl3XSpinBox.value() * 1E2))
+        self._view.cmXSlider.setValue(round(self._view.cmXSpinBox.value() * 1E2))
+        self._view.olXSlider.setValue(round(self._view.olXSpinBox.value() * 1E2))
+        self._view.omXSlider.setValue(round(self._view.omXSpinBox.value() * 1E2))
+        self._view.il1XSlider.setValue(round(self._view.il1XSpinBox.value() * 1E2))
+        self._view.il2XSlider.setValue(round(self._view.il2XSpinBox.value() * 1E2))
+        self._view.il3XSlider.setValue(round(self._view.il3XSpinBox.value() * 1E2))
+        self._view.plXSlider.setValue(round(self._view.plXSpinBox.value() * 1E2))
+
+        self._view.cl1YSlider.setValue(round(self._view.cl1YSpinBox.value() * 1E2))
+        self._view.cl2YSlider.setValue(round(self._view.cl2YSpinBox.value() * 1E2))
+        self._view.cl3YSlider.setValue(round(self._view.cl3YSpinBox.value() * 1E2))
+        self._view.cmYSlider.setValue(round(self._view.cmYSpinBox.value() * 1E2))
+        self._view.olYSlider.setValue(round(self._view.olYSpinBox.value() * 1E2))
+        self._view.omYSlider.setValue(round(self._view.omYSpinBox.value() * 1E2))
+        self._view.il1YSlider.setValue(round(self._view.il1YSpinBox.value() * 1E2))
+        self._view.il2YSlider.setValue(round(self._view.il2YSpinBox.value() * 1E2))
+        self._view.il3YSlider.setValue(round(self._view.il3YSpinBox.value() * 1E2))
+        self._view.plYSlider.setValue(round(self._view.plYSpinBox.value() * 1E2))
+
+        self._view.cl1FSlider.setValue(round(self._view.cl1FSpinBox.value() * 1E5))
+        self._view.cl2FSlider.setValue(round(self._view.cl2FSpinBox.value() * 1E5))
+        self._view.cl3FSlider.setValue(round(self._view.cl3FSpinBox.value() * 1E5))
+        self._view.cmFSlider.setValue(round(self._view.cmFSpinBox.value() * 1E5))
+        self._view.olFSlider.setValue(round(self._view.olFSpinBox.value() * 1E5))
+        self._view.omFSlider.setValue(round(self._view.omFSpinBox.value() * 1E5))
+        self._view.il1FSlider.setValue(round(self._view.il1FSpinBox.value() * 1E5))
+        self._view.il2FSlider.setValue(round(self._view.il2FSpinBox.value() * 1E5))
+        self._view.il3FSlider.setValue(round(self._view.il3FSpinBox.value() * 1E5))
+        self._view.plFSlider.setValue(round(self._view.plFSpinBox.value() * 1E5))
+        self._view.olPrefieldSlider.setValue(round(self._view.olPrefieldSpinBox.value() * 1E5))
 
     def setup_lens_control(self):
-        self._view.cl1CheckBox.clicked.connect(self.show)
-        self._view.cl2CheckBox.clicked.connect(self.show)
-        self._view.cl3CheckBox.clicked.connect(self.show)
-        self._view.cmCheckBox.clicked.connect(self.show)
-        self._view.olCheckBox.clicked.connect(self.show)
-        self._view.omCheckBox.clicked.connect(self.show)
-        self._view.il1CheckBox.clicked.connect(self.show)
-        self._view.il2CheckBox.clicked.connect(self.show)
-        self._view.il3CheckBox.clicked.connect(self.show)
-        self._view.plCheckBox.clicked.connect(self.show)
+        self._view.cl1CheckBox.clicked.connect(self.scheduler.request)
+        self._view.cl2CheckBox.clicked.connect(self.scheduler.request)
+        self._view.cl3CheckBox.clicked.connect(self.scheduler.request)
+        self._view.cmCheckBox.clicked.connect(self.scheduler.request)
+        self._view.olCheckBox.clicked.connect(self.scheduler.request)
+        self._view.omCheckBox.clicked.connect(self.scheduler.request)
+        self._view.il1CheckBox.clicked.connect(self.scheduler.request)
+        self._view.il2CheckBox.clicked.connect(self.scheduler.request)
+        self._view.il3CheckBox.clicked.connect(self.scheduler.request)
+        self._view.plCheckBox.clicked.connect(self.scheduler.request)
 
         self._view.printCL1.clicked.connect(lambda x: print(self._model.CL1))
         self._view.printCL2.clicked.connect(lambda x: print(self._model.CL2))
@@ -409,33 +406,33 @@ class vTEMController(object):
         #self._view.olFSpinBox.valueChanged.connect(lambda f: )
 
     def setup_style_control(self):
-        self._view.lensStyleComboBox.currentIndexChanged.connect(self.show)
-        self._view.lensColorComboBox.currentIndexChanged.connect(self.show)
-        self._view.lensLinewidthSpinBox.valueChanged.connect(self.show)
-        self._view.lensAlphaSpinBox.valueChanged.connect(self.show)
-        self._view.lensLabelCheckBox.clicked.connect(self.show)
-
-        self._view.focalPlaneStyleComboBox.currentIndexChanged.connect(self.show)
-        self._view.focalPlaneColorComboBox.currentIndexChanged.connect(self.show)
-        self._view.focalPlaneLinewidthSpinBox.valueChanged.connect(self.show)
-        self._view.focalPlaneAlphaSpinBox.valueChanged.connect(self.show)
-        self._view.focalPlaneLabelCheckBox.clicked.connect(self.show)
-
-        self._view.imagePlaneStyleComboBox.currentIndexChanged.connect(self.show)
-        self._view.imagePlaneColorComboBox.currentIndexChanged.connect(self.show)
-        self._view.imagePlaneLinewidthSpinBox.valueChanged.connect(self.show)
-        self._view.imagePlaneAlphaSpinBox.valueChanged.connect(self.show)
-        self._view.imagePlaneLabelCheckBox.clicked.connect(self.show)
-
-        self._view.rayColorComboBox.currentIndexChanged.connect(self.show)
-        self._view.rayLinewidthSpinBox.valueChanged.connect(self.show)
-        self._view.rayAlphaSpinBox.valueChanged.connect(self.show)
-        self._view.rayLabelCheckBox.clicked.connect(self.show)
-
-        self._view.xminSpinBox.valueChanged.connect(self.show)
-        self._view.xmaxSpinBox.valueChanged.connect(self.show)
-        self._view.yminSpinBox.valueChanged.connect(self.show)
-        self._view.ymaxSpinBox.valueChanged.connect(self.show)
+        self._view.lensStyleComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.lensColorComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.lensLinewidthSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.lensAlphaSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.lensLabelCheckBox.clicked.connect(self.request_restyle)
+
+        self._view.focalPlaneStyleComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.focalPlaneColorComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.focalPlaneLinewidthSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.focalPlaneAlphaSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.focalPlaneLabelCheckBox.clicked.connect(self.request_restyle)
+
+        self._view.imagePlaneStyleComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.imagePlaneColorComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.imagePlaneLinewidthSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.imagePlaneAlphaSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.imagePlaneLabelCheckBox.clicked.connect(self.request_restyle)
+
+        self._view.rayColorComboBox.currentIndexChanged.connect(self.request_restyle)
+        self._view.rayLinewidthSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.rayAlphaSpinBox.valueChanged.connect(self.request_restyle)
+        self._view.rayLabelCheckBox.clicked.connect(self.request_restyle)
+
+        self._view.xminSpinBox.valueChanged.connect(self.scheduler.request)
+        self._view.xmaxSpinBox.valueChanged.connect(self.scheduler.request)
+        self._view.yminSpinBox.valueChanged.connect(self.scheduler.request)
+        self._view.ymaxSpinBox.valueChanged.connect(self.scheduler.request)
 
         self._view.manualRadioButton.toggled.connect(
             lambda: self._view.xminSpinBox.setEnabled(self._view.manualRadioButton.isChecked()))
@@ -525,24 +522,9 @@ class vTEMController(object):
     def make_raytrace(self, initial_ray=None):
         if initial_ray is None:
             initial_ray = self._model.source.emit_ray(self._view.sourceAngleSpinBox.value(), 1)
-        rays = [initial_ray]
-        lenses = self._model.get_lenses()#self.get_active_lenses()
-        active_lenses = self.get_active_lenses()
-        for lens in lenses:
-            if lens.name in self.get_active_lenses(names=True):
-                try:
-                    transmitted_ray = lens(rays[-1])
-                except ZeroDivisionError:
-                    break
-                except RayTransmitError:
-                    pass
-                else:
-                    if isinstance(transmitted_ray, list):
-                        [rays.append(ray) for ray in transmitted_ray]
-                    else:
-                        rays.append(transmitted_ray)
-        return rays
+        return self._model.column.trace(initial_ray, lenses=self.get_active_lenses(names=True))
 
+    @timed('resize_lenses')
     def resize_lenses(self, left, right):
         """"
         Resizes the lenses to span at least to left or right, whichever is farthest from the lens centre
@@ -553,13 +535,59 @@ class vTEMController(object):
             size = 2*max([abs(left_offset), abs(right_offset)])
             lens.set_size(size)
 
+    def lens_span(self, left, right):
+        """
+        Return the horizontal extent of the active lenses when they are resized to span to left and right
+        :rtype: tuple
+        """
+        lenses = self.get_active_lenses()
+        if not lenses:
+            return left, right
+        sizes = [2 * max(abs(left - lens.x), abs(right - lens.x)) for lens in lenses]
+        return (min([lens.x - size / 2 for lens, size in zip(lenses, sizes)]),
+                max([lens.x + size / 2 for lens, size in zip(lenses, sizes)]))
+
+    @timed('make_raytraces')
+    def make_raytraces(self):
+        """
+        Trace the rays emitted from the source, including the symmetric ray if it is enabled
+        :rtype: list
+        """
+        return [ray for initial_ray in self.initial_rays() for ray in self.make_raytrace(initial_ray)]
+
+    def initial_rays(self):
+        """
+        Return the rays emitted from the source, including the symmetric ray if it is enabled
+        :rtype: list
+        """
+        rays = [self._model.source.emit_ray(self._view.sourceAngleSpinBox.value(), 1)]
+        if self._view.symmetricSourceCheckBox.isChecked():
+            rays.append(self._model.source.emit_ray(-self._view.sourceAngleSpinBox.value(), -1))
+        return rays
+
     def show_source(self):
-        self._model.source.show(self._view.plotWidget.canvas.ax)
+        self.renderer.update_source(self._model.source)
 
+    @timed('show_lenses')
     def show_lenses(self):
-        for lens in self.get_active_lenses():
-            lens.show(self._view.plotWidget.canvas.ax, lensprops={
-                'ffp': {'linestyle': self._view.focalPlaneStyleComboBox.currentText(),
+        self.renderer.update_lenses(self.get_active_lenses(), lensprops=self.lens_style(),
+                                    label_lens=self._view.lensLabelCheckBox.isChecked(),
+                                    label_focal_planes=self._view.focalPlaneLabelCheckBox.isChecked())
+
+    @timed('show_raytrace')
+    def show_raytrace(self, raytraces=None):
+        if raytraces is None:
+            raytraces = self.make_raytraces()
+        self.renderer.update_ray_collection(raytraces, rayprops=self.ray_style(), arrow_step=1,
+                                            show_label=self._view.rayLabelCheckBox.isChecked())
+        return raytraces
+
+    def lens_style(self):
+        """
+        Return the line properties of the lenses and focal planes chosen in the GUI
+        :rtype: dict
+        """
+        return {'ffp': {'linestyle': self._view.focalPlaneStyleComboBox.currentText(),
                         'linewidth': self._view.focalPlaneLinewidthSpinBox.value(),
                         'color': self._view.focalPlaneColorComboBox.currentText(),
                         'alpha': self._view.focalPlaneAlphaSpinBox.value()},
@@ -570,59 +598,237 @@ class vTEMController(object):
                 'lens': {'linestyle': self._view.lensStyleComboBox.currentText(),
                          'linewidth': self._view.lensLinewidthSpinBox.value(),
                          'color': self._view.lensColorComboBox.currentText(),
-                         'alpha': self._view.lensAlphaSpinBox.value()}},
-                      label_lens = self._view.lensLabelCheckBox.isChecked(),
-                      label_focal_planes = self._view.focalPlaneLabelCheckBox.isChecked())
+                         'alpha': self._view.lensAlphaSpinBox.value()}}
 
-    def show_raytrace(self, initial_ray=None):
-        raytraces = self.make_raytrace(initial_ray)
-        for ray in raytraces:
-            ray.show(self._view.plotWidget.canvas.ax, show_label=self._view.rayLabelCheckBox.isChecked(), arrowprops={'color': self._view.rayColorComboBox.currentText(), 'alpha': self._view.rayAlphaSpinBox.value(),'lw': self._view.rayLinewidthSpinBox.value()})
-
-        return raytraces
+    def ray_style(self):
+        """
+        Return the line properties of the rays chosen in the GUI
+        :rtype: dict
+        """
+        return {'color': self._view.rayColorComboBox.currentText(),
+                'alpha': self._view.rayAlphaSpinBox.value(),
+                'lw': self._view.rayLinewidthSpinBox.value()}
 
     def show(self):
-        xlims = self._view.plotWidget.canvas.ax.get_xlim()
-        ylims = self._view.plotWidget.canvas.ax.get_ylim()
-        self._view.plotWidget.canvas.ax.cla()
-        self.show_source()
-        raytraces = self.show_raytrace()
-        if self._view.symmetricSourceCheckBox.isChecked():
-            symmetric_rays = self.show_raytrace(initial_ray = self._model.source.emit_ray(-self._view.sourceAngleSpinBox.value(), -1))
-            raytraces = raytraces + symmetric_rays
+        profiler.new_frame()
+        with profiler.timer('show'):
+            self._show()
+        if self.profile:
+            self.show_profile()
 
-        self.resize_lenses(min([ray.stop.x for ray in raytraces]), max([ray.stop.x for ray in raytraces]))
+    def show_profile(self):
+        """
+        Show the time spent in each stage of the last redraw in the status bar
+        """
+        self._view.statusbar.showMessage(profiler.summary(PROFILE_STAGES, frame=True))
+
+    def request_restyle(self, *args):
+        """
+        Request a redraw for a change of style, which redraws the last traced rays unless other changes are requested
+        before the redraw. Any arguments (e.g. from Qt signals) are ignored.
+        """
+        self._restyle_requests += 1
+        self.scheduler.request()
+
+    def _show(self):
+        requests = self.scheduler.requested - self._rendered_requests
+        if self._last_raytraces is not None and 0 < requests == self._restyle_requests:
+            self.show_lenses()
+            self.show_raytrace(self._last_raytraces)
+            self.renderer.draw()
+        else:
+            self._trace_and_show()
+        self._restyle_requests = 0
+        self._rendered_requests = self.scheduler.requested
+
+    def _trace_and_show(self):
+        ax = self._view.plotWidget.canvas.ax
+        xlims = ax.get_xlim()
+        ylims = ax.get_ylim()
+        autoscale = self._view.autoscaleRadioButton.isChecked()
+        previous = self._autoscaled_limits if autoscale else None
+        self.show_source()
+        raytraces = self._last_raytraces = self.make_raytraces()
+        left, right = min([ray.stop.x for ray in raytraces]), max([ray.stop.x for ray in raytraces])
+        if autoscale:
+            # The lenses span the x-limits rather than the rays, so they only change size when the limits do
+            xlims = _rescale(previous and previous[0], self.lens_span(left, right))
+            self.resize_lenses(*xlims)
+        else:
+            self.resize_lenses(left, right)
         self.show_lenses()
-        if self._view.autoscaleRadioButton.isChecked():
-            self._view.plotWidget.canvas.ax.set_xlim(min([lens.x - lens.size / 2 for lens in self.get_active_lenses()]), max([lens.x + lens.size / 2 for lens in self.get_active_lenses()]))
+        self.show_raytrace(raytraces)
+        if autoscale:
+            # The limits of the manual and lock modes turn autoscaling off
+            ax.autoscale(True)
+            ax.relim(visible_only=True)
+            ax.update_datalim([(ray.start.x, ray.start.y) for ray in raytraces] +
+                              [(ray.stop.x, ray.stop.y) for ray in raytraces])
+            ax.autoscale_view(scalex=False)
+            ax.set_xlim(*xlims)
+            ax.set_ylim(*_rescale(previous and previous[1], ax.get_ylim()))
+            self._autoscaled_limits = (ax.get_xlim(), ax.get_ylim())
         elif self._view.manualRadioButton.isChecked():
-            self._view.plotWidget.canvas.ax.set_xlim(self._view.xminSpinBox.value(), self._view.xmaxSpinBox.value())
-            self._view.plotWidget.canvas.ax.set_ylim(self._view.yminSpinBox.value(), self._view.ymaxSpinBox.value())
+            ax.set_xlim(self._view.xminSpinBox.value(), self._view.xmaxSpinBox.value())
+            ax.set_ylim(self._view.yminSpinBox.value(), self._view.ymaxSpinBox.value())
         elif self._view.lockRadioButton.isChecked():
-            self._view.plotWidget.canvas.ax.set_xlim(xlims[0], xlims[1])
-            self._view.plotWidget.canvas.ax.set_ylim(ylims[0], ylims[1])
-        self._view.xmaxSpinBox.setValue(self._view.plotWidget.canvas.ax.get_xlim()[1])
-        self._view.xminSpinBox.setValue(self._view.plotWidget.canvas.ax.get_xlim()[0])
-        self._view.ymaxSpinBox.setValue(self._view.plotWidget.canvas.ax.get_ylim()[1])
-        self._view.yminSpinBox.setValue(self._view.plotWidget.canvas.ax.get_ylim()[0])
-
-        self._view.plotWidget.canvas.draw()
+            ax.set_xlim(xlims[0], xlims[1])
+            ax.set_ylim(ylims[0], ylims[1])
+        if not autoscale:
+            self._autoscaled_limits = None
+        self._view.xmaxSpinBox.setValue(ax.get_xlim()[1])
+        self._view.xminSpinBox.setValue(ax.get_xlim()[0])
+        self._view.ymaxSpinBox.setValue(ax.get_ylim()[1])
+        self._view.yminSpinBox.setValue(ax.get_ylim()[0])
+
+        self.renderer.draw()
+        # Updating the limit spinboxes above requests another redraw, which this render already covers
+        self.scheduler.cancel()
+
+    def show_wobbler(self):
+        """
+        Open the wobbler window
+        """
+        if self.wobbler is None:
+            self.wobbler = WobbleController(WobbleWindow(self._view), self._model, self)
+        self.wobbler.show()
 
     def export(self):
         name = QtWidgets.QFileDialog.getSaveFileName(None, 'Save File')[0]
-        print(name)
-        if name is not None:
-            self._view.plotWidget.canvas.fig.savefig(name, dpi=self._view.dpiSpinBox.value())
+        if name:
+            self.export_column(name)
+
+    def export_column(self, path):
+        """
+        Export the shown column to a file in a background process, so the GUI is not blocked while the file is written.
+
+        The column is drawn again offscreen with the shown lenses, rays, styles and axes limits.
+        :param path: The path of the file. The format follows the extension (e.g. .png, .svg or .pdf)
+        :type path: str, Path
+        :return: The future holding the path of the file when it is written
+        :rtype: concurrent.futures.Future
+        """
+        if self.exporter is None:
+            # Spawned rather than forked, since the GUI process holds Qt state
+            self.exporter = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        ax = self._view.plotWidget.canvas.ax
+        # The column is sent as a fresh copy of its settings, without the cached traces of the shown column
+        column = column_from_dict(column_to_dict(self._model.column))
+        future = self.exporter.submit(export_columns, [column], [str(path)], processes=0,
+                                      figsize=tuple(ax.figure.get_size_inches()), dpi=self._view.dpiSpinBox.value(),
+                                      angles=(self._view.sourceAngleSpinBox.value(),),
+                                      symmetric=self._view.symmetricSourceCheckBox.isChecked(),
+                                      lenses=self.get_active_lenses(names=True), lensprops=self.lens_style(),
+                                      arrowprops=self.ray_style(), label_lens=self._view.lensLabelCheckBox.isChecked(),
+                                      label_focal_planes=self._view.focalPlaneLabelCheckBox.isChecked(),
+                                      label_rays=self._view.rayLabelCheckBox.isChecked(),
+                                      limits=(tuple(ax.get_xlim()), tuple(ax.get_ylim())))
+        future.add_done_callback(self._report_export)
+        return future
+
+    def _report_export(self, future):
+        # Called from a thread of the executor, so the message is passed to the GUI thread by a signal
+        if future.exception() is not None:
+            self._view.message.emit('Export failed: {error}'.format(error=future.exception()))
+        else:
+            self._view.message.emit('Exported {path}'.format(path=future.result()[0]))
+
+    def close(self):
+        """
+        Stop the background export process, e.g. when the window is closed
+        """
+        if self.exporter is not None:
+            self.exporter.shutdown(wait=False)
+            self.exporter = None
+
+    def save_column(self):
+        """
+        Save the column to a JSON file chosen by the user
+        """
+        name = QtWidgets.QFileDialog.getSaveFileName(None, 'Save Column', filter='vTEM column (*.json)')[0]
+        if name:
+            save_column(self._model.column, name)
+
+    def load_column(self, path=None):
+        """
+        Load a column saved with `save_column` and apply its settings
+        :param path: The path of the file. Default is None (ask the user)
+        :type path: str, Path, None
+        """
+        if not path:
+            path = QtWidgets.QFileDialog.getOpenFileName(None, 'Load Column', filter='vTEM column (*.json)')[0]
+            if not path:
+                return
+        self.set_column(load_column(path))
+
+    def set_column(self, column):
+        """
+        Set the widgets, and through them the model, to the settings of the source, screen and lenses of a column.
+
+        Lenses without widgets (e.g. apertures) are ignored.
+        :param column: The column to take the settings from
+        :type column: Column
+        """
+        self._view.sourceXSpinBox.setValue(column.source.x)
+        self._view.sourceYSpinBox.setValue(column.source.y)
+        self._view.sourceSizeSpinBox.setValue(column.source.size)
+        self._view.screenSpinBox.setValue(column.screen)
+        for lens in column.get_lenses():
+            prefix = lens.name.lower()
+            if not isinstance(lens, (Lens, ObjectiveLens)) or not hasattr(self._view, prefix + 'XSpinBox'):
+                continue
+            getattr(self._view, prefix + 'XSpinBox').setValue(lens.x)
+            getattr(self._view, prefix + 'YSpinBox').setValue(lens.y)
+            if isinstance(lens, ObjectiveLens):
+                # Uncouple the fields while setting them, so that the prefield is not overwritten by the postfield
+                self._model.change_lens(lens.name, couple=False)
+                self._view.olGapSpinBox.setValue(lens.gap)
+                self._view.olPrefieldSpinBox.setValue(lens.focal_lengths[0])
+                self._view.olFSpinBox.setValue(lens.focal_lengths[1])
+                self._view.olCoupledCheckBox.setChecked(lens.coupled)
+                self._view.olPrefieldSpinBox.setDisabled(lens.coupled)
+                self._model.change_lens(lens.name, couple=lens.coupled)
+            else:
+                getattr(self._view, prefix + 'FSpinBox').setValue(lens.focal_length)
+
+
+def _rescale(limits, fitted, margin=0.05, shrink=0.5):
+    """
+    Return the autoscaled limits of an axis, keeping the current limits while they still fit the data.
+
+    New limits are only set when the data leaves the current limits or fills less than `shrink` of them, so small
+    changes keep the limits and the blitting background. New limits are padded by `margin` of the data span on both
+    sides, so data that keeps growing does not change the limits on every redraw.
+    :param limits: The current autoscaled limits, or None to fit the data
+    :param fitted: The limits fitting the data
+    :param margin: The padding of new limits as a fraction of the data span. Default is 0.05
+    :param shrink: The fraction of the limits the data must fill to keep them. Default is 0.5
+    :type limits: tuple, None
+    :type fitted: tuple
+    :type margin: float
+    :type shrink: float
+    :rtype: tuple
+    """
+    low, high = fitted
+    if limits is not None and limits[0] <= low and high <= limits[1] and \
+            high - low >= shrink * (limits[1] - limits[0]):
+        return limits
+    padding = margin * (high - low)
+    return low - padding, high + padding
+
 
 def run_gui():
     main()
 
 def main():
+    # Ensure using PyQt5 backend
+    matplotlib.use('QT5Agg')
     myqui = QtWidgets.QApplication(sys.argv)
 
     main_window = MainWindow()
     model = vTEMModel()
     controller = vTEMController(view=main_window, model=model)
+    myqui.aboutToQuit.connect(controller.close)
     main_window.show()
 
     sys.exit(myqui.exec_())
@@ -2,12 +2,8 @@
 from PyQt5 import QtWidgets
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as Canvas
-import matplotlib
 import numpy as np
 
-# Ensure using PyQt5 backend
-matplotlib.use('QT5Agg')
-
 
 # Matplotlib canvas class to create figure
 class MplCanvas(Canvas):
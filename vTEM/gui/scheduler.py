@@ -0,0 +1,83 @@
+from PyQt5.QtCore import QObject, QTimer
+
+
+class RedrawScheduler(QObject):
+    """
+    Coalesce redraw requests into a single render per event loop tick or frame budget.
+
+    Every request made while a render is pending is dropped and counted, so a burst of signals from one user action
+    results in a single call to the render callback.
+    """
+
+    def __init__(self, callback, interval=0, parent=None):
+        """
+        Create a redraw scheduler.
+        :param callback: The function that renders the figure
+        :param interval: The frame budget in milliseconds. Requests within this time are rendered once. Default is 0 (render on the next event loop tick)
+        :param parent: The parent QObject. Default is None
+        :type callback: callable
+        :type interval: int
+        :type parent: QObject
+        """
+        super(RedrawScheduler, self).__init__(parent)
+        self._callback = callback
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._render)
+        self.set_interval(interval)
+        self.requested = 0
+        self.rendered = 0
+        self.dropped = 0
+
+    def __str__(self):
+        return '{self.__class__.__name__}: {self.requested} requested, {self.rendered} rendered, {self.dropped} ' \
+               'dropped ({self.interval} ms)'.format(self=self)
+
+    @property
+    def interval(self):
+        return self._timer.interval()
+
+    def set_interval(self, interval):
+        self._timer.setInterval(max(int(interval), 0))
+
+    def pending(self):
+        """
+        Return whether a render is scheduled or not
+        :rtype: bool
+        """
+        return self._timer.isActive()
+
+    def request(self, *args):
+        """
+        Request a redraw. Any arguments (e.g. from Qt signals) are ignored.
+        """
+        self.requested += 1
+        if self._timer.isActive():
+            self.dropped += 1
+        else:
+            self._timer.start()
+
+    def flush(self):
+        """
+        Render immediately if a redraw is pending
+        """
+        if self._timer.isActive():
+            self._render()
+
+    def _render(self):
+        self._timer.stop()
+        self.rendered += 1
+        self._callback()
+
+    def cancel(self):
+        """
+        Cancel a pending redraw
+        """
+        if self._timer.isActive():
+            self._timer.stop()
+            self.dropped += 1
+
+    def reset_counters(self):
+        self.requested = 0
+        self.rendered = 0
+        self.dropped = 0
@@ -0,0 +1,181 @@
+from PyQt5 import QtWidgets, uic
+from PyQt5.QtCore import QTimer, pyqtSignal
+from vTEM import Wobbler
+from pathlib import Path
+
+
+class WobbleWindow(QtWidgets.QMainWindow):
+    closed = pyqtSignal()
+
+    def __init__(self, *args, **kwargs):
+        super(WobbleWindow, self).__init__(*args, **kwargs)
+
+        # Load the UI Page
+        uic.loadUi(str(Path(__file__).parent / 'source/qtcreator/wobblewindow.ui'), self)
+
+    def closeEvent(self, event):
+        self.closed.emit()
+        super(WobbleWindow, self).closeEvent(event)
+
+
+class WobbleController(object):
+    """
+    Plays a wobble of lens settings and beam tilt in the plot of a vTEM controller.
+
+    All phases of the wobble are traced in one batch and cached by a `Wobbler`. Each timer tick only looks up the
+    cached wobble (retracing it if the column or the wobble settings changed) and swaps the data of the ray and lens
+    artists before blitting them.
+    """
+
+    def __init__(self, view, model, controller, phases=32):
+        """
+        Create a wobble controller
+        :param view: The wobbler window
+        :param model: The vTEM model to wobble
+        :param controller: The controller of the plot to wobble
+        :param phases: The number of frames per wobble period. Default is 32
+        :type view: WobbleWindow
+        :type model: vTEMModel
+        :type controller: vTEMController
+        :type phases: int
+        """
+        self._view = view
+        self._model = model
+        self._controller = controller
+        self.wobbler = Wobbler(self._model.column, phases=phases)
+        self.phase = 0
+        self.timer = QTimer(self._view)
+        self.timer.timeout.connect(self.step)
+        self.amplitude_widgets = {}
+        self.lens_checkboxes = {}
+        self.setup_lens_widgets()
+        self.setup_tilt_widgets()
+        self.setup_frequency_widgets()
+        self._view.closed.connect(self.stop)
+
+    def show(self):
+        self._view.show()
+
+    def setup_lens_widgets(self):
+        """
+        Connect the amplitude widgets of the lens grid, with lenses in rows and parameters in columns
+        """
+        grid = self._view.gridLayout_2
+        parameters = {}
+        for column in range(1, grid.columnCount()):
+            item = grid.itemAtPosition(0, column)
+            if item is not None and isinstance(item.widget(), QtWidgets.QLabel):
+                parameters[column] = item.widget().text().lower()
+        for row in range(1, grid.rowCount()):
+            item = grid.itemAtPosition(row, 0)
+            if item is None or not isinstance(item.widget(), QtWidgets.QCheckBox):
+                continue
+            checkbox = item.widget()
+            name = checkbox.text()
+            self.lens_checkboxes[name] = checkbox
+            checkbox.toggled.connect(self.restart)
+            for column, parameter in parameters.items():
+                cell = grid.itemAtPosition(row, column)
+                if cell is None or cell.layout() is None:
+                    continue
+                slider, spinbox = cell.layout().itemAt(0).widget(), cell.layout().itemAt(1).widget()
+                self.connect_amplitude(slider, spinbox, maximum=10.)
+                self.amplitude_widgets['{name}.{parameter}'.format(name=name, parameter=parameter)] = spinbox
+
+    def setup_tilt_widgets(self):
+        self.connect_amplitude(self._view.tiltSlider, self._view.tiltSpinBox, maximum=45.)
+        self._view.tiltCheckBox.toggled.connect(self.restart)
+
+    def setup_frequency_widgets(self):
+        for spinbox in (self._view.lensFrequencySpinBox, self._view.deflectorFrequencySpinBox):
+            spinbox.setRange(0.01, 50.)
+            spinbox.setSingleStep(0.1)
+            spinbox.setValue(1.)
+            spinbox.valueChanged.connect(self.restart)
+
+    def connect_amplitude(self, slider, spinbox, maximum):
+        """
+        Couple an amplitude slider to its spin box, with 100 slider steps per unit
+        """
+        spinbox.setRange(0., maximum)
+        spinbox.setSingleStep(0.01)
+        slider.setRange(0, round(maximum * 100))
+        slider.valueChanged.connect(lambda value: spinbox.setValue(value / 100))
+        spinbox.valueChanged.connect(lambda value: slider.setValue(round(value * 100)))
+        spinbox.valueChanged.connect(self.restart)
+
+    def amplitudes(self):
+        """
+        Return the amplitudes of the wobbled settings
+        :rtype: dict
+        """
+        amplitudes = {setting: spinbox.value() for setting, spinbox in self.amplitude_widgets.items()
+                      if self.lens_checkboxes[setting.rpartition('.')[0]].isChecked() and spinbox.value() != 0}
+        if self._view.tiltCheckBox.isChecked() and self._view.tiltSpinBox.value() != 0:
+            amplitudes['tilt'] = self._view.tiltSpinBox.value()
+        return amplitudes
+
+    def period(self, amplitudes):
+        """
+        Return the duration of a wobble period in seconds and the number of tilt cycles per period.
+
+        The period follows the lens frequency when any lens is wobbled, with the tilt completing the whole number of
+        cycles closest to the deflector frequency. Otherwise it follows the deflector frequency.
+        :rtype: tuple
+        """
+        lens_frequency = self._view.lensFrequencySpinBox.value()
+        deflector_frequency = self._view.deflectorFrequencySpinBox.value()
+        if set(amplitudes) == {'tilt'}:
+            return 1 / deflector_frequency, 1
+        return 1 / lens_frequency, max(1, round(deflector_frequency / lens_frequency))
+
+    def wobble(self):
+        """
+        Return the current wobble, traced for the rays and lenses shown by the controller
+        :rtype: vTEM.Wobble, None
+        """
+        amplitudes = self.amplitudes()
+        if not amplitudes:
+            return None
+        _, tilt_cycles = self.period(amplitudes)
+        return self.wobbler.wobble(self._controller.initial_rays(), amplitudes,
+                                   lenses=self._controller.get_active_lenses(names=True), cycles={'tilt': tilt_cycles})
+
+    def restart(self, *args):
+        """
+        Start, adjust or stop the wobble after its settings changed
+        """
+        amplitudes = self.amplitudes()
+        if not amplitudes:
+            self.stop()
+            return
+        period, _ = self.period(amplitudes)
+        self.timer.setInterval(max(1, round(1000 * period / self.wobbler.phases)))
+        if not self.timer.isActive():
+            self.phase = 0
+            self.timer.start()
+
+    def stop(self):
+        """
+        Stop the wobble and redraw the column as it is
+        """
+        if self.timer.isActive():
+            self.timer.stop()
+            self._controller.scheduler.request()
+
+    def step(self):
+        """
+        Show the next phase of the wobble
+        """
+        wobble = self.wobble()
+        if wobble is None:
+            self.stop()
+            return
+        phase = self.phase % len(wobble)
+        renderer = self._controller.renderer
+        renderer.move_rays(wobble.segments()[phase])
+        for lens in self._controller.get_active_lenses():
+            if any(setting.rpartition('.')[0] == lens.name for setting in wobble.settings):
+                renderer.move_lens(lens, wobble.lens(lens, phase))
+        renderer.draw()
+        self.phase = phase + 1